@@ -0,0 +1,160 @@
+"""Main application to benchmark the anonymization on synthetic datasets"""
+
+import logging
+from logger.tqdm_logging_handler import TqdmLoggingHandler
+
+logging.basicConfig(level=logging.INFO, handlers=[TqdmLoggingHandler()])
+logger = logging.getLogger(__name__)
+
+import sys
+import getopt
+import tempfile
+import time
+import yaml
+from pathlib import Path
+
+from benchmarks.results import get_environment, save_results
+from benchmarks.stub_recognizer import StubRecognizer
+from benchmarks.synthetic_dataset import build_configuration, write_dataset
+from configuration.configuration_reader import ConfigurationReader
+from logger.instrumentation import Instrumentation
+from main import anonymize, anonymize_within_memory_budget
+from preprocessing.data_reader import DataReader
+
+DEFAULT_SIZES = [10000, 100000, 1000000, 10000000]
+DEFAULT_STRATEGIES = ["gdf", "mondrian"]
+
+
+def main(argv):
+    """Main entrypoint for the benchmarks"""
+
+    # Default parameters
+    sizes = DEFAULT_SIZES
+    strategies = DEFAULT_STRATEGIES
+    repetitions = 1
+    texts_per_person = 2
+    entity_density = 0.5
+    duplicate_rate = 0.1
+    k = 10
+    seed = 0
+    memory_budget = None
+    dataset_dir = "data/benchmarks"
+    result_dir = "benchmark_results"
+
+    # Read and set tool parameters
+    try:
+        opts, _ = getopt.getopt(argv, "n:s:r:p:e:d:k:m:o:v", ["sizes=", "strategies=", "repetitions=", "texts_per_person=", "entity_density=", "duplicate_rate=", "k=",
+                                                              "memory_budget=", "result_dir=", "seed=", "dataset_dir=", "verbose"])
+    except getopt.GetoptError:
+        logger.error('benchmark_runner.py [-n <sizes>] [-s <strategies>] [-r <repetitions>] [-p <texts_per_person>] [-e <entity_density>] [-d <duplicate_rate>] [-k <k>] '
+                     '[-m <memory_budget>] [-o <result_dir>] [--seed <seed>] [--dataset_dir <dataset_dir>]')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-n", "--sizes"):
+            sizes = [int(size) for size in arg.split(",")]
+        if opt in ("-s", "--strategies"):
+            strategies = [strategy.strip() for strategy in arg.split(",")]
+        if opt in ("-r", "--repetitions"):
+            repetitions = int(arg)
+        if opt in ("-p", "--texts_per_person"):
+            texts_per_person = float(arg)
+        if opt in ("-e", "--entity_density"):
+            entity_density = float(arg)
+        if opt in ("-d", "--duplicate_rate"):
+            duplicate_rate = float(arg)
+        if opt in ("-k", "--k"):
+            k = int(arg)
+        if opt in ("-m", "--memory_budget"):
+            memory_budget = int(arg)
+        if opt in ("-o", "--result_dir"):
+            result_dir = arg
+        if opt == "--seed":
+            seed = int(arg)
+        if opt == "--dataset_dir":
+            dataset_dir = arg
+        if opt in ("-v", "--verbose"):
+            logging.getLogger().setLevel(logging.DEBUG)
+
+    result_path = Path(result_dir)
+    result_path.mkdir(parents=True, exist_ok=True)
+    dataset_path = Path(dataset_dir)
+    dataset_path.mkdir(parents=True, exist_ok=True)
+
+    parameters = {"sizes": sizes, "strategies": strategies, "repetitions": repetitions, "texts_per_person": texts_per_person, "entity_density": entity_density,
+                  "duplicate_rate": duplicate_rate, "k": k, "seed": seed, "memory_budget": memory_budget}
+    results = {"environment": get_environment(), "parameters": parameters, "runs": []}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            # Generate the dataset once and reuse it for later runs with the same parameters
+            file_info = "_".join(str(parameter).replace(".", "_") for parameter in [size, texts_per_person, entity_density, duplicate_rate, seed])
+            input_file = dataset_path / "synthetic_{}.csv".format(file_info)
+            if not input_file.exists():
+                start = time.perf_counter()
+                write_dataset(input_file, size, texts_per_person, entity_density, duplicate_rate=duplicate_rate, seed=seed)
+                logger.info("Generated dataset %s in %.2f seconds", input_file, time.perf_counter() - start)
+
+            for strategy in strategies:
+                # Write the configuration for the synthetic dataset like a user would do
+                configuration = build_configuration(k, strategy)
+                if memory_budget:
+                    configuration["parameters"]["memory_budget"] = memory_budget
+                    configuration["parameters"]["spill_directory"] = str(Path(tmp_dir) / "spill")
+                configuration_file = Path(tmp_dir) / "config.yaml"
+                with open(configuration_file, 'w') as f:
+                    yaml.dump(configuration, f)
+                config = ConfigurationReader().read(configuration_file)
+
+                for repetition in range(repetitions):
+                    benchmark = "{}_{}".format(strategy, size)
+                    logger.info("Running benchmark %s (repetition %d of %d)", benchmark, repetition + 1, repetitions)
+                    results["runs"].append(run(config, input_file, Path(tmp_dir) / "output.csv", benchmark, repetition))
+
+    save_results(results, result_path)
+
+
+def run(config, input_file, output_file, benchmark, repetition):
+    """
+    Anonymizes a dataset end to end using the stub recognizer and measures the whole run and every stage
+    Parameters
+    ----------
+    config: Configuration
+        Configuration of the run.
+    input_file: Path
+        Dataset to anonymize.
+    output_file: Path
+        Path of the output file, which is overwritten by every run.
+    benchmark: str
+        Name of the benchmark.
+    repetition: int
+        Number of the repetition.
+    Returns
+    -------
+    dict
+        Dictionary with the total wall time, the peak resident set size, and the wall time and counters per stage.
+    """
+    instrumentation = Instrumentation()
+    data_reader = DataReader(config)
+    sensitive_terms_recognizer = StubRecognizer(config)
+
+    start = time.perf_counter()
+    if config.get_memory_budget():
+        anonymize_within_memory_budget(config, data_reader, sensitive_terms_recognizer, input_file, output_file, instrumentation)
+    else:
+        anonymize(config, data_reader, sensitive_terms_recognizer, input_file, output_file, instrumentation)
+    wall_time = time.perf_counter() - start
+
+    report = instrumentation.get_report()
+    logger.info("Benchmark %s took %.2f seconds", benchmark, wall_time)
+    return {
+        "benchmark": benchmark,
+        "repetition": repetition,
+        "wall_time": wall_time,
+        "peak_rss_mb": report["peak_rss_mb"],
+        "stages": {name: stage["wall_time"] for name, stage in report["stages"].items()},
+        "counters": {name: stage["counters"] for name, stage in report["stages"].items() if stage["counters"]}
+    }
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,193 @@
+"""This module contains micro-benchmarks for the recoding and partitioning primitives of the anonymization kernel"""
+import json
+import logging
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.stub_recognizer import StubSpan, StubToken
+from benchmarks.synthetic_dataset import ENTITY_VOCABULARY, START_DATE, TOPICS
+from kernel import partitioning
+from kernel.recoding import recode, recode_dates, recode_tokens
+from kernel.util import flatten_set_valued_series, intersect_token_lists
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_MIN_TIME = 0.2
+DEFAULT_REPEAT = 5
+SHAPES = ["categorical", "ordered", "numeric", "dates", "frozensets", "token_lists"]
+
+
+def build_series(shape, size, seed=0):
+    """
+    Builds a series shaped like the quasi-identifiers and entity attributes the kernel works on
+    Parameters
+    ----------
+    shape: str
+        One of SHAPES.
+    size: int
+        Number of records.
+    seed: int
+        Seed making series reproducible.
+    Returns
+    -------
+    Series
+        Series with the given shape.
+    """
+    rng = np.random.default_rng(seed)
+    if shape == "categorical":
+        return pd.Series(pd.Categorical(np.array(TOPICS, dtype=object)[rng.integers(len(TOPICS), size=size)]), name=shape)
+    if shape == "ordered":
+        return pd.Series(pd.Categorical(rng.integers(5, size=size), categories=range(5), ordered=True), name=shape)
+    if shape == "numeric":
+        return pd.Series(rng.integers(16, 80, size=size), name=shape)
+    if shape == "dates":
+        return pd.Series(START_DATE + pd.to_timedelta(rng.integers(3650, size=size), unit="D"), name=shape)
+    if shape == "frozensets":  # Numerical values of persons with multiple records, packed during compression
+        values = rng.integers(16, 80, size=(size, 3))
+        is_packed = rng.random(size) < 0.5
+        return pd.Series([frozenset(values[i].tolist()) if is_packed[i] else int(values[i, 0]) for i in range(size)], dtype=object, name=shape)
+    if shape == "token_lists":  # Sensitive terms of persons, all sharing one term so that intersections do not become empty
+        words = ENTITY_VOCABULARY["GPE"]
+        choices = rng.integers(len(words), size=(size, 3))
+        return pd.Series([build_token_list([words[0]] + [words[choice] for choice in choices[i]]) for i in range(size)], dtype=object, name=shape)
+    raise Exception("Unknown shape {}".format(shape))
+
+
+def build_token_list(words):
+    """
+    Builds a list of sensitive terms like the ones recognized in texts
+    Parameters
+    ----------
+    words: list
+        Texts of the terms.
+    Returns
+    -------
+    list
+        List of spans.
+    """
+    return [StubSpan(word, "GPE", 0, [StubToken(word, 0)]) for word in words]
+
+
+def get_benchmarks():
+    """
+    Returns all micro-benchmarks with the shapes they are run on
+    Returns
+    -------
+    dict
+        Dictionary with a function taking a series per primitive and a list of shapes.
+    """
+    split_partition = getattr(partitioning, "__split_partition")
+    return {
+        "flatten_set_valued_series": (flatten_set_valued_series, ["frozensets", "token_lists"]),
+        "recode": (recode, SHAPES),
+        "recode_dates": (recode_dates, ["dates"]),
+        "recode_tokens": (recode_tokens, ["token_lists"]),
+        "intersect_token_lists": (intersect_series, ["token_lists"]),
+        "split_partition": (split_partition, SHAPES)
+    }
+
+
+def intersect_series(series):
+    """Intersects the terms of the first record with the terms of every other record, comparing all pairs of terms"""
+    first = series.iloc[0]
+    for value in series.iloc[1:]:
+        intersect_token_lists(first, value)
+
+
+def run_benchmarks(sizes=None, selected=None, min_time=DEFAULT_MIN_TIME, repeat=DEFAULT_REPEAT):
+    """
+    Runs micro-benchmarks and measures the time per call
+    Parameters
+    ----------
+    sizes: list
+        Numbers of records per series, defaults to DEFAULT_SIZES (optional).
+    selected: list
+        Names of primitives to benchmark, all if not given (optional).
+    min_time: float
+        Minimal time in seconds of each repetition, determining how often a primitive is called per repetition.
+    repeat: int
+        Number of repetitions.
+    Returns
+    -------
+    dict
+        Dictionary with the minimal and median seconds per call of each benchmark, named like "recode/dates/1000".
+    """
+    results = {}
+    for primitive, (function, shapes) in get_benchmarks().items():
+        if selected and primitive not in selected:
+            continue
+        for shape in shapes:
+            for size in sizes or DEFAULT_SIZES:
+                series = build_series(shape, size)
+                timer = timeit.Timer(lambda: function(series))
+                number, elapsed = timer.autorange()
+                if elapsed < min_time:
+                    number = max(1, int(number * min_time / elapsed))
+                times = np.array(timer.repeat(repeat=repeat, number=number)) / number
+                name = "{}/{}/{}".format(primitive, shape, size)
+                results[name] = {"min": float(times.min()), "median": float(np.median(times)), "calls": number * repeat}
+                logger.info("%s: %.6f seconds per call", name, times.min())
+    return results
+
+
+def compare_results(baseline, results, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares results of micro-benchmarks with a baseline using the minimal time per call, which is least affected by noise
+    Parameters
+    ----------
+    baseline: dict
+        Results of the baseline.
+    results: dict
+        Results to compare.
+    threshold: float
+        Relative slowdown above which a benchmark is flagged, e.g. 0.2 for 20 %.
+    Returns
+    -------
+    DataFrame
+        DataFrame with baseline and current time, the relative change, and a flag for slowdowns per benchmark run in both.
+    """
+    names = [name for name in results if name in baseline]
+    comparison = pd.DataFrame({
+        "baseline": [baseline[name]["min"] for name in names],
+        "current": [results[name]["min"] for name in names]
+    }, index=pd.Index(names, name="benchmark"))
+    comparison["change"] = comparison["current"] / comparison["baseline"] - 1
+    comparison["slowdown"] = comparison["change"] > threshold
+    return comparison
+
+
+def save_micro_results(results, environment, result_file):
+    """
+    Saves results of micro-benchmarks together with the environment they have been measured in
+    Parameters
+    ----------
+    results: dict
+        Results of the micro-benchmarks.
+    environment: dict
+        Environment of the run.
+    result_file: (str, Path)
+        Path of the JSON file.
+    """
+    with open(result_file, 'w') as f:
+        json.dump({"environment": environment, "results": results}, f, ensure_ascii=False, indent=4)
+    logger.info("Saved results of %d micro-benchmarks to %s", len(results), result_file)
+
+
+def load_micro_results(result_file):
+    """
+    Loads results of micro-benchmarks
+    Parameters
+    ----------
+    result_file: (str, Path)
+        Path of the JSON file.
+    Returns
+    -------
+    dict
+        Results of the micro-benchmarks.
+    """
+    with open(result_file, 'r') as f:
+        return json.load(f)["results"]
@@ -0,0 +1,80 @@
+"""This module contains code to store benchmark results in a way that runs stay comparable over time"""
+import json
+import logging
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FILE = "history.csv"
+
+
+def get_environment():
+    """
+    Returns information on the environment a benchmark runs in
+    Returns
+    -------
+    dict
+        Dictionary with the commit, versions, machine, and the number of cpu cores.
+    """
+    return {
+        "commit": get_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count()
+    }
+
+
+def get_commit():
+    """
+    Returns the commit of the working directory, marked as dirty if there are uncommitted changes
+    Returns
+    -------
+    str
+        Commit hash, or None if git is not available.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        changes = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + "-dirty" if changes else commit
+
+
+def save_results(results, result_path):
+    """
+    Saves results of a benchmark run as JSON file and appends one row per benchmark and stage to the history of all runs
+    Parameters
+    ----------
+    results: dict
+        Results containing the environment, the parameters, and the runs of the benchmarks.
+    result_path: Path
+        Directory to store results in.
+    Returns
+    -------
+    Path
+        Path of the JSON file.
+    """
+    environment = results["environment"]
+    file_name = "benchmark_{}_{}.json".format(environment["timestamp"].replace(":", "-"), environment["commit"])
+    with open(result_path / file_name, 'w') as f:
+        json.dump(results, f, ensure_ascii=False, indent=4)
+
+    rows = []
+    for run in results["runs"]:
+        for stage, wall_time in {"total": run["wall_time"], **run["stages"]}.items():
+            rows.append({"timestamp": environment["timestamp"], "commit": environment["commit"], "benchmark": run["benchmark"], "stage": stage, "repetition": run["repetition"], "wall_time": wall_time, "peak_rss_mb": run["peak_rss_mb"]})
+    history_file = result_path / HISTORY_FILE
+    pd.DataFrame(rows).to_csv(history_file, mode='a', header=not history_file.exists(), index=False)
+    logger.info("Saved results to %s and appended them to %s", result_path / file_name, history_file)
+    return result_path / file_name
@@ -0,0 +1,189 @@
+"""This module contains a recognizer finding sensitive terms by looking up words of a fixed vocabulary, standing in for spaCy models in benchmarks"""
+import logging
+import re
+
+from benchmarks.synthetic_dataset import ENTITY_VOCABULARY
+from postprocessing.postprocessor import convert_to_pretty
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+STOP_WORDS = {"a", "an", "and", "as", "at", "for", "i", "in", "of", "the", "to", "was", "we"}
+
+
+class StubToken:
+    """Token providing the attributes of spaCy tokens used during anonymization"""
+    __slots__ = ["text", "lemma_", "is_stop", "idx"]
+
+    def __init__(self, text, idx):
+        self.text = text
+        self.lemma_ = text.lower()
+        self.is_stop = self.lemma_ in STOP_WORDS
+        self.idx = idx
+
+
+class StubSpan:
+    """Span providing the attributes of spaCy spans used during anonymization"""
+    __slots__ = ["text", "label_", "start_char", "tokens"]
+
+    def __init__(self, text, label, start_char, tokens):
+        self.text = text
+        self.label_ = label
+        self.start_char = start_char
+        self.tokens = tokens
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __len__(self):
+        return len(self.tokens)
+
+
+class StubRecognizer:
+    """
+    Recognizer with the interface of the sensitive terms recognizer, which recognizes words of a fixed vocabulary and four digit years as entities.
+    Like the entity ruler of the sensitive terms recognizer, regular expressions of custom entities are matched against lower case tokens and take precedence.
+    Recognized texts are kept in memory to replace their entities later on.
+    """
+
+    def __init__(self, config, vocabulary=None):
+        self.__config = config
+        self.__entities_to_consider = set(config.get_entities_to_consider())
+        self.__vocabulary = {word.lower(): entity_type for entity_type, words in (vocabulary or ENTITY_VOCABULARY).items() for word in words}
+        self.__custom_patterns = {}
+        if config.entities and "custom" in config.entities.keys():
+            self.__custom_patterns = {entity_type: re.compile(pattern.lower()) for entity_type, pattern in config.entities["custom"].items()}
+        self.__recognized_sensitive_entities = set()
+        self.__docs = {}
+        self.__statistics = {"ids": 0, "texts": 0, "cached_ids": 0, "cached_texts": 0}
+
+    def get_nlp(self):
+        """
+        Returns a function splitting a text into tokens like a language model
+        Returns
+        -------
+        function
+            Function taking a text and returning a span of its tokens.
+        """
+        return self.__tokenize
+
+    def get_recognized_entities(self):
+        """
+        Returns a set containing all sensitive entity types which have appeared
+        Returns
+        -------
+        set
+            Set containing sensitive entity types.
+        """
+        return self.__recognized_sensitive_entities
+
+    def get_statistics(self):
+        """
+        Returns how many ids and texts have been analyzed over all calls of recognize
+        Returns
+        -------
+        dict
+            Dictionary with numbers of ids, texts, cached ids, and cached texts.
+        """
+        return self.__statistics
+
+    def recognize(self, attribute_name, texts_to_analyze):
+        """
+        Recognizes sensitive terms in texts and returns them
+        Parameters
+        ----------
+        attribute_name: str
+            Name of attribute.
+        texts_to_analyze: dict
+            Dictionary containing texts and their contexts.
+        Returns
+        -------
+        dict
+            Dictionary with the recognized sensitive terms.
+        """
+        entities_per_id = {}
+        docs = self.__docs.setdefault(attribute_name, {})
+        for person_id, texts in texts_to_analyze.items():
+            self.__statistics["ids"] += 1
+            self.__statistics["texts"] += len(texts)
+            docs[person_id] = []
+            for text, index in texts:
+                entities = self.__find_entities(text)
+                docs[person_id].append((text, entities))
+                entities_per_id[index] = {}
+                for entity in entities:
+                    if entity.label_ in self.__entities_to_consider:
+                        entities_per_id[index].setdefault(entity.label_, []).append(entity)
+                        self.__recognized_sensitive_entities.add(entity.label_)
+        return entities_per_id
+
+    def release(self, attribute_name, person_ids):
+        """
+        Releases the docs kept for persons whose texts will not be replaced anymore
+        Parameters
+        ----------
+        attribute_name: str
+            Name of attribute.
+        person_ids: list
+            Direct identifiers of the persons.
+        """
+        docs = self.__docs.get(attribute_name, {})
+        for person_id in person_ids:
+            docs.pop(person_id, None)
+
+    def replace(self, attribute_name, person_id, replacements, entities_to_remain):
+        """
+        Replaces entities with their types, replacements from the relational part, or remains them
+        Parameters
+        ----------
+        attribute_name: str
+            Name of attribute.
+        person_id: str
+            Direct identifier.
+        replacements: dict
+            Dictionary containing replacements for specific tokens.
+        entities_to_remain: set
+            Set containing entities which should be kept.
+        Returns
+        -------
+        (str, list)
+            Recoded text, or list with recoded texts if the person has multiple texts.
+        """
+        texts_to_remain = set(entity.text for entity in entities_to_remain)
+        date_format = self.__config.get_default_date_format()
+        replaced_texts = []
+        for text, entities in self.__docs[attribute_name][person_id]:
+            new_text = text
+            for entity in reversed(entities):
+                if entity.label_ not in self.__entities_to_consider or entity.text in texts_to_remain:
+                    continue
+                start = entity.start_char
+                end = start + len(entity.text)
+                replacement = entity.label_
+                for replaced_entity, to_be_replaced, value in replacements.get(entity.label_, []):
+                    if replaced_entity.text == entity.text:
+                        replacement = convert_to_pretty(value, date_format)
+                        if isinstance(to_be_replaced, StubToken):  # Only replace the matching token
+                            replacement = entity.text.replace(to_be_replaced.text, replacement)
+                        break
+                new_text = new_text[:start] + replacement + new_text[end:]
+            replaced_texts.append(new_text)
+        if len(replaced_texts) == 1:
+            return replaced_texts[0]
+        return replaced_texts
+
+    def __tokenize(self, text):
+        return StubSpan(text, None, 0, [StubToken(match.group(), match.start()) for match in WORD_PATTERN.finditer(text)])
+
+    def __find_entities(self, text):
+        entities = []
+        for match in WORD_PATTERN.finditer(text):
+            word = match.group()
+            entity_type = next((custom_type for custom_type, pattern in self.__custom_patterns.items() if pattern.fullmatch(word.lower())), None)
+            if entity_type is None:
+                entity_type = self.__vocabulary.get(word.lower())
+            if entity_type is None and len(word) == 4 and word.isdigit():
+                entity_type = "DATE"
+            if entity_type is not None:
+                entities.append(StubSpan(word, entity_type, match.start(), [StubToken(word, match.start())]))
+        return entities
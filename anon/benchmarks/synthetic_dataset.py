@@ -0,0 +1,183 @@
+"""This module contains code to generate synthetic RX-datasets consisting of relational attributes and texts"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CARDINALITIES = {"age": 35, "topic": 40, "date": 3650}
+DEFAULT_CHUNKSIZE = 1000000
+START_DATE = pd.Timestamp(2000, 1, 1)
+
+GENDERS = ["female", "male"]
+SIGNS = ["Aries", "Taurus", "Gemini", "Cancer", "Leo", "Virgo", "Libra", "Scorpio", "Sagittarius", "Capricorn", "Aquarius", "Pisces"]
+TOPICS = ["Arts", "Banking", "Education", "Engineering", "Fashion", "Internet", "Law", "Marketing", "Science", "Student", "Technology", "indUnk"]
+ENTITY_VOCABULARY = {
+    "PERSON": ["Anna", "Ben", "Carla", "David", "Emma", "Felix", "Grace", "Hugo", "Ines", "Jonas", "Kira", "Liam", "Maria", "Noah", "Olivia", "Pedro"],
+    "GPE": ["Berlin", "Boston", "Canada", "Dublin", "Lisbon", "London", "Madrid", "Mexico", "Paris", "Rome", "Tokyo", "Ulm", "Vienna", "Zurich"],
+    "ORG": ["Acme", "Globex", "Initech", "Hooli", "Umbrella", "Stark", "Wayne", "Wonka"],
+    "JOB": ["engineer", "scientist", "biologist", "teacher", "nurse", "lawyer", "designer", "student"],
+    "SIGN": SIGNS,
+    "TOPIC": TOPICS
+}
+FILLERS = {"PERSON": "someone", "GPE": "somewhere", "ORG": "a company", "JOB": "worker", "SIGN": "person", "TOPIC": "life", "DATE": "some time"}
+TEMPLATES = [
+    "Yesterday I met {PERSON} in {GPE} and we talked for hours.",
+    "As a {JOB} at {ORG} I mostly write about {TOPIC}.",
+    "Being a typical {SIGN} I remember what happened in {DATE}.",
+    "Today was a quiet day and nothing special happened.",
+    "My friend {PERSON} moved to {GPE} to work for {ORG}."
+]
+
+
+def generate_chunks(n_records, texts_per_person=2, entity_density=0.5, cardinalities=None, duplicate_rate=0.1, seed=0, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Generates a synthetic dataset of persons with constant quasi-identifiers (gender, age, topic, sign), a date per record, and a text per record.
+    Texts are built from templates whose entity slots are filled with entities of a known vocabulary, mentioning the sign, topic, and year of the person at times.
+    Parameters
+    ----------
+    n_records: int
+        Number of records.
+    texts_per_person: float
+        Mean number of records, each containing one text, per person.
+    entity_density: float
+        Probability of each entity slot of a text to contain an entity instead of a neutral filler.
+    cardinalities: dict
+        Number of distinct values for age, topic, and date (in days), defaults to DEFAULT_CARDINALITIES (optional).
+    duplicate_rate: float
+        Share of persons copying all quasi-identifiers of another person.
+    seed: int
+        Seed making datasets reproducible.
+    chunksize: int
+        Number of records per chunk.
+    Yields
+    ------
+    DataFrame
+        DataFrames with columns id, gender, age, topic, sign, date, and text.
+    """
+    cardinalities = {**DEFAULT_CARDINALITIES, **(cardinalities or {})}
+    rng = np.random.default_rng(seed)
+
+    # Assign records to persons, each person having at least one record
+    records_per_person = rng.poisson(max(texts_per_person - 1, 0), size=n_records) + 1
+    n_persons = int(np.searchsorted(np.cumsum(records_per_person), n_records) + 1)
+    person_ids = np.repeat(np.arange(1, n_persons + 1), records_per_person[:n_persons])[:n_records]
+
+    # Draw quasi-identifiers per person and let some persons copy the ones of another person
+    topics = TOPICS[:cardinalities["topic"]] + ["Topic{}".format(i) for i in range(len(TOPICS), cardinalities["topic"])]
+    persons = {
+        "gender": rng.integers(len(GENDERS), size=n_persons),
+        "age": rng.integers(cardinalities["age"], size=n_persons),
+        "topic": rng.integers(len(topics), size=n_persons),
+        "sign": rng.integers(len(SIGNS), size=n_persons)
+    }
+    duplicates = np.flatnonzero(rng.random(n_persons) < duplicate_rate)
+    originals = rng.integers(n_persons, size=len(duplicates))
+    for values in persons.values():
+        values[duplicates] = values[originals]
+    logger.info("Generating %d records of %d persons", n_records, n_persons)
+
+    for start in range(0, n_records, chunksize):
+        end = min(start + chunksize, n_records)
+        persons_of_chunk = person_ids[start:end] - 1
+        days = rng.integers(cardinalities["date"], size=end - start)
+        dates = START_DATE + pd.to_timedelta(days, unit="D")
+        chunk = pd.DataFrame({
+            "id": person_ids[start:end],
+            "gender": np.array(GENDERS, dtype=object)[persons["gender"][persons_of_chunk]],
+            "age": persons["age"][persons_of_chunk] + 16,
+            "topic": np.array(topics, dtype=object)[persons["topic"][persons_of_chunk]],
+            "sign": np.array(SIGNS, dtype=object)[persons["sign"][persons_of_chunk]],
+            "date": dates.strftime("%d,%B,%Y")
+        }, index=pd.RangeIndex(start, end))
+        chunk["text"] = __generate_texts(rng, chunk, entity_density)
+        yield chunk
+
+
+def generate_dataset(n_records, texts_per_person=2, entity_density=0.5, cardinalities=None, duplicate_rate=0.1, seed=0):
+    """
+    Generates a synthetic dataset in memory, see generate_chunks for the parameters
+    Returns
+    -------
+    DataFrame
+        DataFrame with columns id, gender, age, topic, sign, date, and text.
+    """
+    return pd.concat(generate_chunks(n_records, texts_per_person, entity_density, cardinalities, duplicate_rate, seed))
+
+
+def write_dataset(output_file, n_records, texts_per_person=2, entity_density=0.5, cardinalities=None, duplicate_rate=0.1, seed=0):
+    """
+    Generates a synthetic dataset chunk by chunk and writes it to a CSV file, see generate_chunks for the parameters
+    Parameters
+    ----------
+    output_file: (str, Path)
+        Path of the CSV file to write.
+    """
+    for position, chunk in enumerate(generate_chunks(n_records, texts_per_person, entity_density, cardinalities, duplicate_rate, seed)):
+        chunk.to_csv(output_file, mode='w' if position == 0 else 'a', header=position == 0, index=False)
+
+
+def build_configuration(k=10, strategy="mondrian", relational_weight=0.5):
+    """
+    Builds a configuration for synthetic datasets like the one for the blog authorship corpus
+    Parameters
+    ----------
+    k: int
+        k, minimal group size.
+    strategy: str
+        Partitioning strategy.
+    relational_weight: float
+        Tuning parameter for Mondrian.
+    Returns
+    -------
+    dict
+        Configuration as read from a YAML file.
+    """
+    return {
+        "parameters": {"k": k, "strategy": strategy, "relational_weight": relational_weight},
+        "nlp": {"model": "stub"},
+        "attributes": {
+            "id": {"anonymization_type": "direct_identifier"},
+            "gender": {"type": "nominal", "anonymization_type": "quasi_identifier"},
+            "age": {"type": "numerical", "anonymization_type": "quasi_identifier"},
+            "topic": {"type": "nominal", "anonymization_type": "quasi_identifier", "entities": ["TOPIC"]},
+            "sign": {"type": "nominal", "anonymization_type": "quasi_identifier", "entities": ["SIGN"]},
+            "date": {"type": "date", "anonymization_type": "quasi_identifier", "format": "%d,%B,%Y", "entities": ["DATE"]},
+            "text": {"type": "text", "anonymization_type": "text"}
+        },
+        "entities": {
+            "native": ["PERSON", "GPE", "ORG", "DATE"],
+            "custom": {
+                "JOB": "|".join(word.lower() for word in ENTITY_VOCABULARY["JOB"]),
+                "SIGN": "|".join(word.lower() for word in SIGNS),
+                "TOPIC": "|".join(word.lower() for word in TOPICS) + r"|topic\d+"  # Topics beyond the named ones are numbered
+            }
+        }
+    }
+
+
+def __generate_texts(rng, chunk, entity_density):
+    """Fills two templates per record, mentioning the sign, topic, and year of the record at times to create redundant information"""
+    n_records = len(chunk)
+    templates = rng.integers(len(TEMPLATES), size=(n_records, 2))
+    is_entity = rng.random((n_records, 3)) < entity_density
+    choices = {entity_type: rng.integers(len(words), size=n_records) for entity_type, words in ENTITY_VOCABULARY.items()}
+    is_own_value = rng.random(n_records) < 0.5
+    signs = chunk["sign"].to_numpy()
+    topics = chunk["topic"].to_numpy()
+    years = chunk["date"].str[-4:].to_numpy()
+
+    texts = []
+    for position in range(n_records):
+        values = {entity_type: words[choices[entity_type][position]] for entity_type, words in ENTITY_VOCABULARY.items()}
+        if is_own_value[position]:
+            values["SIGN"] = signs[position]
+            values["TOPIC"] = topics[position]
+        values["DATE"] = years[position]
+        for slot, entity_types in enumerate([["PERSON", "JOB"], ["GPE", "SIGN", "DATE"], ["ORG", "TOPIC"]]):
+            if not is_entity[position, slot]:
+                for entity_type in entity_types:
+                    values[entity_type] = FILLERS[entity_type]
+        texts.append(" ".join(TEMPLATES[template].format(**values) for template in templates[position]))
+    return texts
@@ -15,6 +15,15 @@ DEFAULT_K = 10
 DEFAULT_STRATEGY = "mondrian"
 DEFAULT_NATIVE_ENTITIES = []
 DEFAULT_RELATIONAL_WEIGHT = 0.5
+DEFAULT_PARTITION_PRIORITY = "size"
+DEFAULT_TIME_BUDGET = None
+DEFAULT_SPLIT_BUDGET = None
+DEFAULT_PROCESSES = 1
+DEFAULT_MEMORY_BUDGET = None
+DEFAULT_SPILL_DIRECTORY = "data/spill"
+DEFAULT_OUTPUT_BATCH_SIZE = 100000
+DEFAULT_METRICS = None
+DEFAULT_PERSON_PSEUDONYMS = False
 
 SUPPORTED_BIAS_LOWER_LIMIT = 0
 SUPPORTED_BIAS_UPPER_LIMIT = 1
@@ -29,7 +38,7 @@ class Configuration:
         self.parameters = {
             "k": DEFAULT_K,
             "strategy": DEFAULT_STRATEGY,
-            "relational_weight": DEFAULT_RELATIONAL_WEIGHT  # Only used if strategy == "mondrian"
+            "relational_weight": DEFAULT_RELATIONAL_WEIGHT  # Only used if strategy is "mondrian" or "relaxed_mondrian"
         }
         self.nlp = {
             "model": DEFAULT_NLP_MODEL,
@@ -90,6 +99,16 @@ class Configuration:
         """
         return [attr for attr in self.attributes if self.__get_data_type(attr) == 'text']
 
+    def get_numerical_attributes(self):
+        """
+        Returns all numerical attributes
+        Returns
+        -------
+        list
+            List of numerical attributes.
+        """
+        return [attr for attr in self.attributes if self.__get_data_type(attr) == 'numerical']
+
     def get_date_attributes(self):
         """
         Returns all datetime attributes
@@ -146,6 +165,96 @@ class Configuration:
         """
         return self.parameters.get("relational_weight", DEFAULT_RELATIONAL_WEIGHT)
 
+    def get_partition_priority(self):
+        """
+        Returns the order in which Mondrian refines pending partitions or the default
+        Returns
+        -------
+        str
+            Either "size" or "span".
+        """
+        return self.parameters.get("priority", DEFAULT_PARTITION_PRIORITY)
+
+    def get_time_budget(self):
+        """
+        Returns the number of seconds after which Mondrian stops refining partitions, None if unbounded
+        Returns
+        -------
+        float
+            Time budget in seconds.
+        """
+        return self.parameters.get("time_budget", DEFAULT_TIME_BUDGET)
+
+    def get_split_budget(self):
+        """
+        Returns the number of splits after which Mondrian stops refining partitions, None if unbounded
+        Returns
+        -------
+        int
+            Split budget.
+        """
+        return self.parameters.get("split_budget", DEFAULT_SPLIT_BUDGET)
+
+    def get_processes(self):
+        """
+        Returns the number of processes to use for parallel preprocessing stages
+        Returns
+        -------
+        int
+            Number of processes.
+        """
+        return self.parameters.get("processes", DEFAULT_PROCESSES)
+
+    def get_memory_budget(self):
+        """
+        Returns the memory budget in megabytes, None if the dataset should be processed in memory
+        Returns
+        -------
+        int
+            Memory budget in megabytes.
+        """
+        return self.parameters.get("memory_budget", DEFAULT_MEMORY_BUDGET)
+
+    def get_spill_directory(self):
+        """
+        Returns the directory to spill preprocessed data to if a memory budget is given
+        Returns
+        -------
+        str
+            Spill directory.
+        """
+        return self.parameters.get("spill_directory", DEFAULT_SPILL_DIRECTORY)
+
+    def get_output_batch_size(self):
+        """
+        Returns the number of records after which finished partitions are written to the output file
+        Returns
+        -------
+        int
+            Number of records per output batch.
+        """
+        return self.parameters.get("output_batch_size", DEFAULT_OUTPUT_BATCH_SIZE)
+
+    def get_person_pseudonyms(self):
+        """
+        Returns whether the output replaces the key attribute by pseudonyms, so that persons can be counted when verifying the output
+        Returns
+        -------
+        bool
+            True if persons are pseudonymized instead of removed.
+        """
+        return self.parameters.get("person_pseudonyms", DEFAULT_PERSON_PSEUDONYMS)
+
+    def get_metrics(self):
+        """
+        Returns the metrics to evaluate an anonymization with, None for all supported metrics
+        Returns
+        -------
+        list
+            List of metrics.
+        """
+        return self.parameters.get("metrics", DEFAULT_METRICS)
+
     def get_date_formats(self):
         """
         Returns a dictionary containing datetime attributes and their date formats
@@ -244,7 +353,7 @@ class Configuration:
         list
             List of entity types which are used for text anonymization.
         """
-        entities = self.entities["native"]
+        entities = list(self.entities["native"])
         if "custom" in self.entities.keys():
             entities += self.entities["custom"].keys()
         return entities
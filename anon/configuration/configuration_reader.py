@@ -26,17 +26,31 @@ class ConfigurationReader:
         with open(yaml_resource, 'r') as file:
             doc = load(file, Loader=Loader)
             logger.info("Reading configuration from %s", yaml_resource)
-            config = Configuration()
+            return self.parse(doc)
 
-            # Make keys lower case to match columns in lower case
-            config.attributes = {attr.lower(): v for attr, v in doc['attributes'].items()}
+    def parse(self, doc):
+        """
+        Initializes a configuration from an already parsed document, e.g. sent inline with a job
+        Parameters
+        ----------
+        doc: dict
+            Document with the same sections as a yaml config file.
+        Returns
+        -------
+        Configuration
+            The corresponding configuration object
+        """
+        config = Configuration()
+
+        # Make keys lower case to match columns in lower case
+        config.attributes = {attr.lower(): v for attr, v in doc['attributes'].items()}
 
-            if "entities" in doc:  # Overwrite default
-                config.entities = doc['entities']
-            if "parameters" in doc:  # Overwrite default
-                config.parameters = doc['parameters']
-            if "nlp" in doc:  # Overwrite default
-                config.nlp = doc['nlp']
+        if "entities" in doc:  # Overwrite default
+            config.entities = doc['entities']
+        if "parameters" in doc:  # Overwrite default
+            config.parameters = doc['parameters']
+        if "nlp" in doc:  # Overwrite default
+            config.nlp = doc['nlp']
 
-            logger.debug("Using the following configuration:\n%s", config)
-            return config
+        logger.debug("Using the following configuration:\n%s", config)
+        return config
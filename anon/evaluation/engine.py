@@ -0,0 +1,153 @@
+"""This module contains code to evaluate an anonymization using several utility metrics in one pass"""
+import logging
+import math
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from evaluation.information_loss import calculate_attribute_ncp, calculate_original_statistics, calculate_textual_ncp
+from evaluation.partition import get_partition_lengths
+from kernel.util import encode_terms
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_METRICS = ["information_loss", "partition_size", "discernibility", "average_class_size", "suppression"]
+
+
+def evaluate(original, anonymized, partitions, k, relational_attributes, textual_attributes_mapping, metrics=None, original_statistics=None, n_processes=1):
+    """
+    Takes the original dataset, the anonymized dataset, and its partitions and calculates the requested metrics in a single pass.
+    Relational attributes are evaluated once per partition, weighting each partition by its size, since all of its records share the same values.
+    Parameters
+    ----------
+    original: DataFrame
+        The orgininal dataframe.
+    anonymized: DataFrame
+        The anonymized dataframe.
+    partitions: list
+        List of partitions containing indexes of the anonymized dataframe.
+    k: int
+        k the dataset has been anonymized with.
+    relational_attributes: list
+        List containing relational attributes.
+    textual_attributes_mapping: dict
+        Mapping of textual attributes and their helper attributes.
+    metrics: list
+        Metrics to calculate out of information_loss, partition_size, discernibility, average_class_size, and suppression. All metrics are calculated if None (optional).
+    original_statistics: dict
+        Statistics of the original dataframe as calculated by calculate_original_statistics, calculated if None (optional).
+    n_processes: int
+        Number of processes to evaluate attributes in parallel (optional).
+    Returns
+    -------
+    dict
+        Dictionary with the calculated metrics.
+    """
+    metrics = SUPPORTED_METRICS if metrics is None else metrics
+    unsupported_metrics = set(metrics).difference(SUPPORTED_METRICS)
+    if len(unsupported_metrics) > 0:
+        raise Exception("Metrics {} not supported".format(", ".join(sorted(unsupported_metrics))))
+
+    # Partition metrics only depend on partition sizes
+    sizes = np.array(get_partition_lengths(partitions))
+    results = {"number_of_partitions": len(partitions)}
+    if "partition_size" in metrics:
+        results["mean_partition_size"] = np.mean(sizes)
+        results["std_partition_size"] = np.std(sizes)
+    if "discernibility" in metrics:
+        results["discernibility"] = int((sizes ** 2).sum())
+    if "average_class_size" in metrics:
+        results["average_class_size"] = sizes.sum() / (len(partitions) * k)
+    if "information_loss" not in metrics and "suppression" not in metrics:
+        return results
+
+    # Evaluate relational attributes on one representative per partition and entity attributes record by record
+    representatives = [partition[0] for partition in partitions]
+    relational = [attribute for attribute in original if attribute in relational_attributes]
+    if "information_loss" in metrics and original_statistics is None:
+        original_statistics = calculate_original_statistics(original, relational)
+    entity_attributes = [attribute for mapping in textual_attributes_mapping for attribute in textual_attributes_mapping[mapping]]
+    if n_processes > 1:
+        # Sensitive terms refer to their docs, which cannot be pickled to other processes
+        original = encode_terms(original[relational + entity_attributes], entity_attributes)
+        anonymized = encode_terms(anonymized[relational + entity_attributes], entity_attributes)
+    partition_of = None
+    if "suppression" in metrics:
+        partition_of = pd.Series(np.repeat(np.arange(len(partitions)), sizes), index=np.concatenate([np.asarray(partition) for partition in partitions]))  # Partition of every record
+    tasks = []
+    for attribute in relational:
+        statistics = original_statistics[attribute] if original_statistics else None
+        tasks.append((__evaluate_attribute, (original[attribute], anonymized.loc[representatives, attribute], sizes, statistics, metrics, partition_of)))
+    for attribute in entity_attributes:
+        tasks.append((__evaluate_attribute, (original[attribute], anonymized[attribute], None, None, metrics, None)))
+    if "information_loss" in metrics:
+        for mapping in textual_attributes_mapping:
+            attributes = textual_attributes_mapping[mapping]
+            tasks.append((calculate_textual_ncp, ([original[attribute] for attribute in attributes], [anonymized[attribute] for attribute in attributes])))
+
+    if n_processes > 1 and len(tasks) > 1:
+        with Pool(min(n_processes, len(tasks))) as pool:
+            task_results = pool.map(__run, tasks)
+    else:
+        task_results = [__run(task) for task in tasks]
+
+    attribute_results = dict(zip(relational + entity_attributes, task_results))
+    if "suppression" in metrics:
+        results["suppressed_records"] = {attribute: attribute_results[attribute][1] for attribute in attribute_results}
+    if "information_loss" in metrics:
+        textual_totals = dict(zip(textual_attributes_mapping, task_results[len(attribute_results):]))
+        results.update(__combine_information_loss(attribute_results, relational_attributes, textual_attributes_mapping, textual_totals))
+    return results
+
+
+def __run(task):
+    function, arguments = task
+    return function(*arguments)
+
+
+def __evaluate_attribute(original_series, anonymized_series, weights, statistics, metrics, partition_of):
+    """Calculates the information loss and the number of records suppressed by the anonymization for a single attribute, not counting values which have been missing before"""
+    ncp = None
+    suppressed = None
+    if "information_loss" in metrics:
+        ncp = calculate_attribute_ncp(original_series, anonymized_series, weights, statistics)
+    if "suppression" in metrics:
+        anonymized_missing = np.fromiter((__is_missing(value) for value in anonymized_series), dtype=bool, count=len(anonymized_series))
+        if weights is not None:
+            # Representatives stand for all records of their partition, of which the ones missing the value before are not suppressed
+            original_missing = pd.Series([__is_missing(value) for value in original_series], index=original_series.index)
+            missing_per_partition = original_missing.groupby(partition_of).sum().reindex(range(len(weights)), fill_value=0).to_numpy()
+            suppressed = int((weights - missing_per_partition)[anonymized_missing].sum())
+        else:
+            original_missing = np.fromiter((__is_missing(value) for value in original_series.reindex(anonymized_series.index)), dtype=bool, count=len(anonymized_series))
+            suppressed = int((anonymized_missing & ~original_missing).sum())
+    return ncp, suppressed
+
+
+def __is_missing(value):
+    if value is None or value is pd.NaT:
+        return True
+    if isinstance(value, float):
+        return math.isnan(value)
+    return isinstance(value, list) and len(value) == 0
+
+
+def __combine_information_loss(attribute_results, relational_attributes, textual_attributes_mapping, textual_totals):
+    """Combines information loss of single attributes like calculate_normalized_certainty_penalty does"""
+    results = {"attribute_information_loss": {attribute: attribute_results[attribute][0] for attribute in attribute_results}}
+    relational_information_loss = sum(attribute_results[attribute][0] for attribute in attribute_results if attribute in relational_attributes) / len(relational_attributes)
+    results["relational_information_loss"] = relational_information_loss
+    if len(textual_attributes_mapping) == 0:
+        results["textual_information_loss"] = None
+        results["total_information_loss"] = relational_information_loss
+        return results
+
+    textual_information_loss = {}
+    for mapping in textual_attributes_mapping:
+        textual_information_loss[mapping] = {attribute: attribute_results[attribute][0] for attribute in textual_attributes_mapping[mapping]}
+        textual_information_loss[mapping]["total"] = textual_totals[mapping]
+    textual_information_loss["total"] = sum(textual_totals.values()) / len(textual_attributes_mapping)
+    results["textual_information_loss"] = textual_information_loss
+    results["total_information_loss"] = (relational_information_loss + textual_information_loss["total"]) / 2
+    return results
@@ -1,6 +1,9 @@
 """This module contains code to calculate the NCP for heterogeneous datasets"""
 import logging
 import math
+from itertools import chain, repeat
+
+import numpy as np
 import pandas as pd
 from anytree import AnyNode
 from pandas.api.types import is_categorical_dtype, is_datetime64_any_dtype, is_numeric_dtype
@@ -10,10 +13,12 @@ from kernel.recoding import recode_range_hierarchical
 logger = logging.getLogger(__name__)
 
 
-def calculate_normalized_certainty_penalty(original, anonymized, relational_attributes, textual_attributes_mapping):
+def calculate_normalized_certainty_penalty(original, anonymized, relational_attributes, textual_attributes_mapping, partitions=None, original_statistics=None):
     """
     Takes the original dataset, the anonymized dataset, a list or relational quasi-identifying attributes,
     and textual attributes and calculates the Normalized Certainty Penalty (NCP).
+    If the partitions of the anonymized dataset are given, the loss of relational attributes is calculated
+    once per partition and weighted by the partition size, since all records of a partition share the same values.
     Parameters
     ----------
     original: DataFrame
@@ -24,15 +29,28 @@ def calculate_normalized_certainty_penalty(original, anonymized, relational_attr
         List containing relational attributes.
     textual_attributes_mapping: dict
         Mapping of textual attributes and their helper attributes.
+    partitions: list
+        List of partitions containing indexes of the anonymized dataframe (optional).
+    original_statistics: dict
+        Statistics of the original dataframe as calculated by calculate_original_statistics, calculated if None (optional).
     Returns
     -------
     Tuple
         Tuple with total information loss, relational information loss, and detailed textual information loss.
     """
+    # Use the first record of each partition as its representative
+    representatives, weights = None, None
+    if partitions is not None:
+        representatives = [partition[0] for partition in partitions]
+        weights = np.array([len(partition) for partition in partitions])
+
     # Calculate relation information loss
+    if original_statistics is None:
+        original_statistics = calculate_original_statistics(original, relational_attributes)
     relational_information_loss = 0
     for attribute in [attr for attr in original if attr in relational_attributes]:
-        ncp = __calculate_ncp_attribute(original[attribute], anonymized[attribute])
+        anonymized_series = anonymized[attribute] if representatives is None else anonymized.loc[representatives, attribute]
+        ncp = __calculate_ncp_attribute(original[attribute], anonymized_series, weights, original_statistics[attribute])
         relational_information_loss = relational_information_loss + ncp
         logger.debug("Information loss for attribute %s is %4.4f", attribute, ncp)
 
@@ -47,8 +65,6 @@ def calculate_normalized_certainty_penalty(original, anonymized, relational_attr
         for mapping in textual_attributes_mapping:
             textual_attributes = textual_attributes_mapping[mapping]
             textual_information_loss[mapping] = {}
-            original_textual_tokens = []
-            anonymized_textual_tokens = []
 
             # Individual textual information loss per attribute and entity
             for attribute in textual_attributes:
@@ -56,26 +72,8 @@ def calculate_normalized_certainty_penalty(original, anonymized, relational_attr
                 textual_information_loss[mapping][attribute] = attribute_loss
                 logger.debug("Information loss for entity type %s is %4.4f", attribute, attribute_loss)
 
-            # Total textual information loss per attribute
-            for index in original.index:
-                original_container = []
-                anonymized_container = []
-                for attribute in textual_attributes:
-                    original_for_col = original.at[index, attribute]
-                    anonymized_for_col = anonymized.at[index, attribute]
-                    if original_for_col:
-                        original_container += original_for_col
-                    if anonymized_for_col:
-                        anonymized_container += anonymized_for_col
-                if len(original_container) > 0:
-                    original_textual_tokens.append(original_container)
-                else:
-                    original_textual_tokens.append(None)
-                if len(anonymized_container) > 0:
-                    anonymized_textual_tokens.append(anonymized_container)
-                else:
-                    anonymized_textual_tokens.append(None)
-            attribute_total_loss = __calculate_ncp_attribute(pd.Series(original_textual_tokens, index=original.index), pd.Series(anonymized_textual_tokens, index=anonymized.index))
+            # Total textual information loss per attribute, considering terms of all entity types of a record together
+            attribute_total_loss = __ncp_tokens([original[attribute] for attribute in textual_attributes], [anonymized[attribute] for attribute in textual_attributes])
 
             # Set total information loss for a single attribute
             textual_information_loss[mapping]["total"] = attribute_total_loss
@@ -88,120 +86,222 @@ def calculate_normalized_certainty_penalty(original, anonymized, relational_attr
     return relational_information_loss, relational_information_loss, None
 
 
-def __calculate_ncp_attribute(original_series, anonymized_series):
+def calculate_original_statistics(original, relational_attributes):
+    """
+    Takes the original dataset and a list of relational quasi-identifying attributes and precomputes the statistics
+    which generalized values are compared to, so that they can be reused to calculate the NCP of several anonymizations.
+    Parameters
+    ----------
+    original: DataFrame
+        The orgininal dataframe.
+    relational_attributes: list
+        List containing relational attributes.
+    Returns
+    -------
+    dict
+        Dictionary with relational attributes and their statistics.
+    """
+    return {attribute: __get_original_statistics(original[attribute]) for attribute in original if attribute in relational_attributes}
+
+
+def calculate_attribute_ncp(original_series, anonymized_series, weights=None, statistics=None):
+    """
+    Takes an original and an anonymized series and calculates the NCP of a single attribute.
+    Parameters
+    ----------
+    original_series: Series
+        The original series.
+    anonymized_series: Series
+        The anonymized series, or one representative per partition if weights are given.
+    weights: array
+        Number of records each anonymized value stands for (optional).
+    statistics: dict
+        Statistics of the original series as calculated by calculate_original_statistics, calculated if None (optional).
+    Returns
+    -------
+    float
+        Information loss of the attribute.
+    """
+    return __calculate_ncp_attribute(original_series, anonymized_series, weights, statistics)
+
+
+def calculate_textual_ncp(original_columns, anonymized_columns):
+    """
+    Takes original and anonymized entity columns of a textual attribute and calculates the NCP considering the terms of all entity types of a record together.
+    Parameters
+    ----------
+    original_columns: list
+        List of original series containing token lists.
+    anonymized_columns: list
+        List of anonymized series containing token lists.
+    Returns
+    -------
+    float
+        Information loss of the textual attribute.
+    """
+    return __ncp_tokens(original_columns, anonymized_columns)
+
+
+def __get_original_statistics(original_series):
     if must_be_flattened(original_series):
-        original_flattened, original_indexes, is_category = flatten_set_valued_series(original_series)
-        if is_categorical_dtype(original_series) or is_category:
-            original_flattened_series = pd.Series(original_flattened, index=original_indexes, dtype="category", name=original_series.name)
-        else:
-            original_flattened_series = pd.Series(original_flattened, index=original_indexes, name=original_series.name)
-        ncp = __calculate_ncp_attribute(original_flattened_series, anonymized_series)
-    elif is_node(anonymized_series):  # Has been anonymized using a hierarchy
-        ncp = __ncp_numerical_hierarchy(original_series, anonymized_series)
+        return {"type": "flattened", "statistics": __get_original_statistics(__flatten(original_series))}
     elif is_datetime64_any_dtype(original_series):
-        ncp = __ncp_date(original_series, anonymized_series)
+        unique_dates = original_series.unique()
+        return {
+            "type": "date",
+            "n_unique": len(unique_dates),
+            "n_unique_per_year": pd.Series(pd.DatetimeIndex(unique_dates).year).value_counts().to_dict(),
+            "sorted_days": np.unique(original_series.dt.normalize().dropna().to_numpy())  # Distinct days to count days within periods by binary search
+        }
     elif is_categorical_dtype(original_series):
-        ncp = __ncp_categorical(original_series, anonymized_series)
+        return {"type": "categorical", "n_unique": len(original_series.unique())}
     elif is_numeric_dtype(original_series):
-        ncp = __ncp_numerical(original_series, anonymized_series)
+        return {"type": "numerical", "min": original_series.min(), "max": original_series.max()}
     elif is_token_list(original_series):
-        ncp = __ncp_tokens(original_series, anonymized_series)
+        return {"type": "tokens", "series": original_series}
+    return {"type": "set_valued", "statistics": __get_original_statistics(__flatten(original_series))}
+
+
+def __flatten(series):
+    flattened, indexes, is_category = flatten_set_valued_series(series)
+    if is_categorical_dtype(series) or is_category:
+        return pd.Series(flattened, index=indexes, dtype="category", name=series.name)
+    return pd.Series(flattened, index=indexes, name=series.name)
+
+
+def __calculate_ncp_attribute(original_series, anonymized_series, weights=None, statistics=None):
+    if statistics is None:
+        statistics = __get_original_statistics(original_series)
+    if statistics["type"] == "flattened":
+        ncp = __calculate_ncp_attribute(None, anonymized_series, weights, statistics["statistics"])
+    elif is_node(anonymized_series):  # Has been anonymized using a hierarchy
+        ncp = __ncp_numerical_hierarchy(statistics, anonymized_series, weights)
+    elif statistics["type"] == "date":
+        ncp = __ncp_date(statistics, anonymized_series, weights)
+    elif statistics["type"] == "categorical":
+        ncp = __ncp_categorical(statistics, anonymized_series, weights)
+    elif statistics["type"] == "numerical":
+        ncp = __ncp_numerical(statistics, anonymized_series, weights)
+    elif statistics["type"] == "tokens":
+        ncp = __ncp_tokens([statistics["series"]], [anonymized_series])
     else:
-        ncp = __ncp_set_valued(original_series, anonymized_series)
+        ncp = __ncp_set_valued(statistics, anonymized_series, weights)
     return ncp
 
 
-def __ncp_numerical(original_series, anonymized_series):
-    orig_min = math.floor(original_series.min())
-    orig_max = math.ceil(original_series.max())
+def __weighted_values(anonymized_series, weights):
+    """Returns pairs of anonymized values and their weights as well as the total weight, each value counting once if no weights are given"""
+    if weights is None:
+        return zip(anonymized_series, repeat(1)), len(anonymized_series)
+    return zip(anonymized_series, weights), weights.sum()
+
+
+def __ncp_numerical(statistics, anonymized_series, weights=None):
+    orig_min = math.floor(statistics["min"])
+    orig_max = math.ceil(statistics["max"])
     orig_range = orig_max - orig_min + 1
     acc_information_loss = 0
-    for value in anonymized_series:
+    weighted_values, total_weight = __weighted_values(anonymized_series, weights)
+    for value, weight in weighted_values:
         if not isinstance(value, range):
             pass
         else:
             anonymized_range = len(value)
-            acc_information_loss = acc_information_loss + (anonymized_range / orig_range)
-    normalized_information_loss = acc_information_loss / len(anonymized_series)
+            acc_information_loss = acc_information_loss + weight * (anonymized_range / orig_range)
+    normalized_information_loss = acc_information_loss / total_weight
     return normalized_information_loss
 
 
-def __ncp_numerical_hierarchy(original_series, anonymized_series):
+def __ncp_numerical_hierarchy(statistics, anonymized_series, weights=None):
     for value in anonymized_series:
         if isinstance(value, AnyNode):
             hierarchy = value.root
             break
-    worst_generalization = recode_range_hierarchical(original_series, hierarchy)
+    worst_generalization = recode_range_hierarchical(pd.Series([statistics["min"], statistics["max"]]), hierarchy)
     worst_generalization_range = len(worst_generalization.range)
     acc_information_loss = 0
-    for value in anonymized_series:
+    weighted_values, total_weight = __weighted_values(anonymized_series, weights)
+    for value, weight in weighted_values:
         if not isinstance(value, AnyNode):
             pass
         else:
             anonymized_range = len(value.range)
-            acc_information_loss = acc_information_loss + (anonymized_range / worst_generalization_range)
-    normalized_information_loss = acc_information_loss / len(anonymized_series)
+            acc_information_loss = acc_information_loss + weight * (anonymized_range / worst_generalization_range)
+    normalized_information_loss = acc_information_loss / total_weight
     return normalized_information_loss
 
 
-def __ncp_categorical(original_series, anonymized_series):
-    orig_n_categories = len(original_series.unique())
+def __ncp_categorical(statistics, anonymized_series, weights=None):
+    orig_n_categories = statistics["n_unique"]
     acc_information_loss = 0
-    for value in anonymized_series:
+    weighted_values, total_weight = __weighted_values(anonymized_series, weights)
+    for value, weight in weighted_values:
         if isinstance(value, frozenset):  # Otherwise it is only one value -> ncp of 0
             anon_n_categories = len(value)
-            acc_information_loss = acc_information_loss + (anon_n_categories / orig_n_categories)
-    normalized_information_loss = acc_information_loss / len(anonymized_series)
+            acc_information_loss = acc_information_loss + weight * (anon_n_categories / orig_n_categories)
+    normalized_information_loss = acc_information_loss / total_weight
     return normalized_information_loss
 
 
-def __ncp_set_valued(original_series, anonymized_series):
-    original_flattened, original_indexes, _ = flatten_set_valued_series(original_series)
+def __ncp_set_valued(statistics, anonymized_series, weights=None):
     anonymized_flattened, anonymized_indexes, _ = flatten_set_valued_series(anonymized_series)
-    if is_categorical_dtype(original_series):
-        original_flattened_series = pd.Series(original_flattened, index=original_indexes, dtype="category", name=original_series.name)
-    else:
-        original_flattened_series = pd.Series(original_flattened, index=original_indexes, name=original_series.name)
-
+    if weights is not None:
+        weights = pd.Series(weights, index=anonymized_series.index).loc[anonymized_indexes].to_numpy()  # Each value weighs as much as its record
     if is_categorical_dtype(anonymized_series):
         anonymized_flattened_series = pd.Series(anonymized_flattened, index=anonymized_indexes, dtype="category", name=anonymized_series.name)
     else:
         anonymized_flattened_series = pd.Series(anonymized_flattened, index=anonymized_indexes, name=anonymized_series.name)
-
-    return __calculate_ncp_attribute(original_flattened_series, anonymized_flattened_series)
+    return __calculate_ncp_attribute(None, anonymized_flattened_series, weights, statistics["statistics"])
 
 
-def __ncp_date(original_series, anonymized_series):
-    orig_unique_dates = len(original_series.unique())
+def __ncp_date(statistics, anonymized_series, weights=None):
+    orig_unique_dates = statistics["n_unique"]
+    sorted_days = statistics["sorted_days"]
     acc_information_loss = 0
-    for value in anonymized_series:
+    weighted_values, total_weight = __weighted_values(anonymized_series, weights)
+    for value, weight in weighted_values:
         if isinstance(value, range):
-            anon_unique_dates = 0
-            for year in value:
-                anon_unique_dates = anon_unique_dates + len(original_series[original_series.dt.year == year].unique())
-            acc_information_loss = acc_information_loss + (anon_unique_dates / orig_unique_dates)
+            anon_unique_dates = sum(statistics["n_unique_per_year"].get(year, 0) for year in value)
+            acc_information_loss = acc_information_loss + weight * (anon_unique_dates / orig_unique_dates)
         elif isinstance(value, pd.Period):
-            start_date = value.start_time.normalize()
-            end_date = value.end_time.normalize()
-            original_series = original_series.dt.normalize()
-            anon_unique_dates = len(original_series.loc[(
-                original_series >= start_date) & (original_series <= end_date)].unique())
-            acc_information_loss = acc_information_loss + (anon_unique_dates / orig_unique_dates)
-    normalized_information_loss = acc_information_loss / len(anonymized_series)
+            start_date = np.datetime64(value.start_time.normalize(), "ns")
+            end_date = np.datetime64(value.end_time.normalize(), "ns")
+            anon_unique_dates = np.searchsorted(sorted_days, end_date, side="right") - np.searchsorted(sorted_days, start_date, side="left")
+            acc_information_loss = acc_information_loss + weight * (anon_unique_dates / orig_unique_dates)
+    normalized_information_loss = acc_information_loss / total_weight
     return normalized_information_loss
 
 
-def __ncp_tokens(original_series, anonymized_series):
-    acc_information_loss = 0
-    original_series = original_series.dropna()
-    anonymized_series = anonymized_series.dropna()
-    for index in original_series.index:
-        original = original_series[index]
-        if index not in anonymized_series.index:
-            acc_information_loss = acc_information_loss + 1  # Since no entities remain
-        else:
-            anonymized = anonymized_series[index]
-            anonymized = set(anonymized).intersection(set(original))
-            acc_information_loss = acc_information_loss + (1 - (len(anonymized) / len(original)))
-    normalized_information_loss = acc_information_loss / len(original_series)
+def __ncp_tokens(original_columns, anonymized_columns):
+    """Calculates the mean share of terms per record not remaining after anonymization, based on flat arrays of records and term ids"""
+    if len(original_columns) == 0:
+        return 0  # No terms to lose
+    original_index = original_columns[0].index
+    original_records, original_terms, term_ids = __flatten_token_lists(original_columns, {})
+    anonymized_records, anonymized_terms, term_ids = __flatten_token_lists([series.reindex(original_index) for series in anonymized_columns], term_ids)
+
+    # Count distinct terms per record remaining within the anonymized record
+    n_terms = max(len(term_ids), 1)
+    original_keys = np.unique(original_records * n_terms + original_terms)
+    remaining_keys = original_keys[np.isin(original_keys, anonymized_records * n_terms + anonymized_terms)]
+    remaining = np.bincount(remaining_keys // n_terms, minlength=len(original_index))
+
+    # Only records with terms count, relating remaining distinct terms to all terms of a record
+    lengths = np.bincount(original_records, minlength=len(original_index))
+    has_terms = lengths > 0
+    if not has_terms.any():
+        return 0  # No terms to lose
+    normalized_information_loss = (1 - remaining[has_terms] / lengths[has_terms]).sum() / has_terms.sum()
     return normalized_information_loss
+
+
+def __flatten_token_lists(columns, term_ids):
+    """Flattens series of token lists or sets into arrays of record positions and term ids, extending the given term ids by unseen terms"""
+    records = []
+    terms = []
+    for series in columns:
+        lengths = np.fromiter((len(value) if isinstance(value, (list, set, frozenset)) else 0 for value in series), dtype=np.int64, count=len(series))
+        records.append(np.repeat(np.arange(len(series)), lengths))
+        token_lists = (value for value in series if isinstance(value, (list, set, frozenset)))  # Recoded terms are sets
+        terms.append(np.fromiter((term_ids.setdefault(term, len(term_ids)) for term in chain.from_iterable(token_lists)), dtype=np.int64, count=lengths.sum()))
+    return np.concatenate(records), np.concatenate(terms), term_ids
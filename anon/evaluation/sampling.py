@@ -0,0 +1,119 @@
+"""This module contains code to draw samples of datasets and to estimate metrics from them"""
+import logging
+import math
+import statistics
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
+
+logger = logging.getLogger(__name__)
+
+N_STRATA_BINS = 10
+MIN_SCALED_K = 2  # Smaller k would not group records at all
+
+
+def stratified_sample(df, fraction, strata_attribute=None, random_state=None):
+    """
+    Takes a DataFrame and draws a sample containing the given fraction of records from each stratum, but at least one record per stratum.
+    Records missing the strata attribute form a stratum of their own.
+    Parameters
+    ----------
+    df: DataFrame
+        DataFrame to sample from.
+    fraction: float
+        Fraction of records to sample.
+    strata_attribute: str
+        Attribute whose values define the strata. Numerical and date attributes are binned into quantiles (optional).
+    random_state: int
+        Seed for the random number generator (optional).
+    Returns
+    -------
+    DataFrame
+        Sampled DataFrame keeping the original index.
+    """
+    if strata_attribute is None:
+        return df.sample(frac=fraction, random_state=random_state).sort_index()
+    strata = get_strata(df[strata_attribute])
+    random_state = np.random.RandomState(random_state)
+    return df.groupby(strata, dropna=False, group_keys=False).apply(lambda stratum: stratum.sample(n=max(1, int(round(len(stratum) * fraction))), random_state=random_state)).sort_index()
+
+
+def get_strata(series):
+    """
+    Takes a series and returns a series with a stratum label for each record.
+    Parameters
+    ----------
+    series: Series
+        Series to derive the strata from.
+    Returns
+    -------
+    Series
+        Series with stratum labels.
+    """
+    if is_numeric_dtype(series) or is_datetime64_any_dtype(series):
+        return pd.qcut(series.rank(method="first"), q=min(N_STRATA_BINS, len(series)), labels=False)
+    return series.map(lambda value: ",".join(sorted(str(v) for v in value)) if isinstance(value, (set, frozenset)) else str(value))
+
+
+def get_sample_fraction(k_values, fraction):
+    """
+    Returns the fraction of records to sample, raised if needed so that the smallest k still scales to MIN_SCALED_K.
+    Parameters
+    ----------
+    k_values: list
+        k values to estimate results for.
+    fraction: float
+        Requested fraction of records within the samples.
+    Returns
+    -------
+    float
+        Fraction of records to sample.
+    """
+    minimal_fraction = min(1.0, MIN_SCALED_K / min(k_values))
+    if fraction < minimal_fraction:
+        logger.warning("Raised the sample fraction from %.3f to %.3f, since k=%d would scale below k=%d on smaller samples", fraction, minimal_fraction, min(k_values), MIN_SCALED_K)
+        return minimal_fraction
+    return fraction
+
+
+def scale_k(k, fraction):
+    """
+    Scales k to a sample with the given fraction of records.
+    Parameters
+    ----------
+    k: int
+        k for the complete dataset.
+    fraction: float
+        Fraction of records within the sample.
+    Returns
+    -------
+    int
+        k for the sample.
+    """
+    scaled_k = int(round(k * fraction))
+    if scaled_k < MIN_SCALED_K:
+        raise Exception("k={} scales to k={} on samples of {:.1%} of the records, which would not group records at all. Use a larger sample.".format(k, scaled_k, fraction))
+    return scaled_k
+
+
+def confidence_interval(values, confidence=0.95):
+    """
+    Takes a list of replicate values and returns their mean and the bounds of the confidence interval for the mean.
+    Parameters
+    ----------
+    values: list
+        Values measured on independent samples.
+    confidence: float
+        Confidence level.
+    Returns
+    -------
+    tuple
+        Mean, lower bound, and upper bound.
+    """
+    mean = statistics.mean(values)
+    if len(values) < 2:
+        return mean, mean, mean
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    margin = z * statistics.stdev(values) / math.sqrt(len(values))
+    return mean, mean - margin, mean + margin
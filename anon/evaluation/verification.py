@@ -0,0 +1,118 @@
+"""This module contains code to verify that an anonymized dataset is k-anonymous"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+N_VIOLATION_EXAMPLES = 10
+
+
+def verify_k_anonymity(chunks, signature_columns, k, person_column):
+    """
+    Takes chunks of an anonymized dataset and verifies that each equivalence class, i.e., records sharing the same values for all signature columns,
+    contains at least k persons. Signatures are hashed per record, so memory is bounded by the number of equivalence classes.
+    Parameters
+    ----------
+    chunks: iterable
+        Iterable of DataFrames, e.g., as read by read_raw_chunks.
+    signature_columns: list
+        Columns whose generalized values define equivalence classes, like quasi-identifiers and exported entity signatures.
+    k: int
+        Minimal number of persons per equivalence class.
+    person_column: str
+        Column identifying persons. Records are counted instead if None, which only proves k-anonymity if every person has a single record.
+    Returns
+    -------
+    tuple
+        Report with number of records and classes, class size distribution, and violations, as well as the class sizes by signature hash.
+    """
+    if person_column is None:
+        logger.warning("Counting records instead of persons, which does not prove k-anonymity if persons have multiple records")
+    class_sizes = pd.Series(dtype=np.int64)
+    person_pairs = []
+    n_records = 0
+    for chunk in chunks:
+        n_records += len(chunk)
+        signatures = hash_signatures(chunk, signature_columns)
+        if person_column is None:
+            class_sizes = class_sizes.add(pd.Series(signatures).value_counts(), fill_value=0)
+        else:
+            persons = pd.util.hash_pandas_object(chunk[person_column], index=False).to_numpy()
+            person_pairs.append(np.unique(np.column_stack([signatures, persons]), axis=0))
+    if len(person_pairs) > 0:
+        pairs = np.unique(np.concatenate(person_pairs), axis=0)  # Persons can appear in several chunks
+        class_sizes = pd.Series(pairs[:, 0]).value_counts()
+    class_sizes = class_sizes.astype(np.int64)
+    logger.info("Found %d equivalence classes within %d records", len(class_sizes), n_records)
+
+    violating_class_sizes = class_sizes[class_sizes < k]
+    report = {
+        "k": k,
+        "signature_columns": signature_columns,
+        "unit": "records" if person_column is None else "persons",
+        "number_of_records": n_records,
+        "number_of_classes": len(class_sizes),
+        "min_class_size": int(class_sizes.min()) if len(class_sizes) > 0 else 0,
+        "max_class_size": int(class_sizes.max()) if len(class_sizes) > 0 else 0,
+        "mean_class_size": float(class_sizes.mean()) if len(class_sizes) > 0 else 0.0,
+        "class_size_distribution": {int(size): int(count) for size, count in class_sizes.value_counts().sort_index().items()},
+        "number_of_violating_classes": len(violating_class_sizes),
+        "number_of_violating_units": int(violating_class_sizes.sum()),
+        "k_anonymous": len(violating_class_sizes) == 0
+    }
+    return report, class_sizes
+
+
+def collect_violation_examples(chunks, signature_columns, k, class_sizes, n_examples=N_VIOLATION_EXAMPLES):
+    """
+    Takes chunks of an anonymized dataset and collects the signature values of equivalence classes smaller than k.
+    Parameters
+    ----------
+    chunks: iterable
+        Iterable of DataFrames as given to verify_k_anonymity.
+    signature_columns: list
+        Columns whose generalized values define equivalence classes.
+    k: int
+        Minimal number of persons per equivalence class.
+    class_sizes: Series
+        Class sizes by signature hash as returned by verify_k_anonymity.
+    n_examples: int
+        Maximal number of examples to collect (optional).
+    Returns
+    -------
+    list
+        List of dictionaries with the signature values and the size of violating classes.
+    """
+    examples = {}
+    for chunk in chunks:
+        signatures = pd.Series(hash_signatures(chunk, signature_columns), index=chunk.index)
+        violating = signatures[signatures.map(class_sizes) < k].drop_duplicates()
+        for index, signature in violating.items():
+            if len(examples) >= n_examples:
+                return list(examples.values())
+            if signature not in examples:
+                example = {column: None if pd.isnull(chunk.at[index, column]) else str(chunk.at[index, column]) for column in signature_columns}
+                example["class_size"] = int(class_sizes[signature])
+                examples[signature] = example
+    return list(examples.values())
+
+
+def hash_signatures(chunk, signature_columns):
+    """
+    Hashes the values of all signature columns per record into a single unsigned 64 bit integer
+    Parameters
+    ----------
+    chunk: DataFrame
+        DataFrame containing the signature columns.
+    signature_columns: list
+        Columns whose values are hashed.
+    Returns
+    -------
+    array
+        Array with one hash per record.
+    """
+    if len(signature_columns) == 0:
+        return np.zeros(len(chunk), dtype=np.uint64)
+    return pd.util.hash_pandas_object(chunk[signature_columns], index=False).to_numpy()
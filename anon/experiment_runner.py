@@ -13,9 +13,12 @@ import os
 import json
 
 from configuration.configuration_reader import ConfigurationReader
-from evaluation.information_loss import calculate_normalized_certainty_penalty
-from evaluation.partition import get_partition_lengths, calculate_mean_partition_size, calculate_std_partition_size, get_partition_split_share
+from evaluation.engine import evaluate
+from evaluation.information_loss import calculate_original_statistics
+from evaluation.partition import get_partition_lengths, get_partition_split_share
 from kernel.anonymization_kernel import AnonymizationKernel
+from logger.instrumentation import Instrumentation
+from logger.profiler import DEFAULT_SAMPLING_INTERVAL, Profiler
 from nlp.sensitive_terms_recognizer import SensitiveTermsRecognizer
 from preprocessing.data_reader import DataReader
 from preprocessing.preprocessor import Preprocessor
@@ -31,13 +34,18 @@ def main(argv):
     use_cache = True
     weight = 0.5
     strategy = "gdf"
+    relaxed = False
     result_dir = None
+    report = False
+    trace_memory = False
+    profile_stages = []
+    profile_interval = DEFAULT_SAMPLING_INTERVAL
 
     # Read and set tool parameters
     try:
-        opts, _ = getopt.getopt(argv, "c:i:r:w:v", ["config=", "input=", "weight=", "result_dir=", "verbose"])
+        opts, _ = getopt.getopt(argv, "c:i:r:w:xvt", ["config=", "input=", "weight=", "result_dir=", "relaxed", "verbose", "report", "trace_memory", "profile=", "profile_interval="])
     except getopt.GetoptError:
-        logger.error('experiment_runner.py -c <config_file> -i <input_file> -w <relational_weight>')
+        logger.error('experiment_runner.py -c <config_file> -i <input_file> -w <relational_weight> [-x] [--report] [-t] [--profile <stages>] [--profile_interval <seconds>]')
         sys.exit(2)
     for opt, arg in opts:
         if opt in ("-c", "--config"):
@@ -52,9 +60,23 @@ def main(argv):
             strategy = "mondrian"
         if opt in ("-r", "--result_dir"):
             result_dir = arg
+        if opt in ("-x", "--relaxed"):
+            relaxed = True
+        if opt == "--report":
+            report = True
+        if opt in ("-t", "--trace_memory"):
+            report = True
+            trace_memory = True
+        if opt == "--profile":
+            profile_stages = [stage.strip() for stage in arg.split(",") if stage.strip()]
+        if opt == "--profile_interval":
+            profile_interval = float(arg)
         if opt in ("-v", "--verbose"):
             logging.getLogger().setLevel(logging.DEBUG)
 
+    if strategy == "mondrian" and relaxed:
+        strategy = "relaxed_mondrian"
+
     result_path = Path("experiment_results") / result_dir
     result_path.mkdir(parents=True, exist_ok=True)
 
@@ -65,9 +87,17 @@ def main(argv):
     configuration_reader = ConfigurationReader()
     config = configuration_reader.read(configuration_file)
 
+    # Initialize the instrumentation measuring time, memory, and counters of every stage, profiling selected stages
+    profiler = None
+    if profile_stages:
+        profiler = Profiler(profile_stages, result_path / "profile", profile_interval)
+    instrumentation = Instrumentation(trace_memory, profiler)
+
     # Read data using data types defined in the configuration
     data_reader = DataReader(config)
-    df = data_reader.read(input_file)
+    with instrumentation.stage("reading") as stage:
+        df = data_reader.read(input_file)
+    instrumentation.count(stage, "records", len(df))
 
     # Initialize the sensitive terms recognizer
     sensitive_terms_recognizer = SensitiveTermsRecognizer(config, use_cache)
@@ -76,17 +106,14 @@ def main(argv):
     pp = Preprocessor(sensitive_terms_recognizer, config, df)
 
     # Run through preprocessing of dataframe: Data cleansing, analysis of textual attributes, resolving of redundant information, and compression
-    pp.clean_textual_attributes()
-    pp.analyze_textual_attributes()
-    pp.find_redundant_information()
-    pp.compress()
+    pp.preprocess(instrumentation)
 
     # Get sensitive terms dictionary and preprocessed dataframe
     terms = pp.get_sensitive_terms()
     df = pp.get_df()
 
     # Initialize the anonymization kernel by providing the sensitive terms dictionary, the configuration, the sensitive terms recognizer, and the preprocessor
-    kernel = AnonymizationKernel(terms, config, sensitive_terms_recognizer, pp)
+    kernel = AnonymizationKernel(terms, config, sensitive_terms_recognizer, pp, instrumentation)
     unanonymized = df
 
     # Determine k values for experiment
@@ -94,14 +121,16 @@ def main(argv):
     biases = config.get_biases()
 
     # Set strategy names
-    if strategy == "mondrian":
-        strategy_name = "mondrian-{}".format(weight)
+    if strategy in ["mondrian", "relaxed_mondrian"]:
+        strategy_name = "{}-{}".format(strategy, weight)
     elif strategy == "gdf":
         strategy_name = strategy
 
     # Parameters for calculating metrics
     quasi_identifiers = config.get_quasi_identifiers()
     textual_attribute_mapping = pp.get_textual_attribute_mapping()
+    with instrumentation.stage("metrics"):
+        original_statistics = calculate_original_statistics(unanonymized, quasi_identifiers)
 
     # Prepare dataframes and json to store experiment results
     total_information_loss = pd.DataFrame(index=k_values, columns=[strategy_name])
@@ -122,28 +151,41 @@ def main(argv):
     detailed_textual_information_loss = pd.DataFrame(index=k_values, columns=pd.MultiIndex.from_product([detailed_loss_level_0, detailed_loss_level_1]))
     detailed_textual_information_loss.index.name = 'k'
 
+    utility_metrics = pd.DataFrame(index=k_values, columns=["discernibility", "average_class_size", "mean_partition_size", "std_partition_size"])
+    utility_metrics.index.name = 'k'
+
+    suppressed_records_per_attribute = pd.DataFrame(index=k_values, columns=quasi_identifiers + [e for k in textual_attribute_mapping for e in textual_attribute_mapping[k]])
+    suppressed_records_per_attribute.index.name = 'k'
+
     partition_sizes = {}
     partition_sizes[strategy_name] = {}
 
     partition_splits = {}
     partition_splits[strategy_name] = {}
 
+    partition_refinements = {}
+    partition_refinements[strategy_name] = {}
+
     # Let's start the experiments
     for k in k_values:
         logger.info("-------------------------------------------------------------------------------")
         logger.info("Anonymizing dataset with k=%d and strategy %s", k, strategy_name)
 
-        # Anonymize dataset for a specific k
-        anonymized_df, partitions, partition_split_statistics = kernel.anonymize_quasi_identifiers(df, k, strategy, biases, weight)
+        # Anonymize dataset for a specific k, stages are measured per k
+        with instrumentation.stage("k_{}".format(k)) as stage:
+            anonymized_df, partitions, partition_split_statistics = kernel.anonymize_quasi_identifiers(df, k, strategy, biases, weight)
 
-        # Calculating the total, relational, and textual information loss based on the original and anonymized data frame
-        total_il, relational_il, textual_il = calculate_normalized_certainty_penalty(unanonymized, anonymized_df, quasi_identifiers, textual_attribute_mapping)
+            # Calculating information loss, partition sizes, discernibility, average equivalence class size, and suppressed records in one pass
+            with instrumentation.stage("metrics"):
+                metrics = evaluate(unanonymized, anonymized_df, partitions, k, quasi_identifiers, textual_attribute_mapping, original_statistics=original_statistics, n_processes=config.get_processes())
+        total_il, relational_il, textual_il = metrics["total_information_loss"], metrics["relational_information_loss"], metrics["textual_information_loss"]
+        mean_partition_size, std_partition_size = metrics["mean_partition_size"], metrics["std_partition_size"]
 
-        # Calculating the mean and std for partition size as well as split statistics
-        mean_partition_size = calculate_mean_partition_size(partitions)
-        std_partition_size = calculate_std_partition_size(partitions)
+        # Calculating split statistics
         if partition_split_statistics:
             number_of_relational_splits, number_of_textual_splits = get_partition_split_share(partition_split_statistics, textual_attribute_mapping)
+            instrumentation.set_counter(stage + "/partitioning", "relational_splits", number_of_relational_splits)
+            instrumentation.set_counter(stage + "/partitioning", "textual_splits", number_of_textual_splits)
 
         # Notify about the results
         logger.info("Information loss for relational attributes is %4.4f", relational_il)
@@ -169,7 +211,15 @@ def main(argv):
                             entity_type = subkey.replace("{}_".format(key), '')
                             detailed_textual_information_loss.at[k, (key, entity_type)] = textual_il[key][subkey]
 
+        for metric in utility_metrics.columns:
+            utility_metrics.at[k, metric] = metrics[metric]
+        for attribute, suppressed_records in metrics["suppressed_records"].items():
+            suppressed_records_per_attribute.at[k, attribute] = suppressed_records
+
         partition_sizes[strategy_name][k] = get_partition_lengths(partitions)
+        refinement_statistics = kernel.get_refinement_statistics()
+        if refinement_statistics:
+            partition_refinements[strategy_name][k] = refinement_statistics
         if partition_split_statistics:
             partition_splits[strategy_name][k] = {
                 "relational": number_of_relational_splits,
@@ -179,6 +229,8 @@ def main(argv):
     # Define file info
     if strategy == "mondrian":
         file_info = str(weight).replace(".", "_")
+    elif strategy == "relaxed_mondrian":
+        file_info = "relaxed_{}".format(str(weight).replace(".", "_"))
     elif strategy == "gdf":
         file_info = strategy
 
@@ -190,11 +242,19 @@ def main(argv):
         with open(result_path / 'partition_splits_{}.json'.format(file_info), 'w') as f:
             json.dump(partition_splits, f, ensure_ascii=False)
 
+    if partition_refinements[strategy_name]:
+        with open(result_path / 'partition_refinements_{}.json'.format(file_info), 'w') as f:
+            json.dump(partition_refinements, f, ensure_ascii=False)
+
     total_information_loss.to_csv(result_path / "total_information_loss_{}.csv".format(file_info))
     relational_information_loss.to_csv(result_path / "relational_information_loss_{}.csv".format(file_info))
+    utility_metrics.to_csv(result_path / "utility_metrics_{}.csv".format(file_info))
+    suppressed_records_per_attribute.to_csv(result_path / "suppressed_records_{}.csv".format(file_info))
     if textual_il:
         textual_information_loss.to_csv(result_path / "textual_information_loss_{}.csv".format(file_info))
         detailed_textual_information_loss.to_csv(result_path / "detailed_textual_information_loss_{}.csv".format(file_info))
+    if report:
+        instrumentation.save(result_path / "instrumentation_{}.json".format(file_info))
 
 
 if __name__ == "__main__":
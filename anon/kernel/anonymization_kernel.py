@@ -1,22 +1,31 @@
 """This module contains code to anonymize a dataset wrapping around k-anonymity"""
 import logging
+import secrets
+
+import pandas as pd
 
 from kernel.k_anonymity import KAnonymity
+from logger.instrumentation import Instrumentation
 
 logger = logging.getLogger(__name__)
 
+PSEUDONYM_ATTRIBUTE = "person"
+
 
 class AnonymizationKernel:
     """
     Anonymization kernel which takes a configuration, the term frequency distribution,
-    the named entity recognition module and the preprocessor.
+    the named entity recognition module and the preprocessor. Partitioning and recoding are measured as stages of the given instrumentation.
     """
 
-    def __init__(self, terms, config, ner, pp):
+    def __init__(self, terms, config, ner, pp, instrumentation=None):
         self.__terms = terms
         self.__config = config
         self.__ner = ner
         self.__preprocessor = pp
+        self.__instrumentation = instrumentation or Instrumentation()
+        self.__refinement_statistics = None
+        self.__pseudonym_key = secrets.token_hex(8)  # Pseudonyms cannot be linked to persons across runs
 
     def anonymize_quasi_identifiers(self, df, k=None, strategy=None, biases=None, relational_weight=None):
         """
@@ -48,9 +57,19 @@ class AnonymizationKernel:
             relational_weight = self.__config.get_relational_weight()
         return self.__apply_k_anonymity(df.copy(), k, strategy, biases, relational_weight)
 
+    def get_refinement_statistics(self):
+        """
+        Returns refinement statistics of the last Mondrian partitioning, None if not available
+        Returns
+        -------
+        dict
+            Dictionary with number of splits, elapsed time, and partitions and records left unrefined due to budgets.
+        """
+        return self.__refinement_statistics
+
     def remove_direct_identifier(self, df):
         """
-        Removes direct identifiers given a dataframe
+        Removes direct identifiers given a dataframe, replacing the key attribute by keyed hashes if person pseudonyms are configured
         Parameters
         ----------
         df: DataFrame
@@ -61,14 +80,28 @@ class AnonymizationKernel:
             Anonymized DataFrame.
         """
         direct_identifiers = self.__config.get_direct_identifiers()
+        pseudonyms = None
+        if self.__config.get_person_pseudonyms():
+            pseudonyms = pd.util.hash_pandas_object(df[self.__config.get_key_attribute()].astype(str), index=False, hash_key=self.__pseudonym_key).to_numpy()
         df = df.drop(columns=direct_identifiers)
+        if pseudonyms is not None:
+            df.insert(0, PSEUDONYM_ATTRIBUTE, pseudonyms)
         logger.info("Dropped direct identifying attributes %s", ", ".join(direct_identifiers))
         return df
 
     def __apply_k_anonymity(self, df, k, strategy, bias, relational_weight):
         quasi_identifiers = self.__config.get_quasi_identifiers()
         k_anonymity = KAnonymity(df, quasi_identifiers, k, strategy, bias, relational_weight, self.__terms, self.__config)
-        anonymized_df, partitions, partition_split_statistics = k_anonymity.anonymize()
+        with self.__instrumentation.stage("partitioning") as stage:
+            partitions, partition_split_statistics = k_anonymity.partition()
+            self.__refinement_statistics = k_anonymity.get_refinement_statistics()
+        self.__instrumentation.count(stage, "partitions", len(partitions))
+        if self.__refinement_statistics:
+            self.__instrumentation.count(stage, "splits", self.__refinement_statistics["splits"])
+            self.__instrumentation.set_counter(stage, "max_depth", self.__refinement_statistics["max_depth"])
+        with self.__instrumentation.stage("recoding") as stage:
+            anonymized_df = k_anonymity.recode(partitions)
+        self.__instrumentation.count(stage, "records", len(anonymized_df))
         for col in anonymized_df.columns:
             df[col] = anonymized_df[col]
         return df, partitions, partition_split_statistics
@@ -0,0 +1,344 @@
+"""This module contains code to keep the state of an anonymization on disk, so that appended records can be anonymized incrementally"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+from pathlib import Path
+
+import pandas as pd
+
+from kernel.partitioning import route
+
+try:
+    import pyarrow.parquet as parquet
+except ImportError:
+    parquet = None
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "state.pkl"
+
+
+class IncrementalState:
+    """
+    State of an incremental anonymization, containing the records read so far, the split tree Mondrian has built, the persons within each leaf of the tree,
+    and the anonymized records of each leaf. Records of new or changed persons are routed into existing leaves, so that only the affected leaves need to be
+    partitioned, recoded, and postprocessed again. The state is only valid for the configuration it has been built with.
+    Records read so far and anonymized records are kept in Parquet files per leaf, so that a run only reads and rewrites the files of affected leaves.
+    """
+
+    def __init__(self, config, directory):
+        if parquet is None:
+            raise Exception("Incremental anonymization requires the pyarrow package")
+        self.__config = config
+        self.__directory = Path(directory)
+        self.__path = self.__directory / STATE_FILE
+        self.__fingerprint = get_fingerprint(config)
+
+        self.__split_tree = {"partition": 0}
+        self.__members = {0: []}
+        self.__next_leaf = 1
+        self.__columnar = None
+        self.__record_files = {}  # Files with the records read per leaf, containing the persons of the leaf when the state has been saved
+        self.__output_files = {}
+        self.__input_hashes = set()
+        self.__run = 0
+        self.__stored_leaf_of = {}  # Leaves whose record files contain the records of persons
+        self.__stored_record_files = {}
+        self.__obsolete_files = []
+
+        if self.__path.exists():
+            self.__load()
+        self.__leaf_of = {key: leaf for leaf, keys in self.__members.items() for key in keys}
+        self.__nodes = {}
+        self.__index_leaves(self.__split_tree)
+
+        self.__new_df = None
+        self.__new_input_hashes = set()
+        self.__loaded_records = {}
+        self.__outputs = {}
+        self.__changed_leaves = set()
+
+    def __load(self):
+        with open(self.__path, 'rb') as f:
+            state = pickle.load(f)
+        self.__stored_leaf_of = {key: leaf for leaf, keys in state["members"].items() for key in keys}
+        self.__stored_record_files = state["record_files"]
+        self.__input_hashes = state["input_hashes"]
+        self.__run = state["run"]
+        if state["fingerprint"] != self.__fingerprint:
+            logger.warning("Configuration has changed since the state in %s has been saved, anonymizing all records from scratch", self.__directory)
+            self.__members = {0: list(self.__stored_leaf_of)}  # All persons become affected by the next assignment
+            self.__obsolete_files = list(state["record_files"].values()) + list(state["output_files"].values())
+            return
+        self.__members = state["members"]
+        self.__record_files = dict(state["record_files"])
+        self.__split_tree = state["split_tree"]
+        self.__next_leaf = state["next_leaf"]
+        self.__columnar = state["columnar"]
+        self.__output_files = state["output_files"]
+        logger.info("Loaded state with %d persons in %d partitions from %s", sum(len(keys) for keys in self.__members.values()), len(self.__members), self.__directory)
+
+    def save(self):
+        """
+        Saves the state, writing the files of changed leaves and replacing the former state only once all of them have been written completely
+        """
+        self.__directory.mkdir(parents=True, exist_ok=True)
+        self.__run += 1
+        changed_leaves = sorted(self.__changed_leaves.union(self.__outputs))
+        records = self.get_records(self.get_members(changed_leaves))
+        key_attribute = self.__config.get_key_attribute()
+        obsolete_files = list(self.__obsolete_files)
+        for leaf in changed_leaves:
+            obsolete_files.append(self.__record_files.get(leaf))
+            self.__record_files[leaf] = self.__write("records_{}_{}.parquet".format(leaf, self.__run), records[records[key_attribute].isin(self.__members[leaf])])
+        for leaf, df in self.__outputs.items():
+            obsolete_files.append(self.__output_files.get(leaf))
+            self.__output_files[leaf] = self.__write("output_{}_{}.parquet".format(leaf, self.__run), df)
+
+        state = {"fingerprint": self.__fingerprint, "split_tree": self.__split_tree, "members": self.__members, "next_leaf": self.__next_leaf,
+                 "columnar": self.__columnar, "record_files": self.__record_files, "output_files": self.__output_files,
+                 "input_hashes": self.__input_hashes.union(self.__new_input_hashes), "run": self.__run}
+        tmp_path = self.__path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.__path)
+        for file in obsolete_files:
+            if file is not None:
+                (self.__directory / file).unlink(missing_ok=True)
+        logger.info("Saved state with %d partitions to %s, rewriting the files of %d partitions", len(self.__members), self.__directory, len(changed_leaves))
+
+    def add_records(self, df, input_file=None):
+        """
+        Adds records read from the input file, appending them to the records of persons which have been seen before
+        Parameters
+        ----------
+        df: DataFrame
+            DataFrame with records as read by the data reader.
+        input_file: (str, Path)
+            Input file the records have been read from, which is rejected if its content has been added before (optional).
+        Returns
+        -------
+        list
+            List with keys of the new or changed persons.
+        """
+        if input_file is not None:
+            input_hash = get_file_hash(input_file)
+            if input_hash in self.__input_hashes or input_hash in self.__new_input_hashes:
+                raise Exception("Records of input file {} have already been added to the state in {}".format(input_file, self.__directory))
+            self.__new_input_hashes.add(input_hash)
+        key_attribute = self.__config.get_key_attribute()
+        self.__new_df = df if self.__new_df is None else pd.concat([self.__new_df, df], ignore_index=True)
+        return list(pd.unique(df[key_attribute]))
+
+    def get_records(self, keys):
+        """
+        Returns all records of the given persons as they have been read from the input files, only reading the files of the leaves they have been stored in
+        Parameters
+        ----------
+        keys: list
+            Keys of the persons.
+        Returns
+        -------
+        DataFrame
+            DataFrame with records of the persons.
+        """
+        key_attribute = self.__config.get_key_attribute()
+        dfs = []
+        for leaf in sorted({self.__stored_leaf_of[key] for key in keys if key in self.__stored_leaf_of}):
+            if leaf not in self.__loaded_records:
+                self.__loaded_records[leaf] = pd.read_parquet(self.__directory / self.__stored_record_files[leaf])
+            dfs.append(self.__loaded_records[leaf])
+        if self.__new_df is not None:
+            dfs.append(self.__new_df)
+        if not dfs:
+            return pd.DataFrame(columns=[key_attribute])
+        df = pd.concat(dfs, ignore_index=True)
+        df = df[df[key_attribute].isin(keys)].reset_index(drop=True)
+        data_types = {attribute: data_type for attribute, data_type in self.__config.get_data_types().items() if attribute in df.columns}
+        return df.astype(data_types)  # Categories may differ between input files
+
+    def is_split(self):
+        """
+        Returns whether records have been partitioned before, so that new records need to be routed through the split tree
+        Returns
+        -------
+        bool
+            True if the split tree contains splits.
+        """
+        return "partition" not in self.__split_tree
+
+    def assign(self, df, k):
+        """
+        Routes new or changed persons through the split tree into leaves. A changed person only leaves its former leaf if at least k persons remain there.
+        Parameters
+        ----------
+        df: DataFrame
+            Preprocessed DataFrame with the new or changed persons.
+        k: int
+            k, minimal group size.
+        Returns
+        -------
+        list
+            List with the affected leaves, whose persons need to be anonymized again.
+        """
+        key_attribute = self.__config.get_key_attribute()
+        encoded_df = df.copy()
+        for node in self.__get_split_nodes(self.__split_tree):
+            if node["attribute"] not in encoded_df.columns:
+                encoded_df[node["attribute"]] = None  # Persons without entities of a type split on
+        affected = set()
+        for leaf, indexes in route(self.__split_tree, encoded_df).items():
+            for key in df.loc[indexes, key_attribute]:
+                former_leaf = self.__leaf_of.get(key)
+                if former_leaf is not None:
+                    affected.add(former_leaf)
+                    if former_leaf == leaf or len(self.__members[former_leaf]) <= k:
+                        continue
+                    self.__members[former_leaf].remove(key)
+                self.__members[leaf].append(key)
+                self.__leaf_of[key] = leaf
+                affected.add(leaf)
+        self.__changed_leaves.update(affected)
+        return sorted(affected)
+
+    def get_members(self, leaves):
+        """
+        Returns the keys of all persons within the given leaves
+        Parameters
+        ----------
+        leaves: list
+            Leaves of the split tree.
+        Returns
+        -------
+        list
+            List with keys of the persons.
+        """
+        return [key for leaf in leaves for key in self.__members[leaf]]
+
+    def split_leaf(self, leaf, split_tree, partitions):
+        """
+        Replaces a leaf by the split tree resulting from partitioning its persons again
+        Parameters
+        ----------
+        leaf: int
+            Leaf which has been partitioned.
+        split_tree: dict
+            Split tree filled by Mondrian, whose leaves contain positions within the partitions.
+        partitions: list
+            List of partitions, each containing the keys of their persons.
+        Returns
+        -------
+        list
+            List with the leaves the persons have been assigned to, in the order of the partitions.
+        """
+        leaves = [leaf] + [self.__next_leaf + position for position in range(len(partitions) - 1)]
+        self.__next_leaf += len(partitions) - 1
+        for node in self.__get_leaf_nodes(split_tree):
+            node["partition"] = leaves[node["partition"]]
+        node = self.__nodes[leaf]
+        node.clear()
+        node.update(split_tree)
+        self.__index_leaves(node)
+
+        for new_leaf, keys in zip(leaves, partitions):
+            self.__members[new_leaf] = list(keys)
+            for key in keys:
+                self.__leaf_of[key] = new_leaf
+        self.__changed_leaves.update(leaves)
+        return leaves
+
+    def get_outputs(self):
+        """
+        Returns the anonymized records of all leaves, in the order of the leaves
+        Returns
+        -------
+        list
+            List of DataFrames, each containing the anonymized records of a leaf.
+        """
+        outputs = []
+        for leaf in sorted(set(self.__outputs).union(self.__output_files)):
+            outputs.append(self.__outputs[leaf] if leaf in self.__outputs else pd.read_parquet(self.__directory / self.__output_files[leaf]))
+        return outputs
+
+    def set_output(self, leaf, df, columnar):
+        """
+        Sets the anonymized records of a leaf
+        Parameters
+        ----------
+        leaf: int
+            Leaf of the split tree.
+        df: DataFrame
+            DataFrame with the anonymized records of the leaf.
+        columnar: bool
+            Whether the records contain bounds of numerical and date quasi-identifiers for columnar output files.
+        """
+        if self.__columnar is not None and self.__columnar != columnar:
+            raise Exception("State has been built for {} output files, anonymize all records from scratch to change the output format".format("columnar" if self.__columnar else "CSV"))
+        self.__outputs[leaf] = df
+        self.__columnar = columnar
+
+    def get_number_of_leaves(self):
+        """
+        Returns the number of leaves containing persons
+        Returns
+        -------
+        int
+            Number of leaves.
+        """
+        return sum(1 for keys in self.__members.values() if keys)
+
+    def __write(self, file, df):
+        df.reset_index(drop=True).to_parquet(self.__directory / file, index=False)
+        return file
+
+    def __index_leaves(self, node):
+        for leaf_node in self.__get_leaf_nodes(node):
+            self.__nodes[leaf_node["partition"]] = leaf_node
+
+    def __get_leaf_nodes(self, node):
+        if "partition" in node:
+            return [node]
+        return self.__get_leaf_nodes(node["left"]) + self.__get_leaf_nodes(node["right"])
+
+    def __get_split_nodes(self, node):
+        if "partition" in node:
+            return []
+        return [node] + self.__get_split_nodes(node["left"]) + self.__get_split_nodes(node["right"])
+
+
+def get_fingerprint(config):
+    """
+    Builds a fingerprint of all settings of a configuration
+    Parameters
+    ----------
+    config: Configuration
+        Configuration of the anonymization.
+    Returns
+    -------
+    str
+        Fingerprint, which differs for configurations resulting in different anonymizations.
+    """
+    for get_defaults in [config.get_data_types, config.get_biases, config.get_date_formats, config.get_ordinal_orders]:
+        get_defaults()  # Getters fill in default settings, which must not change the fingerprint depending on whether they have been called before
+    return json.dumps({"attributes": config.attributes, "entities": config.entities, "parameters": config.parameters, "nlp": config.nlp}, sort_keys=True, default=str)
+
+
+def get_file_hash(input_file):
+    """
+    Hashes the content of a file
+    Parameters
+    ----------
+    input_file: (str, Path)
+        File path.
+    Returns
+    -------
+    str
+        SHA-256 hash of the content.
+    """
+    file_hash = hashlib.sha256()
+    with open(input_file, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
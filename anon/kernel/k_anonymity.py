@@ -1,10 +1,12 @@
 """This modules contains code to apply k-anonymity on datasets"""
 import logging
+import numpy as np
 import pandas as pd
 from kernel.recoding import recode
 from tqdm import tqdm
 
 from kernel.partitioning import partition_mondrian, partition_gdf
+from kernel.util import get_signature_value
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +22,7 @@ class KAnonymity:
         self.__strategy = strategy
         self.__relational_weight = relational_weight
         self.__config = config
+        self.__refinement_statistics = None
 
     def anonymize(self):
         """
@@ -29,8 +32,28 @@ class KAnonymity:
         tuple
             Anonymized DataFrame, resulting partitions, and partition split statistics.
         """
+        finished_partitions, partition_split_statistics = self.partition()
+
+        # Recode dataset to get a k-anonymous version
+        anonymized_df = self.recode(finished_partitions)
+
+        # Return anonymized dataset and partitions
+        return anonymized_df, finished_partitions, partition_split_statistics
+
+    def partition(self, split_tree=None):
+        """
+        Partitions the data frame into partitions of at least size k according to predefined parameters
+        Parameters
+        ----------
+        split_tree: dict
+            Empty node filled with the splits made by Mondrian, see partition_mondrian (optional).
+        Returns
+        -------
+        tuple
+            Resulting partitions and partition split statistics.
+        """
         partition_split_statistics = None
-        if self.__strategy == "mondrian":
+        if self.__strategy in ["mondrian", "relaxed_mondrian"]:
             if self.__relational_weight == 0:
                 ordered_quasi_identifiers = list(self.__terms.keys())  # Relational attributes are ignored during partitioning
             elif self.__relational_weight == 1:
@@ -41,21 +64,72 @@ class KAnonymity:
                 ordered_quasi_identifiers = list(self.__terms.keys()) + self.__quasi_identifiers  # Use both, but put textual attributes up front
             logger.info("Partition dataset using %s on attributes %s with k=%d", self.__strategy, ", ".join(ordered_quasi_identifiers), self.__k)
 
-            # partition using mondrian
-            finished_partitions, partition_split_statistics = partition_mondrian(self.__df, self.__k, self.__bias, self.__relational_weight, ordered_quasi_identifiers)
+            # Collapse records with identical quasi-identifiers to weighted rows, partition them using mondrian and expand them again
+            # Relaxed mondrian spreads records sharing a value across both sides of a cut, which a weighted row cannot be, so records are kept as they are
+            relaxed = self.__strategy == "relaxed_mondrian"
+            if relaxed:
+                collapsed_df, weights, members = self.__df, None, None
+            else:
+                collapsed_df, weights, members = self.__collapse_signatures(ordered_quasi_identifiers)
+            finished_partitions, partition_split_statistics, self.__refinement_statistics = partition_mondrian(
+                collapsed_df, self.__k, self.__bias, self.__relational_weight, ordered_quasi_identifiers, weights, relaxed,
+                self.__config.get_partition_priority(), self.__config.get_time_budget(), self.__config.get_split_budget(), split_tree)
+            finished_partitions = self.__expand_partitions(finished_partitions, members)
         elif self.__strategy == "gdf":
             # partition using gdf
             finished_partitions = partition_gdf(self.__df, self.__k, self.__terms)
         else:
             raise Exception("Partitioning strategy {} no supported".format(self.__strategy))
+        return finished_partitions, partition_split_statistics
 
-        # Recode dataset to get a k-anonymous version
-        anonymized_df = self.__recode(finished_partitions)
+    def get_refinement_statistics(self):
+        """
+        Returns statistics on how much refinement Mondrian performed and skipped due to budgets, None for other strategies
+        Returns
+        -------
+        dict
+            Dictionary with refinement statistics.
+        """
+        return self.__refinement_statistics
 
-        # Return anonymized dataset and partitions
-        return anonymized_df, finished_partitions, partition_split_statistics
+    def __collapse_signatures(self, quasi_identifiers):
+        """Collapses records sharing the same values for all quasi-identifiers into one row weighted by the number of records"""
+        attributes = [a for a in quasi_identifiers if a in self.__df.columns]
+        if len(self.__df) == 0 or len(attributes) == 0:
+            return self.__df, None, None
+
+        codes = [pd.factorize(self.__df[attribute].map(get_signature_value).astype(object))[0] for attribute in attributes]
+        _, first_positions, inverse, counts = np.unique(np.column_stack(codes), axis=0, return_index=True, return_inverse=True, return_counts=True)
+        if len(first_positions) == len(self.__df):
+            return self.__df, None, None  # Nothing to collapse
 
-    def __recode(self, partitions):
+        logger.info("Collapsed %d records into %d distinct quasi-identifier signatures", len(self.__df), len(first_positions))
+        inverse = inverse.reshape(-1)
+        representatives = self.__df.index[first_positions]
+        order = np.argsort(inverse, kind="mergesort")
+        members = dict(zip(representatives, np.split(order, np.cumsum(counts)[:-1])))
+        weights = pd.Series(counts, index=representatives)
+        representatives = self.__df.index[np.sort(first_positions)]  # Keep representatives in the order of records
+        return self.__df.loc[representatives], weights.loc[representatives], members
+
+    def __expand_partitions(self, partitions, members):
+        """Replaces the representatives within partitions by all records they stand for, keeping the original order of records"""
+        if members is None:
+            return partitions
+        return [self.__df.index[np.sort(np.concatenate([members[representative] for representative in partition]))] for partition in partitions]
+
+    def recode(self, partitions):
+        """
+        Recodes quasi-identifiers and sensitive terms of the given partitions, so that records within a partition become indistinguishable
+        Parameters
+        ----------
+        partitions: list
+            List of partitions containing indexes of the data frame.
+        Returns
+        -------
+        DataFrame
+            Recoded DataFrame containing the records of all partitions.
+        """
         # Set up hierarchies and recoding rules
         hierarchies, recoding_rules = self.__get_recoding_parameters()
 
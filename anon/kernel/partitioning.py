@@ -1,19 +1,31 @@
 """This module contains code for partitioning used to generate a k-anonymous view"""
+import heapq
+import itertools
 import logging
 import sys
+import time
+import numpy as np
 import pandas as pd
 
 from pandas.api.types import is_numeric_dtype, is_datetime64_any_dtype, is_categorical_dtype
 
-from kernel.util import flatten_set_valued_series, agg_mean, agg_categorical
+from kernel.util import flatten_set_valued_series, agg_mean, agg_categorical, weighted_median
 
 logger = logging.getLogger(__name__)
 sys.setrecursionlimit(3000)
 
+SUPPORTED_PRIORITIES = ["size", "span"]
 
-def partition_mondrian(df, k, bias, relational_weight, quasi_identifiers):
+
+def partition_mondrian(df, k, bias, relational_weight, quasi_identifiers, weights=None, relaxed=False, priority="size", time_budget=None, split_budget=None, split_tree=None):
     """
     Partitions a DataFrame in partitions with at least size k using Mondrian partitioning.
+    If weights are given, every row stands for as many records as its weight, which is respected for medians and size checks.
+    Relaxed partitioning spreads records sharing the median value across both sides to keep splits balanced.
+    Pending partitions are refined in order of the given priority. Once the time or split budget is used up,
+    all pending partitions are emitted without further refinement.
+    Resulting partitions are ordered breadth first by their position within the splits, independent of the priority.
+    If a split tree is given, it is filled with the splits made, so that further records can be routed into the resulting partitions, see route.
     Parameters
     ----------
     df: DataFrame
@@ -26,37 +38,109 @@ def partition_mondrian(df, k, bias, relational_weight, quasi_identifiers):
         Tuning parameter for Mondrian.
     quasi_identifiers: list
         List with quasi-identifiers.
+    weights: Series
+        Number of records represented by each row, indexed like the DataFrame (optional).
+    relaxed: bool
+        Whether to use relaxed Mondrian splits.
+    priority: str
+        Order to refine pending partitions, either "size" (largest first) or "span" (widest normalized span first).
+    time_budget: float
+        Seconds after which refinement stops (optional).
+    split_budget: int
+        Number of splits after which refinement stops (optional).
+    split_tree: dict
+        Empty node to become the root of the split tree. Inner nodes contain the split attribute, the rule to route records, and both children,
+        leaves contain the position of their partition within the resulting partitions (optional).
     Returns
     -------
     tuple
-        Resulting partitions, and partition split statistics.
+        Resulting partitions, partition split statistics, and refinement statistics.
     """
+    if priority not in SUPPORTED_PRIORITIES:
+        raise Exception("Partition priority {} not supported".format(priority))
+    start_time = time.monotonic()
     scale = __get_attribute_spans(df, df.index, quasi_identifiers)
     finished_partitions = []
-    partitions = [df.index]
+    pending_partitions = []
     partition_split_statistics = {attribute: 0 for attribute in quasi_identifiers}
-    while partitions:
-        partition = partitions.pop(0)
-        if len(partition) >= 2 * k:
-            logger.debug("Working on partition with length %d", len(partition))
-            spans = __get_attribute_spans(df, partition, quasi_identifiers, scale)
-            for column, _ in __mondrian_split_priority(spans, bias, relational_weight):
-                lp, rp = __split_partition(df[column][partition])
-                if not __is_k_anonymous(lp, k) or not __is_k_anonymous(rp, k):
-                    continue
-                if lp.equals(rp):
-                    break
-                else:
-                    logger.debug("Splitting partition on attribute %s into two partitions with size %d and %d", column, len(lp), len(rp))
-                    partition_split_statistics[column] += 1
-                    partitions.extend((lp, rp))
+    refinement_statistics = {"splits": 0, "max_depth": 0, "budget_exhausted": False, "unrefined_partitions": 0, "unrefined_records": 0}
+    counter = itertools.count()  # Tie breaker keeping the order of insertion for equal priorities
+
+    def finish(partition, path, node):
+        finished_partitions.append(((len(path), path), partition, node))
+
+    def push(partition, path, node):
+        refinement_statistics["max_depth"] = max(refinement_statistics["max_depth"], len(path))
+        size = __get_partition_size(partition, weights)
+        if size < 2 * k:
+            finish(partition, path, node)
+            return
+        spans = __get_attribute_spans(df, partition, quasi_identifiers, scale)
+        score = size if priority == "size" else max(spans.values(), default=0)
+        heapq.heappush(pending_partitions, (-score, next(counter), partition, spans, size, path, node))
+
+    push(df.index, (), split_tree if split_tree is not None else {})
+    while pending_partitions:
+        if __is_budget_exhausted(start_time, time_budget, refinement_statistics["splits"], split_budget):
+            refinement_statistics["budget_exhausted"] = True
+            for _, _, partition, _, size, path, node in pending_partitions:
+                refinement_statistics["unrefined_partitions"] += 1
+                refinement_statistics["unrefined_records"] += int(size)
+                finish(partition, path, node)
+            logger.warning("Partitioning budget exhausted, skipped refinement of %d partitions containing %d records",
+                           refinement_statistics["unrefined_partitions"], refinement_statistics["unrefined_records"])
+            break
+        _, _, partition, spans, _, path, node = heapq.heappop(pending_partitions)
+        logger.debug("Working on partition with length %d", len(partition))
+        for column, _ in __mondrian_split_priority(spans, bias, relational_weight):
+            if relaxed:
+                lp, rp = __split_partition_relaxed(df[column][partition], weights)
+            else:
+                lp, rp = __split_partition(df[column][partition], weights)
+            if not __is_k_anonymous(lp, k, weights) or not __is_k_anonymous(rp, k, weights):
+                continue
+            if lp.equals(rp):
                 break
             else:
-                finished_partitions.append(partition)
+                logger.debug("Splitting partition on attribute %s into two partitions with size %d and %d", column, len(lp), len(rp))
+                partition_split_statistics[column] += 1
+                refinement_statistics["splits"] += 1
+                if split_tree is not None:
+                    node.update({"attribute": column, "rule": __get_split_rule(df[column][partition], lp, rp), "left": {}, "right": {}})
+                push(lp, path + (0,), node.get("left", {}))
+                push(rp, path + (1,), node.get("right", {}))
+            break
         else:
-            finished_partitions.append(partition)
-        logger.debug("%d partitions remaining", len(partitions))
-    return finished_partitions, partition_split_statistics
+            finish(partition, path, node)
+        logger.debug("%d partitions remaining", len(pending_partitions))
+    refinement_statistics["elapsed"] = time.monotonic() - start_time
+
+    # Order partitions like refining them one after another in a queue would, so that the order of output records does not depend on the priority
+    finished_partitions.sort(key=lambda finished: finished[0])
+    for position, (_, _, node) in enumerate(finished_partitions):
+        node["partition"] = position
+    return [partition for _, partition, _ in finished_partitions], partition_split_statistics, refinement_statistics
+
+
+def route(split_tree, df):
+    """
+    Routes records through a split tree recorded by partition_mondrian into the partitions it has resulted in.
+    Records are routed by the same values the splits have been made on, values unseen during partitioning go to the nearest side.
+    Values which relaxed splits have spread across both sides go to the left side.
+    Parameters
+    ----------
+    split_tree: dict
+        Root of the split tree.
+    df: DataFrame
+        DataFrame with the records to route, containing all attributes split on.
+    Returns
+    -------
+    dict
+        Dictionary with the indexes of the routed records per position of the partition.
+    """
+    routed = {}
+    __route_recursive(split_tree, df, df.index, routed)
+    return routed
 
 
 def partition_gdf(df, k, terms):
@@ -112,41 +196,80 @@ def __get_attribute_span(series):
     elif is_numeric_dtype(series):
         span = series.max() - series.min()
     else:
-        flattened, indexes, is_category = flatten_set_valued_series(series)
-        if is_category:
-            new_series = pd.Series(flattened, dtype="category", index=indexes, name=series.name)
-            new_series.index.name = "id"
-            grouped = new_series.groupby(by="id").agg(agg_categorical).astype('category')
-        else:
-            new_series = pd.Series(flattened, index=indexes, name=series.name)
-            new_series.index.name = "id"
-            grouped = new_series.groupby(by="id").agg(agg_mean)
-        span = __get_attribute_span(grouped)
+        span = __get_attribute_span(__aggregate_set_valued(series))
     return span
 
 
-def __split_partition(series):
+def __split_partition(series, weights=None):
     if is_categorical_dtype(series) or is_datetime64_any_dtype(series):
         values = series.sort_values().unique()
         lv = set(values[:len(values) // 2])
         rv = set(values[len(values) // 2:])
         return series.index[series.isin(lv)], series.index[series.isin(rv)]
     elif is_numeric_dtype(series):
-        median = series.median()
+        median = series.median() if weights is None else weighted_median(series, weights)
         dfl = series.index[series < median]
         dfr = series.index[series >= median]
         return (dfl, dfr)
     else:
-        flattened, indexes, is_category = flatten_set_valued_series(series)
-        if is_category:
-            new_series = pd.Series(flattened, index=indexes, dtype="category", name=series.name)
-            new_series.index.name = "id"
-            grouped = new_series.groupby(by="id").agg(agg_categorical).astype('category')
+        return __split_partition(__aggregate_set_valued(series), weights)
+
+
+def __split_partition_relaxed(series, weights=None):
+    if is_categorical_dtype(series) or is_datetime64_any_dtype(series) or is_numeric_dtype(series):
+        if series.nunique(dropna=False) <= 1:
+            return series.index, series.index[:0]  # Nothing to distinguish on this attribute
+        positions = series.reset_index(drop=True).sort_values(kind="mergesort").index.to_numpy()
+        if weights is None:
+            cumulative_weights = np.arange(1, len(positions) + 1)
         else:
-            new_series = pd.Series(flattened, index=indexes, name=series.name)
-            new_series.index.name = "id"
-            grouped = new_series.groupby(by="id").agg(agg_mean)
-        return __split_partition(grouped)
+            cumulative_weights = weights.loc[series.index[positions]].to_numpy().cumsum()
+        # Cut the sorted records where both sides are closest to half of the records, ties at the median end up on both sides
+        cut = np.abs(cumulative_weights[:-1] - cumulative_weights[-1] / 2).argmin() + 1
+        return series.index[np.sort(positions[:cut])], series.index[np.sort(positions[cut:])]
+    else:
+        return __split_partition_relaxed(__aggregate_set_valued(series), weights)
+
+
+def __aggregate_set_valued(series):
+    flattened, indexes, is_category = flatten_set_valued_series(series)
+    if is_category:
+        new_series = pd.Series(flattened, index=indexes, dtype="category", name=series.name)
+        new_series.index.name = "id"
+        return new_series.groupby(by="id").agg(agg_categorical).astype('category')
+    new_series = pd.Series(flattened, index=indexes, name=series.name)
+    new_series.index.name = "id"
+    return new_series.groupby(by="id").agg(agg_mean)
+
+
+def __get_split_value_series(series):
+    if is_categorical_dtype(series) or is_datetime64_any_dtype(series) or is_numeric_dtype(series):
+        return series
+    return __aggregate_set_valued(series)
+
+
+def __get_split_rule(series, lp, rp):
+    series = __get_split_value_series(series)
+    if is_categorical_dtype(series):
+        return {"left": set(series[lp].dropna().unique())}
+    return {"left_max": series[lp].max(), "right_min": series[rp].min()}
+
+
+def __route_recursive(node, df, indexes, routed):
+    if "partition" in node or len(indexes) == 0:
+        if "partition" in node:
+            routed[node["partition"]] = indexes
+        return
+    series = __get_split_value_series(df[node["attribute"]][indexes])
+    rule = node["rule"]
+    if "left" in rule:
+        is_left = series.isin(rule["left"]).to_numpy()
+    else:
+        # Values between both sides go to the nearer one, ties and missing values to the left
+        is_nearer_to_left = (series - rule["left_max"]) <= (rule["right_min"] - series)
+        is_left = ((series <= rule["left_max"]) | ((series < rule["right_min"]) & is_nearer_to_left) | series.isna()).to_numpy()
+    __route_recursive(node["left"], df, indexes[is_left], routed)
+    __route_recursive(node["right"], df, indexes[~is_left], routed)
 
 
 def __partition_gdf_recursive(df, partition, k, terms):
@@ -207,5 +330,19 @@ def __split_textual_attribute(df, partition, column, indexes):
     return dfp.index[dfp.index.isin(indexes)], dfp.index[dfp.index.isin(remaining)]
 
 
-def __is_k_anonymous(partition, k):
-    return len(partition) >= k
+def __is_budget_exhausted(start_time, time_budget, splits, split_budget):
+    if time_budget is not None and time.monotonic() - start_time >= time_budget:
+        return True
+    if split_budget is not None and splits >= split_budget:
+        return True
+    return False
+
+
+def __get_partition_size(partition, weights=None):
+    if weights is None:
+        return len(partition)
+    return weights.loc[partition].sum()
+
+
+def __is_k_anonymous(partition, k, weights=None):
+    return __get_partition_size(partition, weights) >= k
@@ -39,7 +39,10 @@ def intersect_token_lists(list_1, list_2):
 
     for span_1 in list_1:
         for span_2 in list_2:
-            result = compare_complete_match(span_1, span_2)
+            if isinstance(span_1, str) or isinstance(span_2, str):  # Terms encoded by their texts
+                result = get_term_text(span_1) == get_term_text(span_2)
+            else:
+                result = compare_complete_match(span_1, span_2)
             if result:
                 intersection.add(span_1)
                 intersection.add(span_2)
@@ -86,7 +89,7 @@ def flatten_set_valued_series(series):
                 indexes.append(index)
         elif isinstance(element, list):  # List of terms
             for item in element:
-                flattened.append(item.text.lower())
+                flattened.append(get_term_text(item))
                 indexes.append(index)
             is_category = True
         elif element is None:
@@ -99,6 +102,44 @@ def flatten_set_valued_series(series):
     return flattened, indexes, is_category
 
 
+def weighted_median(series, weights):
+    """Calculates the median of a numerical series as if each value appeared as often as its weight"""
+    values = series.dropna()
+    if len(values) == 0:
+        return np.nan
+    order = np.argsort(values.to_numpy(), kind="mergesort")
+    sorted_values = values.to_numpy()[order]
+    cumulative_weights = weights.loc[values.index].to_numpy()[order].cumsum()
+    half = cumulative_weights[-1] / 2
+    position = np.searchsorted(cumulative_weights, half)
+    if cumulative_weights[position] == half and position + 1 < len(sorted_values):
+        return (sorted_values[position] + sorted_values[position + 1]) / 2
+    return sorted_values[position]
+
+
+def get_signature_value(element):
+    """Takes a value of a record and returns a hashable representative which is equal for values being indistinguishable during partitioning"""
+    if isinstance(element, list):  # List of terms
+        return tuple(sorted(get_term_text(item) for item in element))
+    return element
+
+
+def get_term_text(term):
+    """Takes a sensitive term and returns its lower case text, terms which are already encoded as text are returned as they are"""
+    if isinstance(term, str):
+        return term
+    return term.text.lower()
+
+
+def encode_terms(df, attributes):
+    """Takes a DataFrame and returns a copy in which the sensitive terms of the given attributes are encoded by their lower case texts, so that it no longer refers to docs"""
+    df = df.copy()
+    for attribute in attributes:
+        if attribute in df.columns:
+            df[attribute] = [type(terms)(get_term_text(term) for term in terms) if isinstance(terms, (list, set, frozenset)) else terms for terms in df[attribute]]
+    return df
+
+
 def agg_mean(series):
     """Aggregate series values by calculating the mean"""
     if is_numeric_dtype(series):
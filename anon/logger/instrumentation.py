@@ -0,0 +1,168 @@
+"""Module contains code for measuring time, memory, and counters of pipeline stages"""
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class Instrumentation:
+    """
+    Collects wall time, CPU time, memory, and counters per pipeline stage. Stages entered repeatedly, e.g. once per batch, are accumulated.
+    Stages entered within another stage are named by their path, e.g. "k_2/partitioning". Stages selected by the given profiler are profiled as well.
+    """
+
+    def __init__(self, trace_memory=False, profiler=None):
+        self.__stages = {}
+        self.__active = []
+        self.__trace_memory = trace_memory
+        self.__profiler = profiler
+        self.__start_time = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager measuring the enclosed code as a stage
+        Parameters
+        ----------
+        name: str
+            Name of the stage.
+        Yields
+        ------
+        str
+            Full name of the stage, which can be used to add counters.
+        """
+        name = "/".join([active["name"] for active in self.__active] + [name])
+        if self.__trace_memory and len(self.__active) > 0:
+            self.__active[-1]["traced_peak"] = max(self.__active[-1]["traced_peak"], tracemalloc.get_traced_memory()[1])
+        if self.__trace_memory:
+            tracemalloc.reset_peak()
+        active = {"name": name, "traced_peak": 0, "traced_start": tracemalloc.get_traced_memory()[0] if self.__trace_memory else 0,
+                  "peak_rss_start": get_peak_rss(), "wall_start": time.perf_counter(), "cpu_start": time.process_time()}
+        self.__active.append(active)
+        is_profiled = self.__profiler is not None and self.__profiler.is_selected(name)
+        if is_profiled:
+            self.__profiler.start(name)
+        try:
+            yield name
+        finally:
+            if is_profiled:
+                self.__profiler.stop(name)
+            self.__active.pop()
+            self.__record(active)
+
+    def count(self, name, counter, value=1):
+        """
+        Adds a value to a counter of a stage
+        Parameters
+        ----------
+        name: str
+            Full name of the stage.
+        counter: str
+            Name of the counter.
+        value: (int, float)
+            Value to add (optional).
+        """
+        counters = self.__get_stage(name)["counters"]
+        counters[counter] = counters.get(counter, 0) + value
+
+    def set_counter(self, name, counter, value):
+        """
+        Sets a counter of a stage, e.g. to a rate derived from other counters
+        Parameters
+        ----------
+        name: str
+            Full name of the stage.
+        counter: str
+            Name of the counter.
+        value: (int, float)
+            Value of the counter.
+        """
+        self.__get_stage(name)["counters"][counter] = value
+
+    def get_wall_time(self, name):
+        """
+        Returns the accumulated wall time of a stage
+        Parameters
+        ----------
+        name: str
+            Full name of the stage.
+        Returns
+        -------
+        float
+            Wall time in seconds, 0 if the stage has not been measured.
+        """
+        return self.__stages[name]["wall_time"] if name in self.__stages else 0.0
+
+    def get_report(self):
+        """
+        Returns measurements of all stages in the order they have been entered first
+        Returns
+        -------
+        dict
+            Dictionary with total wall time, peak resident set size, and measurements and counters per stage.
+        """
+        return {
+            "wall_time": time.perf_counter() - self.__start_time,
+            "peak_rss_mb": get_peak_rss(),
+            "trace_memory": self.__trace_memory,
+            "stages": self.__stages
+        }
+
+    def save(self, report_file):
+        """
+        Saves the report as JSON file
+        Parameters
+        ----------
+        report_file: (str, Path)
+            Path of the report file.
+        """
+        with open(report_file, 'w') as f:
+            json.dump(self.get_report(), f, ensure_ascii=False, indent=4)
+        logger.info("Saved instrumentation report to %s", report_file)
+
+    def __get_stage(self, name):
+        return self.__stages.setdefault(name, {"calls": 0, "wall_time": 0.0, "cpu_time": 0.0, "peak_rss_mb": None, "peak_rss_increase_mb": 0.0, "counters": {}})
+
+    def __record(self, active):
+        stage = self.__get_stage(active["name"])
+        stage["calls"] += 1
+        stage["wall_time"] += time.perf_counter() - active["wall_start"]
+        stage["cpu_time"] += time.process_time() - active["cpu_start"]
+        peak_rss = get_peak_rss()
+        if peak_rss is not None:
+            stage["peak_rss_mb"] = max(stage["peak_rss_mb"] or 0.0, peak_rss)
+            stage["peak_rss_increase_mb"] += peak_rss - active["peak_rss_start"]
+        if self.__trace_memory:
+            # Peaks are reset per stage, so the peak of a nested stage has to be passed on to the enclosing stage
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, active["traced_peak"])
+            stage["traced_peak_mb"] = max(stage.get("traced_peak_mb", 0.0), (peak - active["traced_start"]) / 1024 / 1024)
+            stage["traced_delta_mb"] = stage.get("traced_delta_mb", 0.0) + (current - active["traced_start"]) / 1024 / 1024
+            if len(self.__active) > 0:
+                self.__active[-1]["traced_peak"] = max(self.__active[-1]["traced_peak"], peak)
+            tracemalloc.reset_peak()
+
+
+def get_peak_rss():
+    """
+    Returns the peak resident set size of the process
+    Returns
+    -------
+    float
+        Peak resident set size in megabytes, None if not available on this platform.
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1024 / 1024 if sys.platform == "darwin" else peak_rss / 1024  # Bytes on macOS, kilobytes on Linux
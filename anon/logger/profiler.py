@@ -0,0 +1,178 @@
+"""Module contains code for profiling selected pipeline stages"""
+import cProfile
+import logging
+import marshal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLING_INTERVAL = 0.01
+
+
+class Profiler:
+    """
+    Profiler for selected stages of the instrumentation, writing a pstats file and a file with collapsed stacks per stage.
+    Stacks of the thread running a stage are sampled at the given interval, so that the overhead does not depend on the number of function calls.
+    With an interval of 0, stages are profiled deterministically using cProfile instead, which writes exact pstats files but no collapsed stacks.
+    """
+
+    def __init__(self, stages, directory, sampling_interval=DEFAULT_SAMPLING_INTERVAL):
+        self.__stages = stages
+        self.__directory = Path(directory)
+        self.__directory.mkdir(parents=True, exist_ok=True)
+        self.__sampling_interval = sampling_interval
+        self.__samples = {}
+        self.__sample_times = {}
+        self.__profiles = {}
+        self.__active = {}
+        self.__lock = threading.Lock()
+        self.__sampler = None
+        self.__stop_sampling = threading.Event()
+        self.__deterministic_stage = None
+
+    def is_selected(self, name):
+        """
+        Returns whether a stage is selected for profiling, either by its full name or the name of its innermost stage
+        Parameters
+        ----------
+        name: str
+            Full name of the stage, e.g. "postprocessing/uncompress".
+        Returns
+        -------
+        bool
+            True if the stage should be profiled.
+        """
+        return name in self.__stages or name.rsplit("/", 1)[-1] in self.__stages
+
+    def start(self, name):
+        """
+        Starts profiling a stage within the current thread
+        Parameters
+        ----------
+        name: str
+            Full name of the stage.
+        """
+        if self.__sampling_interval == 0:
+            if self.__deterministic_stage is not None:
+                logger.debug("Stage %s is profiled as part of stage %s", name, self.__deterministic_stage)
+                return
+            self.__deterministic_stage = name
+            self.__profiles.setdefault(name, cProfile.Profile()).enable()
+            return
+        with self.__lock:
+            self.__active[name] = threading.get_ident()
+        if self.__sampler is None:
+            self.__stop_sampling.clear()
+            self.__sampler = threading.Thread(target=self.__sample, daemon=True)
+            self.__sampler.start()
+
+    def stop(self, name):
+        """
+        Stops profiling a stage and writes its profile, which contains all calls of the stage so far
+        Parameters
+        ----------
+        name: str
+            Full name of the stage.
+        """
+        if self.__sampling_interval == 0:
+            if self.__deterministic_stage != name:
+                return
+            self.__deterministic_stage = None
+            self.__profiles[name].disable()
+            self.__profiles[name].dump_stats(self.__get_path(name, ".pstats"))
+            return
+        with self.__lock:
+            self.__active.pop(name, None)
+            stop_sampler = len(self.__active) == 0
+            samples = Counter(self.__samples.get(name, {}))
+            sample_times = Counter(self.__sample_times.get(name, {}))
+        if stop_sampler and self.__sampler is not None:
+            self.__stop_sampling.set()
+            self.__sampler.join()
+            self.__sampler = None
+        write_collapsed_stacks(samples, self.__get_path(name, ".collapsed"))
+        write_sampled_stats(samples, sample_times, self.__get_path(name, ".pstats"))
+        logger.debug("Collected %d samples of stage %s", sum(samples.values()), name)
+
+    def __sample(self):
+        last_sample = time.perf_counter()
+        while not self.__stop_sampling.wait(self.__sampling_interval):
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            with self.__lock:
+                for name, thread_id in self.__active.items():
+                    if thread_id in frames:
+                        stack = get_stack(frames[thread_id])
+                        self.__samples.setdefault(name, Counter())[stack] += 1
+                        self.__sample_times.setdefault(name, Counter())[stack] += now - last_sample  # Samples may be delayed while other threads hold the GIL
+            last_sample = now
+
+    def __get_path(self, name, suffix):
+        return self.__directory / (name.replace("/", ".") + suffix)
+
+
+def get_stack(frame):
+    """
+    Returns the stack of a frame from the outermost to the innermost function
+    Parameters
+    ----------
+    frame: frame
+        Innermost frame.
+    Returns
+    -------
+    tuple
+        Tuple of functions identified by file name, line number, and function name like in pstats.
+    """
+    stack = []
+    while frame is not None:
+        stack.append((frame.f_code.co_filename, frame.f_code.co_firstlineno, frame.f_code.co_name))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+def write_collapsed_stacks(samples, path):
+    """
+    Writes sampled stacks in the collapsed format read by flame graph tools like flamegraph.pl or speedscope
+    Parameters
+    ----------
+    samples: dict
+        Number of samples per stack.
+    path: (str, Path)
+        Path of the file to write.
+    """
+    with open(path, 'w') as f:
+        for stack, count in samples.items():
+            f.write("{} {}\n".format(";".join("{} ({}:{})".format(function, filename, line) for filename, line, function in stack), count))
+
+
+def write_sampled_stats(samples, sample_times, path):
+    """
+    Writes sampled stacks as pstats file, estimating times by the time elapsed between samples and counting samples instead of calls
+    Parameters
+    ----------
+    samples: dict
+        Number of samples per stack.
+    sample_times: dict
+        Seconds elapsed before the samples of each stack.
+    path: (str, Path)
+        Path of the file to write.
+    """
+    stats = {}
+    for stack, count in samples.items():
+        elapsed = sample_times[stack]
+        seen = set()
+        for position, function in enumerate(stack):
+            own_time = elapsed if position == len(stack) - 1 else 0.0
+            is_first = function not in seen  # Recursive functions count once per sample for their cumulative time
+            seen.add(function)
+            primitive_calls, calls, total_time, cumulative_time, callers = stats.get(function, (0, 0, 0.0, 0.0, {}))
+            stats[function] = (primitive_calls + count * is_first, calls + count, total_time + own_time, cumulative_time + elapsed * is_first, callers)
+            if position > 0:
+                caller_calls, caller_primitive_calls, caller_total_time, caller_cumulative_time = callers.get(stack[position - 1], (0, 0, 0.0, 0.0))
+                callers[stack[position - 1]] = (caller_calls + count, caller_primitive_calls + count * is_first, caller_total_time + own_time, caller_cumulative_time + elapsed * is_first)
+    with open(path, 'wb') as f:
+        marshal.dump(stats, f)
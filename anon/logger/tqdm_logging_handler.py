@@ -9,15 +9,16 @@ from .elapsed_formatter import ElapsedFormatter
 class TqdmLoggingHandler(logging.StreamHandler):
     """Logging handler used to work with tqdm and stdout"""
 
-    def __init__(self, level=logging.NOTSET):
+    def __init__(self, level=logging.NOTSET, file=None):
         super().__init__(level)
-        self.flush = sys.stdout.flush
+        self.__file = file
+        self.flush = (file or sys.stdout).flush
         self.setFormatter(ElapsedFormatter())
 
     def emit(self, record):
         try:
             msg = self.format(record)
-            tqdm.tqdm.write(msg)
+            tqdm.tqdm.write(msg, file=self.__file)
             self.flush()
         except (KeyboardInterrupt, SystemExit):
             raise
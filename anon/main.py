@@ -8,15 +8,26 @@ logger = logging.getLogger(__name__)
 
 import sys
 import getopt
+import math
+import numpy as np
+import pandas as pd
 
 from configuration.configuration_reader import ConfigurationReader
-from evaluation.information_loss import calculate_normalized_certainty_penalty
-from evaluation.partition import calculate_mean_partition_size, calculate_std_partition_size, get_partition_split_share
+from evaluation.engine import SUPPORTED_METRICS, evaluate
+from evaluation.partition import get_partition_split_share
 from kernel.anonymization_kernel import AnonymizationKernel
+from kernel.incremental_state import IncrementalState
+from kernel.k_anonymity import KAnonymity
+from logger.instrumentation import Instrumentation
+from logger.profiler import DEFAULT_SAMPLING_INTERVAL, Profiler
 from nlp.sensitive_terms_recognizer import SensitiveTermsRecognizer
+from postprocessing.output_writer import OutputWriter, batch_partitions
 from postprocessing.postprocessor import PostProcessor
 from preprocessing.data_reader import DataReader
 from preprocessing.preprocessor import Preprocessor
+from preprocessing.spilled_dataset import SpilledDataset, get_number_of_buckets
+
+LEAF_ATTRIBUTE = "__leaf__"  # Helper attribute keeping track of the partition of records while uncompressing
 
 
 def main(argv):
@@ -27,12 +38,18 @@ def main(argv):
     input_file = ''
     output_file = ''
     use_cache = False
+    report = False
+    trace_memory = False
+    profile_stages = []
+    profile_interval = DEFAULT_SAMPLING_INTERVAL
+    state_directory = None
 
     # Read and set tool parameters
     try:
-        opts, _ = getopt.getopt(argv, "c:i:o:vs", ["config=", "input=", "output=", "verbose", "use_chached_docs"])
+        opts, _ = getopt.getopt(argv, "c:i:o:vsrt", ["config=", "input=", "output=", "verbose", "use_chached_docs", "report", "trace_memory", "profile=", "profile_interval=", "incremental="])
     except getopt.GetoptError:
-        logger.error('main.py -c <config_file> -i <input_file> -o <output_file>')
+        logger.error('main.py -c <config_file> -i <input_file> -o <output_file> [-r] [-t] [--profile <stages>] [--profile_interval <seconds>] '
+                     '[--incremental <state_directory>]')
         sys.exit(2)
     for opt, arg in opts:
         if opt in ("-c", "--config"):
@@ -43,6 +60,18 @@ def main(argv):
             output_file = arg
         if opt in ("-s", "--use_chached_docs"):
             use_cache = True
+        if opt in ("-r", "--report"):
+            report = True
+        if opt in ("-t", "--trace_memory"):
+            report = True
+            trace_memory = True
+        if opt == "--profile":
+            profile_stages = [stage.strip() for stage in arg.split(",") if stage.strip()]
+        if opt == "--profile_interval":
+            profile_interval = float(arg)
+        if opt == "--incremental":
+            state_directory = arg
+            use_cache = True  # Persons of affected partitions are analyzed again, which must not run the model on their former texts
         if opt in ("-v", "--verbose"):
             logging.getLogger().setLevel(logging.DEBUG)
 
@@ -53,79 +82,409 @@ def main(argv):
     configuration_reader = ConfigurationReader()
     config = configuration_reader.read(configuration_file)
 
-    # Read data using data types defined in the configuration
-    data_reader = DataReader(config)
-    df = data_reader.read(input_file)
+    # Initialize the instrumentation measuring time, memory, and counters of every stage, profiling selected stages
+    profiler = None
+    if profile_stages:
+        profiler = Profiler(profile_stages, str(output_file).rsplit(".", 1)[0] + "_profile", profile_interval)
+    instrumentation = Instrumentation(trace_memory, profiler)
 
-    # Initialize the sensitive terms recognizer
+    # Initialize the data reader and the sensitive terms recognizer
+    data_reader = DataReader(config)
     sensitive_terms_recognizer = SensitiveTermsRecognizer(config, use_cache)
 
+    # Anonymize appended records using the state of former runs, or process the dataset in parts if a memory budget is given
+    if state_directory:
+        anonymize_incrementally(config, data_reader, sensitive_terms_recognizer, input_file, output_file, state_directory, instrumentation)
+    elif config.get_memory_budget():
+        anonymize_within_memory_budget(config, data_reader, sensitive_terms_recognizer, input_file, output_file, instrumentation)
+    else:
+        anonymize(config, data_reader, sensitive_terms_recognizer, input_file, output_file, instrumentation)
+
+    # Save the instrumentation report next to the output file
+    if report:
+        instrumentation.save(str(output_file).rsplit(".", 1)[0] + "_instrumentation.json")
+
+
+def anonymize(config, data_reader, sensitive_terms_recognizer, input_file, output_file, instrumentation):
+    """Anonymizes an input file keeping the complete dataset in memory"""
+
+    # Read data using data types defined in the configuration
+    with instrumentation.stage("reading") as stage:
+        df = data_reader.read(input_file)
+    instrumentation.count(stage, "records", len(df))
+
     # Initialize the preprocessor (preprocessor is stateful, so pass df at the beginning)
     pp = Preprocessor(sensitive_terms_recognizer, config, df)
 
     # Run through preprocessing of dataframe: Data cleansing, analysis of textual attributes, resolving of redundant information, and compression
-    pp.clean_textual_attributes()
-    pp.analyze_textual_attributes()
-    pp.find_redundant_information()
-    pp.compress()
+    pp.preprocess(instrumentation)
 
     # Get sensitive terms dictionary and preprocessed dataframe
     terms = pp.get_sensitive_terms()
     df = pp.get_df()
 
     # Initialize the anonymization kernel by providing the sensitive terms dictionary, the configuration, the sensitive terms recognizer, and the preprocessor
-    kernel = AnonymizationKernel(terms, config, sensitive_terms_recognizer, pp)
-
-    # Save the unanonymized dataframe for later
-    unanonymized_df = df.copy()
+    kernel = AnonymizationKernel(terms, config, sensitive_terms_recognizer, pp, instrumentation)
 
     # Parameters for anonymization
     k = config.parameters["k"]
     strategy = config.parameters["strategy"]
     biases = config.get_biases()
     relational_weight = config.get_relational_weight()
+    quasi_identifiers = config.get_quasi_identifiers()
 
-    # Anonymize quasi identifier (applying k-anonymity) and recode textual attributes
-    anonymized_df, partitions, partition_split_statistics = kernel.anonymize_quasi_identifiers(df, k, strategy, biases, relational_weight)
-    anonymized_df = kernel.recode_textual_attributes(anonymized_df)
+    # Partition using quasi identifiers and sensitive terms, the preprocessed records remain unchanged and serve as the original records for the metrics
+    k_anonymity = KAnonymity(df, quasi_identifiers, k, strategy, biases, relational_weight, terms, config)
+    with instrumentation.stage("partitioning") as stage:
+        partitions, partition_split_statistics = k_anonymity.partition()
+    instrumentation.count(stage, "partitions", len(partitions))
+    refinement_statistics = k_anonymity.get_refinement_statistics()
+    if refinement_statistics:
+        instrumentation.count(stage, "splits", refinement_statistics["splits"])
+        instrumentation.set_counter(stage, "max_depth", refinement_statistics["max_depth"])
 
-    # Parameters for calculating metrics
-    quasi_identifiers = config.get_quasi_identifiers()
+    # Initialize the postprocessor with the config and the preprocessor
+    post_processor = PostProcessor(config, pp)
+
+    # Recode, replace texts, postprocess, and save finished partitions batch by batch, so that recoding overlaps with writing the previous batch
+    # Only the recoded attributes are kept for the metrics, the prettified dataset is never held in memory at once
+    logger.info("Saving anonymized file to %s", output_file)
+    recoded_dfs = []
+    with OutputWriter(output_file, quasi_identifiers) as writer:
+        for batch in batch_partitions(partitions, config.get_output_batch_size()):
+            with instrumentation.stage("recoding") as stage:
+                recoded_df = k_anonymity.recode(batch)
+            instrumentation.count(stage, "records", len(recoded_df))
+            recoded_dfs.append(recoded_df)
+            batch_df = df.loc[recoded_df.index]
+            for column in recoded_df.columns:
+                batch_df[column] = recoded_df[column]
+            batch_df = replace_texts(kernel, config, batch_df, instrumentation)
+            batch_df = postprocess(post_processor, batch_df, writer.is_columnar(), instrumentation)
+
+            # Don't forget to drop the direct identifiers since they are now not needed anymore
+            write(writer, kernel.remove_direct_identifier(batch_df), instrumentation)
+        with instrumentation.stage("output"):
+            writer.flush()
+
+    # Entity attributes without sensitive terms to partition on have not been recoded
     textual_attribute_mapping = pp.get_textual_attribute_mapping()
+    anonymized_df = pd.concat(recoded_dfs)
+    for attribute in [attribute for mapping in textual_attribute_mapping for attribute in textual_attribute_mapping[mapping]]:
+        if attribute not in anonymized_df.columns:
+            anonymized_df[attribute] = df[attribute]
 
-    # Calculating the total, relational, and textual information loss based on the original and anonymized data frame
-    total_information_loss, relational_information_loss, textual_information_loss = calculate_normalized_certainty_penalty(unanonymized_df, anonymized_df, quasi_identifiers, textual_attribute_mapping)
+    # Calculating the configured metrics, like information loss, partition sizes, discernibility, and suppressed records, in one pass
+    with instrumentation.stage("metrics"):
+        metrics = evaluate(df, anonymized_df, partitions, k, quasi_identifiers, textual_attribute_mapping, config.get_metrics(), n_processes=config.get_processes())
 
-    # Calculating the mean and std for partition size as well as split statistics
-    mean_partition_size = calculate_mean_partition_size(partitions)
-    std_partition_size = calculate_std_partition_size(partitions)
+    # Calculating split statistics
     if partition_split_statistics:
         number_of_relational_splits, number_of_textual_splits = get_partition_split_share(partition_split_statistics, textual_attribute_mapping)
+        instrumentation.set_counter("partitioning", "relational_splits", number_of_relational_splits)
+        instrumentation.set_counter("partitioning", "textual_splits", number_of_textual_splits)
 
     # Notify about the results
-    logger.info("Information loss for relational attributes is %4.4f", relational_information_loss)
-    if textual_information_loss:
-        logger.info("Information loss for textual attribute is %4.4f", textual_information_loss["total"])
-    logger.info("Total information loss is %4.4f", total_information_loss)
-    logger.info("Ended up with %d partitions with a mean size of %.2f and a std of %.2f", len(partitions), mean_partition_size, std_partition_size)
+    if "total_information_loss" in metrics:
+        logger.info("Information loss for relational attributes is %4.4f", metrics["relational_information_loss"])
+        if metrics["textual_information_loss"]:
+            logger.info("Information loss for textual attribute is %4.4f", metrics["textual_information_loss"]["total"])
+        logger.info("Total information loss is %4.4f", metrics["total_information_loss"])
+    if "mean_partition_size" in metrics:
+        logger.info("Ended up with %d partitions with a mean size of %.2f and a std of %.2f", len(partitions), metrics["mean_partition_size"], metrics["std_partition_size"])
+    if "discernibility" in metrics:
+        logger.info("Discernibility metric is %d", metrics["discernibility"])
+    if "average_class_size" in metrics:
+        logger.info("Normalized average equivalence class size is %.2f", metrics["average_class_size"])
+    for attribute, suppressed_records in metrics.get("suppressed_records", {}).items():
+        if suppressed_records > 0:
+            logger.info("Suppressed attribute %s for %d records", attribute, suppressed_records)
     if partition_split_statistics:
         logger.info("Split %d times on a relational attribute", number_of_relational_splits)
         logger.info("Split %d times on a textual attribute", number_of_textual_splits)
+    if refinement_statistics and refinement_statistics["budget_exhausted"]:
+        logger.info("Skipped refinement of %d partitions with %d records after %d splits due to the partitioning budget",
+                    refinement_statistics["unrefined_partitions"], refinement_statistics["unrefined_records"], refinement_statistics["splits"])
 
-    # Initialize the postprocessor with the config and the preprocessor
-    post_processor = PostProcessor(config, pp)
 
-    # Perform post processing actions on the anonymized data frame
-    anonymized_df = post_processor.clean(anonymized_df)
-    anonymized_df = post_processor.uncompress(anonymized_df)
-    anonymized_df = post_processor.pretty(anonymized_df)
+def anonymize_within_memory_budget(config, data_reader, sensitive_terms_recognizer, input_file, output_file, instrumentation):
+    """Anonymizes an input file keeping only parts of the dataset in memory by spilling preprocessed records to disk"""
+
+    # Estimate how many buckets of keys are needed to stay within the memory budget
+    memory_budget = config.get_memory_budget()
+    n_buckets = get_number_of_buckets(input_file, memory_budget)
+    logger.info("Processing dataset in %d buckets to stay within a memory budget of %d MB", n_buckets, memory_budget)
+
+    # Distribute records by their key into buckets on disk, reading the input file in chunks
+    dataset = SpilledDataset(config, config.get_spill_directory())
+    with instrumentation.stage("reading"):
+        dataset.distribute(data_reader.read_chunks(input_file), n_buckets)
 
-    # Don't forget to drop the direct identifiers since they are now not needed anymore
-    anonymized_df = kernel.remove_direct_identifier(anonymized_df)
+    # Run through preprocessing bucket by bucket and spill the compressed records to disk
+    for bucket in dataset.get_buckets():
+        logger.info("Preprocessing bucket %d of %d", bucket + 1, n_buckets)
+        with instrumentation.stage("reading") as stage:
+            raw_df = dataset.read_raw_bucket(bucket)
+        instrumentation.count(stage, "records", len(raw_df))
+        pp = Preprocessor(sensitive_terms_recognizer, config, raw_df)
+        pp.preprocess(instrumentation)
+        dataset.add_preprocessed_bucket(bucket, pp)
+
+    # Parameters for anonymization
+    k = config.parameters["k"]
+    strategy = config.parameters["strategy"]
+    biases = config.get_biases()
+    relational_weight = config.get_relational_weight()
+    quasi_identifiers = config.get_quasi_identifiers()
+    terms = dataset.get_sensitive_terms()
 
-    # Notify and save
+    # Partition leaf by leaf using quasi identifiers and sensitive terms encoded by their texts only
+    max_records = math.ceil(dataset.get_number_of_records() / n_buckets)
+    with instrumentation.stage("partitioning") as stage:
+        partitions, partition_split_statistics, refinement_statistics = partition_within_memory_budget(config, dataset, terms, max_records)
+    instrumentation.count(stage, "partitions", len(partitions))
+    if refinement_statistics:
+        instrumentation.count(stage, "splits", refinement_statistics["splits"])
+        instrumentation.set_counter(stage, "max_depth", refinement_statistics["max_depth"])
+
+    # Move records of partitions together on disk, so that partitions can be recoded in batches fitting into the memory budget
+    batches = dataset.shuffle_into_batches(partitions, max_records)
+
+    # Initialize the anonymization kernel and the postprocessor using the spilled dataset in place of the preprocessor
+    kernel = AnonymizationKernel(terms, config, sensitive_terms_recognizer, dataset, instrumentation)
+    post_processor = PostProcessor(config, dataset)
+
+    # Recode, postprocess, and save batch by batch
     logger.info("Saving anonymized file to %s", output_file)
-    anonymized_df.to_csv(output_file, index=False)
+    with OutputWriter(output_file, quasi_identifiers) as writer:
+        for batch, partitions_of_batch in enumerate(batches):
+            df = dataset.read_batch(batch)
+            with instrumentation.stage("recoding") as stage:
+                anonymized_df = KAnonymity(df, quasi_identifiers, k, strategy, biases, relational_weight, terms, config).recode(partitions_of_batch)
+                for column in anonymized_df.columns:
+                    df[column] = anonymized_df[column]
+            instrumentation.count(stage, "records", len(df))
+            df = replace_texts(kernel, config, df, instrumentation)
+            df = postprocess(post_processor, df.reset_index(drop=True), writer.is_columnar(), instrumentation)
+            write(writer, kernel.remove_direct_identifier(df), instrumentation)
+        with instrumentation.stage("output"):
+            writer.flush()
+
+    # Calculate the configured metrics which only depend on partitions, since the original dataset is not kept in memory for the others
+    metrics = [metric for metric in config.get_metrics() or SUPPORTED_METRICS if metric not in ["information_loss", "suppression"]]
+    with instrumentation.stage("metrics"):
+        metrics = evaluate(None, None, partitions, k, quasi_identifiers, {}, metrics)
+    logger.info("Information loss and suppressed records are not calculated within a memory budget")
+
+    # Notify about the results
+    if "mean_partition_size" in metrics:
+        logger.info("Ended up with %d partitions with a mean size of %.2f and a std of %.2f", len(partitions), metrics["mean_partition_size"], metrics["std_partition_size"])
+    if "discernibility" in metrics:
+        logger.info("Discernibility metric is %d", metrics["discernibility"])
+    if "average_class_size" in metrics:
+        logger.info("Normalized average equivalence class size is %.2f", metrics["average_class_size"])
+    if partition_split_statistics:
+        number_of_relational_splits, number_of_textual_splits = get_partition_split_share(partition_split_statistics, dataset.get_textual_attribute_mapping())
+        instrumentation.set_counter("partitioning", "relational_splits", number_of_relational_splits)
+        instrumentation.set_counter("partitioning", "textual_splits", number_of_textual_splits)
+        logger.info("Split %d times on a relational attribute", number_of_relational_splits)
+        logger.info("Split %d times on a textual attribute", number_of_textual_splits)
+    dataset.remove()
+
+
+def partition_within_memory_budget(config, dataset, terms, max_records):
+    """
+    Partitions a spilled dataset keeping at most about max_records records in memory. Mondrian first partitions a sample into leaves
+    expected to hold at most max_records records each, all records are routed into these leaves bucket by bucket,
+    and each leaf is partitioned on its own. Leaves with less than k records are partitioned together with the following ones.
+    """
+    k = config.parameters["k"]
+    strategy = config.parameters["strategy"]
+    biases = config.get_biases()
+    relational_weight = config.get_relational_weight()
+    quasi_identifiers = config.get_quasi_identifiers()
+    attributes = quasi_identifiers + list(terms.keys())
+    n_records = dataset.get_number_of_records()
+
+    if strategy not in ["mondrian", "relaxed_mondrian"] or n_records <= max_records:
+        if n_records > max_records:
+            logger.warning("Partitioning strategy %s requires all %d records in memory, exceeding the memory budget", strategy, n_records)
+        leaf_dfs = [dataset.sample_encoded(attributes, n_records)]
+    else:
+        # Leaves of a sample of max_records records hold between leaf_k and 2 * leaf_k - 1 sampled records, which stand for n_records / max_records records each
+        sample_df = dataset.sample_encoded(attributes, max_records)
+        leaf_k = max(1, math.floor(len(sample_df) * max_records / (2 * n_records)))
+        split_tree = {}
+        KAnonymity(sample_df, quasi_identifiers, leaf_k, strategy, biases, relational_weight, terms, config).partition(split_tree)
+        del sample_df
+        leaves = dataset.route_encoded(split_tree, attributes)
+        logger.info("Routed %d records into %d leaves to partition one after another", n_records, len(leaves))
+        leaf_dfs = (dataset.read_encoded_leaf(leaf) for leaf in leaves)
+
+    partitions = []
+    partition_split_statistics = None
+    refinement_statistics = None
+    pending_dfs = []
+    for leaf_df in leaf_dfs:
+        pending_dfs.append(leaf_df)
+        if sum(len(df) for df in pending_dfs) < k:
+            continue
+        leaf_df = pd.concat(pending_dfs) if len(pending_dfs) > 1 else leaf_df
+        pending_dfs = []
+        k_anonymity = KAnonymity(leaf_df, quasi_identifiers, k, strategy, biases, relational_weight, terms, config)
+        leaf_partitions, leaf_split_statistics = k_anonymity.partition()
+        partitions += leaf_partitions
+        if leaf_split_statistics is not None:
+            partition_split_statistics = {attribute: (partition_split_statistics or {}).get(attribute, 0) + splits for attribute, splits in leaf_split_statistics.items()}
+        leaf_refinement_statistics = k_anonymity.get_refinement_statistics()
+        if leaf_refinement_statistics:
+            if refinement_statistics is None:
+                refinement_statistics = dict(leaf_refinement_statistics)
+            else:
+                for statistic in ["splits", "unrefined_partitions", "unrefined_records"]:
+                    refinement_statistics[statistic] += leaf_refinement_statistics[statistic]
+                refinement_statistics["max_depth"] = max(refinement_statistics["max_depth"], leaf_refinement_statistics["max_depth"])
+                refinement_statistics["budget_exhausted"] |= leaf_refinement_statistics["budget_exhausted"]
+    if pending_dfs:
+        # Records of the last leaves are too few to form a partition on their own, so they join the last partition
+        remaining = [df.index.to_numpy() for df in pending_dfs]
+        partitions[-1:] = [pd.Index(np.concatenate([np.asarray(partition) for partition in partitions[-1:]] + remaining))]
+    return partitions, partition_split_statistics, refinement_statistics
+
+
+def anonymize_incrementally(config, data_reader, sensitive_terms_recognizer, input_file, output_file, state_directory, instrumentation):
+    """Anonymizes records appended to the records of former runs, partitioning, recoding, and postprocessing only the partitions they end up in"""
+
+    # Read the appended records and add them to the records of former runs
+    state = IncrementalState(config, state_directory)
+    with instrumentation.stage("reading") as stage:
+        df = data_reader.read(input_file)
+    instrumentation.count(stage, "records", len(df))
+    changed_keys = state.add_records(df, input_file)
+    logger.info("Anonymizing %d new or changed persons incrementally", len(changed_keys))
+
+    # Route new and changed persons through the split tree of former runs into the partitions they belong to
+    if state.is_split():
+        pp = Preprocessor(sensitive_terms_recognizer, config, state.get_records(changed_keys))
+        pp.preprocess(instrumentation)
+        routing_df = pp.get_df()
+    else:
+        routing_df = pd.DataFrame({config.get_key_attribute(): changed_keys})  # Nothing to route on before the first split
+    with instrumentation.stage("routing") as stage:
+        affected_leaves = state.assign(routing_df, config.parameters["k"])
+    instrumentation.count(stage, "partitions", len(affected_leaves))
+    logger.info("New and changed persons affect %d partitions", len(affected_leaves))
+
+    # Save anonymized records of all partitions, replacing the ones of affected partitions
+    quasi_identifiers = config.get_quasi_identifiers()
+    with OutputWriter(output_file, quasi_identifiers) as writer:
+        if affected_leaves:
+            anonymize_leaves(config, sensitive_terms_recognizer, state, affected_leaves, writer.is_columnar(), instrumentation)
+        logger.info("Saving anonymized file to %s", output_file)
+        for batch in batch_partitions(state.get_outputs(), config.get_output_batch_size()):
+            write(writer, pd.concat(batch, ignore_index=True), instrumentation)
+        with instrumentation.stage("output"):
+            writer.flush()
+    logger.info("Ended up with %d partitions", state.get_number_of_leaves())
+    state.save()
+
+
+def anonymize_leaves(config, sensitive_terms_recognizer, state, leaves, with_bounds, instrumentation):
+    """Partitions, recodes, and postprocesses the persons of the given leaves of an incremental state, setting the anonymized records per leaf"""
+
+    # Parameters for anonymization
+    k = config.parameters["k"]
+    strategy = config.parameters["strategy"]
+    biases = config.get_biases()
+    relational_weight = config.get_relational_weight()
+    quasi_identifiers = config.get_quasi_identifiers()
+    key_attribute = config.get_key_attribute()
+    if strategy not in ["mondrian", "relaxed_mondrian"]:
+        raise Exception("Incremental anonymization requires Mondrian partitioning, but strategy is {}".format(strategy))
+
+    # Preprocess all persons of the leaves, which loads the analyzed texts of unchanged persons from the cache
+    pp = Preprocessor(sensitive_terms_recognizer, config, state.get_records(state.get_members(leaves)))
+    pp.preprocess(instrumentation)
+    terms = pp.get_sensitive_terms()
+    df = pp.get_df()
+
+    # Partition leaves which have grown large enough to be split again, extending the split tree
+    partitions = []
+    leaves_of_partitions = []
+    with instrumentation.stage("partitioning") as stage:
+        for leaf in leaves:
+            partition = df.index[df[key_attribute].isin(state.get_members([leaf]))]
+            if len(partition) < 2 * k:
+                partitions.append(partition)
+                leaves_of_partitions.append(leaf)
+                continue
+            split_tree = {}
+            leaf_partitions, _ = KAnonymity(df.loc[partition], quasi_identifiers, k, strategy, biases, relational_weight, terms, config).partition(split_tree)
+            partitions += leaf_partitions
+            leaves_of_partitions += state.split_leaf(leaf, split_tree, [df.loc[leaf_partition, key_attribute].tolist() for leaf_partition in leaf_partitions])
+    instrumentation.count(stage, "partitions", len(partitions))
+
+    # Recode the partitions
+    with instrumentation.stage("recoding") as stage:
+        anonymized_df = KAnonymity(df, quasi_identifiers, k, strategy, biases, relational_weight, terms, config).recode(partitions)
+        for column in anonymized_df.columns:
+            df[column] = anonymized_df[column]
+    instrumentation.count(stage, "records", len(df))
+
+    # Recode texts and postprocess, keeping track of the leaf of every record while uncompressing
+    kernel = AnonymizationKernel(terms, config, sensitive_terms_recognizer, pp, instrumentation)
+    post_processor = PostProcessor(config, pp)
+    df = replace_texts(kernel, config, df, instrumentation)
+    with instrumentation.stage("postprocessing"):
+        with instrumentation.stage("clean"):
+            df = post_processor.clean(df)
+        with instrumentation.stage("uncompress"):
+            leaf_of_record = np.empty(len(df), dtype=np.int64)
+            for leaf, partition in zip(leaves_of_partitions, partitions):
+                leaf_of_record[df.index.get_indexer(partition)] = leaf
+            df[LEAF_ATTRIBUTE] = leaf_of_record
+            df = post_processor.uncompress(df)
+            leaf_of_record = df.pop(LEAF_ATTRIBUTE).to_numpy()
+        with instrumentation.stage("pretty"):
+            df = prettify(post_processor, kernel.remove_direct_identifier(df), with_bounds)
+    for leaf, leaf_df in df.groupby(leaf_of_record, sort=False):
+        state.set_output(leaf, leaf_df.reset_index(drop=True), with_bounds)
+
+
+def replace_texts(kernel, config, df, instrumentation):
+    """Replaces sensitive terms in texts by their recoded representatives, measured as a stage"""
+    with instrumentation.stage("text_replacement") as stage:
+        df = kernel.recode_textual_attributes(df)
+    for textual_attribute in config.get_textual_attributes():
+        instrumentation.count(stage, "texts", int(df[textual_attribute].notna().sum()))
+    return df
+
+
+def postprocess(post_processor, df, with_bounds, instrumentation):
+    """Cleans, uncompresses, and prettifies a batch, measuring each step as a stage within the postprocessing stage"""
+    with instrumentation.stage("postprocessing"):
+        with instrumentation.stage("clean"):
+            df = post_processor.clean(df)
+        with instrumentation.stage("uncompress"):
+            df = post_processor.uncompress(df)
+        with instrumentation.stage("pretty"):
+            df = prettify(post_processor, df, with_bounds)
+    return df
+
+
+def write(writer, df, instrumentation):
+    """Passes a batch to the output writer, measuring the time spent waiting for the previous batch"""
+    with instrumentation.stage("output") as stage:
+        writer.write(df)
+    instrumentation.count(stage, "records", len(df))
+    instrumentation.count(stage, "batches")
+
+
+def prettify(post_processor, df, with_bounds):
+    """Converts recoded values to pretty strings, adding typed bounds of numerical and date quasi-identifiers for columnar output files"""
+    if not with_bounds:
+        return post_processor.pretty(df)
+    return post_processor.pretty(df).join(post_processor.bounds(df))
 
 
 if __name__ == "__main__":
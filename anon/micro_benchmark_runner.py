@@ -0,0 +1,80 @@
+"""Main application to run micro-benchmarks of kernel primitives and compare them with a baseline"""
+
+import logging
+from logger.tqdm_logging_handler import TqdmLoggingHandler
+
+logging.basicConfig(level=logging.INFO, handlers=[TqdmLoggingHandler()])
+logger = logging.getLogger(__name__)
+
+import sys
+import getopt
+
+from benchmarks.micro import DEFAULT_MIN_TIME, DEFAULT_REPEAT, DEFAULT_THRESHOLD, compare_results, load_micro_results, run_benchmarks, save_micro_results
+from benchmarks.results import get_environment
+
+
+def main(argv):
+    """Main entrypoint for the micro-benchmarks"""
+
+    # Default parameters
+    sizes = None
+    selected = None
+    result_file = None
+    baseline_file = None
+    compare_file = None
+    threshold = DEFAULT_THRESHOLD
+    repeat = DEFAULT_REPEAT
+    min_time = DEFAULT_MIN_TIME
+
+    # Read and set tool parameters
+    try:
+        opts, _ = getopt.getopt(argv, "n:f:o:b:c:t:r:v", ["sizes=", "functions=", "output=", "baseline=", "compare=", "threshold=", "repeat=", "min_time=", "verbose"])
+    except getopt.GetoptError:
+        logger.error('micro_benchmark_runner.py [-n <sizes>] [-f <functions>] [-o <result_file>] [-b <baseline_file>] [-c <result_file_to_compare>] [-t <threshold>] '
+                     '[-r <repeat>] [--min_time <seconds>]')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-n", "--sizes"):
+            sizes = [int(size) for size in arg.split(",")]
+        if opt in ("-f", "--functions"):
+            selected = [function.strip() for function in arg.split(",") if function.strip()]
+        if opt in ("-o", "--output"):
+            result_file = arg
+        if opt in ("-b", "--baseline"):
+            baseline_file = arg
+        if opt in ("-c", "--compare"):
+            compare_file = arg
+        if opt in ("-t", "--threshold"):
+            threshold = float(arg)
+        if opt in ("-r", "--repeat"):
+            repeat = int(arg)
+        if opt == "--min_time":
+            min_time = float(arg)
+        if opt in ("-v", "--verbose"):
+            logging.getLogger().setLevel(logging.DEBUG)
+
+    # Either compare existing results or run the micro-benchmarks
+    if compare_file:
+        results = load_micro_results(compare_file)
+    else:
+        results = run_benchmarks(sizes, selected, min_time, repeat)
+        if result_file:
+            save_micro_results(results, get_environment(), result_file)
+
+    if not baseline_file:
+        return
+
+    # Flag benchmarks which have become slower than the baseline by more than the threshold
+    comparison = compare_results(load_micro_results(baseline_file), results, threshold)
+    for name, row in comparison.iterrows():
+        log = logger.warning if row["slowdown"] else logger.info
+        log("%s: %.6f seconds per call, %+.1f %% compared to %.6f seconds of the baseline", name, row["current"], row["change"] * 100, row["baseline"])
+    slowdowns = comparison[comparison["slowdown"]]
+    if len(slowdowns) > 0:
+        logger.error("%d of %d micro-benchmarks are slower than the baseline by more than %.0f %%: %s", len(slowdowns), len(comparison), threshold * 100, ", ".join(slowdowns.index))
+        sys.exit(1)
+    logger.info("None of %d micro-benchmarks is slower than the baseline by more than %.0f %%", len(comparison), threshold * 100)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,284 @@
+"""This module contains code to share one sensitive terms recognizer between anonymization jobs running concurrently"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_WAIT = 0.05
+
+
+class BatchingRecognizer:
+    """
+    Shares a sensitive terms recognizer between jobs running in separate threads.
+    Texts of all jobs waiting for recognition are passed to the recognizer in one call by a single thread, waiting the given time for further jobs to join a batch.
+    Person ids and record indexes are prefixed by the job id, so that jobs cannot overwrite the state of each other within the recognizer.
+    """
+
+    def __init__(self, recognizer, batch_wait=DEFAULT_BATCH_WAIT):
+        self.__recognizer = recognizer
+        self.__batch_wait = batch_wait
+        self.__pending = []
+        self.__condition = threading.Condition()
+        self.__lock = threading.Lock()  # Models are not safe to be used by multiple threads at once
+        self.__thread = None
+        self.__statistics = {"batches": 0, "requests": 0}
+
+    def for_job(self, job_id):
+        """
+        Returns a recognizer to be used by the preprocessor and kernel of a single job
+        Parameters
+        ----------
+        job_id: str
+            Id of the job, unique among jobs sharing this recognizer.
+        Returns
+        -------
+        JobRecognizer
+            Recognizer with the interface of the sensitive terms recognizer.
+        """
+        return JobRecognizer(self, job_id)
+
+    def get_statistics(self):
+        """
+        Returns how many batches have been passed to the recognizer for how many requests of jobs
+        Returns
+        -------
+        dict
+            Dictionary with numbers of batches and requests.
+        """
+        return self.__statistics
+
+    def recognize(self, job_id, attribute_name, texts_to_analyze):
+        """
+        Recognizes sensitive terms in texts of a job together with the texts of other jobs waiting for recognition
+        Parameters
+        ----------
+        job_id: str
+            Id of the job.
+        attribute_name: str
+            Name of attribute.
+        texts_to_analyze: dict
+            Dictionary containing texts and their contexts.
+        Returns
+        -------
+        dict
+            Dictionary with the recognized sensitive terms.
+        """
+        future = Future()
+        with self.__condition:
+            self.__pending.append((job_id, attribute_name, texts_to_analyze, future))
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__recognize_batches, daemon=True)
+                self.__thread.start()
+            self.__condition.notify()
+        return future.result()
+
+    def replace(self, job_id, attribute_name, person_id, replacements, entities_to_remain):
+        """
+        Replaces entities in texts of a person of a job, see SensitiveTermsRecognizer.replace
+        Parameters
+        ----------
+        job_id: str
+            Id of the job.
+        attribute_name: str
+            Name of attribute.
+        person_id: str
+            Direct identifier.
+        replacements: dict
+            Dictionary containing replacements for specific tokens.
+        entities_to_remain: set
+            Set containing entities which should be kept.
+        Returns
+        -------
+        (str, list)
+            Recoded text, or list with recoded texts if the person has multiple texts.
+        """
+        with self.__lock:
+            return self.__recognizer.replace(attribute_name, get_job_key(job_id, person_id), replacements, entities_to_remain)
+
+    def release(self, job_id, attribute_name, person_ids):
+        """
+        Releases the state the recognizer keeps for persons of a finished job
+        Parameters
+        ----------
+        job_id: str
+            Id of the job.
+        attribute_name: str
+            Name of attribute.
+        person_ids: list
+            Direct identifiers of the persons.
+        """
+        with self.__lock:
+            self.__recognizer.release(attribute_name, [get_job_key(job_id, person_id) for person_id in person_ids])
+
+    def analyze(self, text):
+        """
+        Analyzes a single text using the language model of the recognizer
+        Parameters
+        ----------
+        text: str
+            Text to analyze.
+        Returns
+        -------
+        Doc
+            Analyzed text.
+        """
+        with self.__lock:
+            return self.__recognizer.get_nlp()(text)
+
+    def __recognize_batches(self):
+        while True:
+            with self.__condition:
+                while len(self.__pending) == 0:
+                    self.__condition.wait()
+            time.sleep(self.__batch_wait)  # Give concurrent jobs the chance to join the batch
+            with self.__condition:
+                requests = self.__pending
+                self.__pending = []
+
+            for attribute_name in dict.fromkeys(request[1] for request in requests):
+                self.__recognize_batch(attribute_name, [request for request in requests if request[1] == attribute_name])
+
+    def __recognize_batch(self, attribute_name, requests):
+        try:
+            entities_per_job = self.__recognize_requests(attribute_name, requests)
+        except Exception as e:
+            # Any failure must reach the waiting jobs, otherwise they would wait forever
+            for request in requests:
+                if not request[3].done():
+                    request[3].set_exception(e)
+            return
+        for job_id, _, _, future in requests:
+            future.set_result(entities_per_job[job_id])
+
+    def __recognize_requests(self, attribute_name, requests):
+        texts_of_batch = {}
+        indexes = {}
+        for job_id, _, texts_to_analyze, _ in requests:
+            for person_id, texts in texts_to_analyze.items():
+                job_texts = []
+                for text, index in texts:
+                    indexes[get_job_key(job_id, index)] = (job_id, index)
+                    job_texts.append((text, get_job_key(job_id, index)))
+                texts_of_batch[get_job_key(job_id, person_id)] = job_texts
+        logger.debug("Recognizing texts of %d persons of %d jobs in one batch", len(texts_of_batch), len(requests))
+
+        with self.__lock:
+            entities_of_batch = self.__recognizer.recognize(attribute_name, texts_of_batch)
+        self.__statistics["batches"] += 1
+        self.__statistics["requests"] += len(requests)
+
+        entities_per_job = {request[0]: {} for request in requests}
+        for key, entities in entities_of_batch.items():
+            job_id, index = indexes[key]
+            entities_per_job[job_id][index] = entities
+        return entities_per_job
+
+
+class JobRecognizer:
+    """Recognizer of a single job, which passes calls to the shared batching recognizer and keeps track of the entities and statistics of the job"""
+
+    def __init__(self, batching_recognizer, job_id):
+        self.__batching_recognizer = batching_recognizer
+        self.__job_id = job_id
+        self.__recognized_sensitive_entities = set()
+        self.__statistics = {"ids": 0, "texts": 0, "cached_ids": 0, "cached_texts": 0}
+        self.__person_ids = {}  # persons per attribute whose texts have been recognized
+
+    def get_nlp(self):
+        """
+        Returns a function analyzing texts using the shared language model
+        Returns
+        -------
+        function
+            Function taking a text and returning its analysis.
+        """
+        return self.__batching_recognizer.analyze
+
+    def get_recognized_entities(self):
+        """
+        Returns a set containing all sensitive entity types which have appeared in texts of this job
+        Returns
+        -------
+        set
+            Set containing sensitive entity types.
+        """
+        return self.__recognized_sensitive_entities
+
+    def get_statistics(self):
+        """
+        Returns how many ids and texts of this job have been analyzed
+        Returns
+        -------
+        dict
+            Dictionary with numbers of ids, texts, cached ids, and cached texts.
+        """
+        return self.__statistics
+
+    def recognize(self, attribute_name, texts_to_analyze):
+        """
+        Recognizes sensitive terms in texts and returns them, see SensitiveTermsRecognizer.recognize
+        Parameters
+        ----------
+        attribute_name: str
+            Name of attribute.
+        texts_to_analyze: dict
+            Dictionary containing texts and their contexts.
+        Returns
+        -------
+        dict
+            Dictionary with the recognized sensitive terms.
+        """
+        entities_per_id = self.__batching_recognizer.recognize(self.__job_id, attribute_name, texts_to_analyze)
+        self.__person_ids.setdefault(attribute_name, set()).update(texts_to_analyze.keys())
+        self.__statistics["ids"] += len(texts_to_analyze)
+        self.__statistics["texts"] += sum(len(texts) for texts in texts_to_analyze.values())
+        for entities in entities_per_id.values():
+            self.__recognized_sensitive_entities.update(entities.keys())
+        return entities_per_id
+
+    def replace(self, attribute_name, person_id, replacements, entities_to_remain):
+        """
+        Replaces entities with their types, replacements from the relational part, or remains them, see SensitiveTermsRecognizer.replace
+        Parameters
+        ----------
+        attribute_name: str
+            Name of attribute.
+        person_id: str
+            Direct identifier.
+        replacements: dict
+            Dictionary containing replacements for specific tokens.
+        entities_to_remain: set
+            Set containing entities which should be kept.
+        Returns
+        -------
+        (str, list)
+            Recoded text, or list with recoded texts if the person has multiple texts.
+        """
+        return self.__batching_recognizer.replace(self.__job_id, attribute_name, person_id, replacements, entities_to_remain)
+
+    def release(self):
+        """
+        Releases the state the shared recognizer keeps for persons of this job, once the job has finished
+        """
+        for attribute_name, person_ids in self.__person_ids.items():
+            self.__batching_recognizer.release(self.__job_id, attribute_name, person_ids)
+        self.__person_ids = {}
+
+
+def get_job_key(job_id, key):
+    """
+    Prefixes a person id or record index by the id of its job
+    Parameters
+    ----------
+    job_id: str
+        Id of the job.
+    key: any
+        Person id or record index.
+    Returns
+    -------
+    str
+        Key unique among all jobs.
+    """
+    return "{}:{}".format(job_id, key)
@@ -14,7 +14,7 @@ from tqdm import tqdm
 
 logging.getLogger("transformers").setLevel(logging.WARNING)
 
-N_CPUS = math.floor(cpu_count() / 2)
+N_CPUS = max(1, math.floor(cpu_count() / 2))
 
 logger = logging.getLogger(__name__)
 
@@ -27,9 +27,9 @@ class SensitiveTermsRecognizer:
 
     def __init__(self, config: Configuration, use_cache: bool = False):
         self.__recognized_sensitive_entities = set()  # set containing sensitive entity types which have been recognized over all texts
-        self.__terms = {}
-        self.__hashes = {}
+        self.__hashes = {}  # hashes of the docs per attribute and person, until the person is released
         self.__custom_entities = None
+        self.__statistics = {"ids": 0, "texts": 0, "cached_ids": 0, "cached_texts": 0}
 
         self.__config = config
         self.__use_cache = use_cache
@@ -83,6 +83,16 @@ class SensitiveTermsRecognizer:
         """
         return self.__recognized_sensitive_entities
 
+    def get_statistics(self):
+        """
+        Returns how many ids and texts have been analyzed over all calls of recognize, and how many of them have been loaded from cached docs
+        Returns
+        -------
+        dict
+            Dictionary with numbers of ids, texts, cached ids, and cached texts.
+        """
+        return self.__statistics
+
     def recognize(self, attribute_name, texts_to_analyze):
         """
         Recognizes sensitive terms in texts and returns them
@@ -113,33 +123,55 @@ class SensitiveTermsRecognizer:
             if not self.__is_transformer:
                 logger.info("Using %d cpu cores to analyze texts", N_CPUS)
 
+        persons_to_analyze = []
         for person_id in texts_to_analyze:
             # calculate hash using the person_id, the model, and the texts_to_analyze
             calculated_hash = get_hash_of_texts_to_analyze(person_id, model_name, texts_to_analyze[person_id])
             self.__hashes.setdefault(attribute_name, {})[person_id] = calculated_hash
 
             n_texts_for_id = len(texts_to_analyze[person_id])
+            self.__statistics["ids"] += 1
+            self.__statistics["texts"] += n_texts_for_id
 
             if self.__use_cache and path.exists(path.join(self.__docs_cache, calculated_hash)):
                 doc_bin = DocBin().from_disk(path.join(self.__docs_cache, calculated_hash))
                 logger.debug("Found %d already processed docs for id %s", len(doc_bin), person_id)
-                entities_for_person = self.__get_entities_from_doc_bin(doc_bin)
-                entities_per_id.update(entities_for_person)
+                self.__statistics["cached_ids"] += 1
+                self.__statistics["cached_texts"] += n_texts_for_id
+                entities_per_id.update(self.__get_entities_from_doc_bin(doc_bin, texts_to_analyze[person_id]))
+                if len(doc_bin) != n_texts_for_id:
+                    logger.warning("%d texts could not be processed for id %s", n_texts_for_id - len(doc_bin), person_id)
             else:
-                logger.debug("%d ids and %d docs remaining", n_ids_to_consider, n_texts_to_analyze)
-                doc_bin = DocBin(attrs=["ENT_IOB", "ENT_TYPE", "ENT_KB_ID", "LEMMA"], store_user_data=True)
-                doc_bin, entities_for_person = self.__recognition_function(person_id, texts_to_analyze[person_id], doc_bin)
-                entities_per_id.update(entities_for_person)
-                doc_bin.to_disk(path.join(self.__docs_cache, calculated_hash))
-
-            n_texts_to_analyze -= n_texts_for_id
-            n_ids_to_consider -= 1
-
-            if len(doc_bin) != n_texts_for_id:
-                logger.warning("%d texts could not be processed for id %s", n_texts_for_id - len(doc_bin), person_id)
+                persons_to_analyze.append(person_id)
+
+        # Analyze texts of all remaining persons in one stream, storing the docs of a person as soon as all of its texts have been analyzed
+        texts_with_context = [(text, (person_id, index)) for person_id in persons_to_analyze for text, index in texts_to_analyze[person_id]]
+        doc_bin, current_person_id = None, None
+        for doc, (person_id, index) in tqdm(self.__recognition_function(texts_with_context), total=len(texts_with_context), desc=attribute_name):
+            if person_id != current_person_id:
+                self.__save_doc_bin(attribute_name, current_person_id, doc_bin, texts_to_analyze)
+                doc_bin, current_person_id = DocBin(attrs=["ENT_IOB", "ENT_TYPE", "ENT_KB_ID", "LEMMA"], store_user_data=True), person_id
+            doc.user_data["index"] = index
+            doc_bin.add(doc)
+            entities_per_id[index] = self.__get_entities_from_doc(doc)
+        self.__save_doc_bin(attribute_name, current_person_id, doc_bin, texts_to_analyze)
 
         return entities_per_id
 
+    def release(self, attribute_name, person_ids):
+        """
+        Releases the hashes of docs kept for persons whose texts will not be replaced anymore, e.g., once their job has finished
+        Parameters
+        ----------
+        attribute_name: str
+            Name of attribute.
+        person_ids: list
+            Direct identifiers of the persons.
+        """
+        hashes = self.__hashes.get(attribute_name, {})
+        for person_id in person_ids:
+            hashes.pop(person_id, None)
+
     def replace(self, attribute_name, person_id, replacements, entities_to_remain):
         """
         Replaces entities with their types, replacements from the relational part, or remains them
@@ -213,28 +245,25 @@ class SensitiveTermsRecognizer:
             return replaced_texts[0]
         return list(replaced_texts)
 
-    def __recognize_using_transformer_model(self, person_id, texts, doc_bin):
-        entities = {}
-        for (text, index) in tqdm(texts, desc=str(person_id)):
+    def __recognize_using_transformer_model(self, texts_with_context):
+        for text, context in texts_with_context:
             try:
-                entities.setdefault(index, {})
                 doc = self.__nlp(text)
                 doc.user_data = {}  # Quick fix since TransformerData is not serializable
-                doc.user_data["index"] = index
-                doc_bin.add(doc)
-                entities[index] = self.__get_entities_from_doc(doc)
+                yield doc, context
             except Exception:
-                logger.error("Error processing textual attribute at index %s", index, exc_info=True)
-        return doc_bin, entities
+                logger.error("Error processing textual attribute at index %s", context[1], exc_info=True)
 
-    def __recognize_using_standard_model(self, person_id, texts, doc_bin):
-        entities = {}
-        for (doc, index) in tqdm(self.__nlp.pipe(texts, as_tuples=True, batch_size=20, n_process=N_CPUS), total=len(texts), desc=str(person_id)):
-            doc.user_data["index"] = index
-            entities.setdefault(index, {})
-            doc_bin.add(doc)
-            entities[index] = self.__get_entities_from_doc(doc)
-        return doc_bin
+    def __recognize_using_standard_model(self, texts_with_context):
+        return self.__nlp.pipe(texts_with_context, as_tuples=True, batch_size=20, n_process=N_CPUS)
+
+    def __save_doc_bin(self, attribute_name, person_id, doc_bin, texts_to_analyze):
+        if doc_bin is None:
+            return
+        n_texts_for_id = len(texts_to_analyze[person_id])
+        if len(doc_bin) != n_texts_for_id:
+            logger.warning("%d texts could not be processed for id %s", n_texts_for_id - len(doc_bin), person_id)
+        doc_bin.to_disk(path.join(self.__docs_cache, self.__hashes[attribute_name][person_id]))
 
     def __get_entities_from_doc(self, doc):
         ents = {}
@@ -245,13 +274,15 @@ class SensitiveTermsRecognizer:
                 self.__recognized_sensitive_entities.add(entity.label_)
         return ents
 
-    def __get_entities_from_doc_bin(self, doc_bin):
+    def __get_entities_from_doc_bin(self, doc_bin, texts):
+        # Docs are stored in the order of the texts they have been hashed with, while indexes of the texts may differ between runs
         entities = {}
-        docs = list(doc_bin.get_docs(self.__nlp.vocab))
-        for doc in docs:
-            index = doc.user_data["index"]
-            entities.setdefault(index, {})
-            entities[index] = self.__get_entities_from_doc(doc)
+        docs = doc_bin.get_docs(self.__nlp.vocab)
+        doc = next(docs, None)
+        for text, index in texts:
+            if doc is not None and doc.text == text:  # Texts which could not be processed have no doc
+                entities[index] = self.__get_entities_from_doc(doc)
+                doc = next(docs, None)
         return entities
 
 
@@ -0,0 +1,197 @@
+"""Main application to estimate experiment results on samples of a dataset"""
+
+import logging
+from logger.tqdm_logging_handler import TqdmLoggingHandler
+
+logging.basicConfig(level=logging.INFO, handlers=[TqdmLoggingHandler()])
+logger = logging.getLogger(__name__)
+
+import sys
+import getopt
+import os
+import json
+import pandas as pd
+
+from configuration.configuration_reader import ConfigurationReader
+from evaluation.information_loss import calculate_normalized_certainty_penalty, calculate_original_statistics
+from evaluation.partition import get_partition_lengths, calculate_mean_partition_size, calculate_std_partition_size
+from evaluation.sampling import stratified_sample, get_sample_fraction, scale_k, confidence_interval
+from kernel.anonymization_kernel import AnonymizationKernel
+from nlp.sensitive_terms_recognizer import SensitiveTermsRecognizer
+from preprocessing.data_reader import DataReader
+from preprocessing.preprocessor import Preprocessor
+from pathlib import Path
+
+
+def main(argv):
+    """Main entrypoint for estimating information loss and partition sizes for a grid of parameters"""
+
+    # Default parameters
+    configuration_file = ''
+    input_file = ''
+    use_cache = True
+    k_values = [2, 3, 4, 5, 10, 20, 50]
+    weights = []
+    relaxed = False
+    fraction = 0.1
+    replicates = 5
+    strata_attribute = None
+    result_dir = None
+
+    # Read and set tool parameters
+    try:
+        opts, _ = getopt.getopt(argv, "c:i:r:k:w:f:n:s:xv", ["config=", "input=", "result_dir=", "k_values=", "weights=", "fraction=", "replicates=", "stratify=", "relaxed", "verbose"])
+    except getopt.GetoptError:
+        logger.error('parameter_estimator.py -c <config_file> -i <input_file> -w <relational_weights> -f <sample_fraction> -n <replicates>')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-c", "--config"):
+            configuration_file = arg
+        if opt in ("-i", "--input"):
+            input_file = arg
+            base = os.path.basename(input_file)
+            if not result_dir:
+                result_dir = os.path.splitext(base)[0]
+        if opt in ("-r", "--result_dir"):
+            result_dir = arg
+        if opt in ("-k", "--k_values"):
+            k_values = [int(k) for k in arg.split(",")]
+        if opt in ("-w", "--weights"):
+            weights = [float(w) for w in arg.split(",")]
+        if opt in ("-f", "--fraction"):
+            fraction = float(arg)
+        if opt in ("-n", "--replicates"):
+            replicates = int(arg)
+        if opt in ("-s", "--stratify"):
+            strata_attribute = arg.lower()
+        if opt in ("-x", "--relaxed"):
+            relaxed = True
+        if opt in ("-v", "--verbose"):
+            logging.getLogger().setLevel(logging.DEBUG)
+
+    # Samples must be large enough for the smallest k to still group records
+    fraction = get_sample_fraction(k_values, fraction)
+
+    result_path = Path("experiment_results") / result_dir / "estimates"
+    result_path.mkdir(parents=True, exist_ok=True)
+
+    # Let's get started
+    logger.info("Estimating results for input file %s on %d samples of %.1f%% of the records", input_file, replicates, fraction * 100)
+
+    # Initialize and read configuration
+    configuration_reader = ConfigurationReader()
+    config = configuration_reader.read(configuration_file)
+
+    # Read data using data types defined in the configuration
+    data_reader = DataReader(config)
+    df = data_reader.read(input_file)
+
+    # Initialize the sensitive terms recognizer
+    sensitive_terms_recognizer = SensitiveTermsRecognizer(config, use_cache)
+
+    # Initialize the preprocessor (preprocessor is stateful, so pass df at the beginning)
+    pp = Preprocessor(sensitive_terms_recognizer, config, df)
+
+    # Run through preprocessing of dataframe: Data cleansing, analysis of textual attributes, resolving of redundant information, and compression
+    pp.clean_textual_attributes()
+    pp.analyze_textual_attributes()
+    pp.find_redundant_information()
+    pp.compress()
+
+    # Get sensitive terms dictionary and preprocessed dataframe
+    terms = pp.get_sensitive_terms()
+    df = pp.get_df()
+
+    # Stratify on the first quasi-identifier if nothing else is given
+    quasi_identifiers = config.get_quasi_identifiers()
+    if strata_attribute is None and len(quasi_identifiers) > 0:
+        strata_attribute = quasi_identifiers[0]
+    logger.info("Drawing samples stratified on attribute %s", strata_attribute)
+    samples = [stratified_sample(df, fraction, strata_attribute, random_state=replicate) for replicate in range(replicates)]
+    effective_fraction = sum(len(sample) for sample in samples) / (replicates * len(df))
+    sample_statistics = [calculate_original_statistics(sample, quasi_identifiers) for sample in samples]
+
+    # Set strategies to estimate, gdf if no weights are given
+    biases = config.get_biases()
+    textual_attribute_mapping = pp.get_textual_attribute_mapping()
+    if weights:
+        strategy = "relaxed_mondrian" if relaxed else "mondrian"
+        settings = [(strategy, weight) for weight in weights]
+    else:
+        settings = [("gdf", None)]
+
+    for strategy, weight in settings:
+        if strategy == "gdf":
+            strategy_name = strategy
+            file_info = strategy
+        else:
+            strategy_name = "{}-{}".format(strategy, weight)
+            file_info = str(weight).replace(".", "_")
+            if strategy == "relaxed_mondrian":
+                file_info = "relaxed_{}".format(file_info)
+
+        # Collect metrics for each k and replicate
+        estimates = {metric: {k: [] for k in k_values} for metric in ["total", "relational", "textual", "mean_partition_size", "std_partition_size"]}
+        partition_sizes = {strategy_name: {}}
+        scaled_k_values = {k: scale_k(k, effective_fraction) for k in k_values}
+        for k in k_values:
+            scaled_k = scaled_k_values[k]
+            same_k_values = [other_k for other_k in k_values if other_k < k and scaled_k_values[other_k] == scaled_k]
+            if same_k_values:
+                logger.warning("k=%d is estimated using the same k=%d on samples as k=%d, so their estimates do not differ", k, scaled_k, same_k_values[0])
+            logger.info("-------------------------------------------------------------------------------")
+            logger.info("Estimating results for k=%d using k=%d on samples with strategy %s", k, scaled_k, strategy_name)
+            partition_sizes[strategy_name][k] = []
+            for sample, original_statistics in zip(samples, sample_statistics):
+                # Restrict sensitive terms to the records within the sample
+                sample_terms = {}
+                sample_ids = set(sample.index)
+                for attribute, attribute_terms in terms.items():
+                    for term, record_ids in attribute_terms.items():
+                        remaining = record_ids.intersection(sample_ids)
+                        if len(remaining) > 0:
+                            sample_terms.setdefault(attribute, {})[term] = remaining
+
+                kernel = AnonymizationKernel(sample_terms, config, sensitive_terms_recognizer, pp)
+                anonymized_df, partitions, _ = kernel.anonymize_quasi_identifiers(sample, scaled_k, strategy, biases, weight)
+                total_il, relational_il, textual_il = calculate_normalized_certainty_penalty(sample, anonymized_df, quasi_identifiers, textual_attribute_mapping, partitions, original_statistics)
+
+                # Partition sizes are reported as measured on the samples, since they do not scale linearly with the dataset size
+                estimates["total"][k].append(total_il)
+                estimates["relational"][k].append(relational_il)
+                if textual_il:
+                    estimates["textual"][k].append(textual_il["total"])
+                estimates["mean_partition_size"][k].append(calculate_mean_partition_size(partitions))
+                estimates["std_partition_size"][k].append(calculate_std_partition_size(partitions))
+                partition_sizes[strategy_name][k] += get_partition_lengths(partitions)
+
+            mean, lower, upper = confidence_interval(estimates["total"][k])
+            logger.info("Estimated total information loss is %4.4f (%4.4f - %4.4f)", mean, lower, upper)
+
+        # Save the estimates using the layout of the experiment runner, adding lower and upper bounds
+        for metric in ["total", "relational", "textual"]:
+            if not any(estimates[metric][k] for k in k_values):
+                continue
+            for suffix, position in [("", 0), ("_lower", 1), ("_upper", 2)]:
+                information_loss = pd.DataFrame(index=k_values, columns=[strategy_name])
+                information_loss.index.name = 'k'
+                for k in k_values:
+                    information_loss.at[k, strategy_name] = confidence_interval(estimates[metric][k])[position]
+                information_loss.to_csv(result_path / "{}_information_loss_{}{}.csv".format(metric, file_info, suffix))
+
+        partition_statistics = pd.DataFrame(index=k_values, columns=["sample_k", "mean", "mean_lower", "mean_upper", "std", "std_lower", "std_upper"])
+        partition_statistics.index.name = 'k'
+        for k in k_values:
+            partition_statistics.loc[k, "sample_k"] = scaled_k_values[k]
+            partition_statistics.loc[k, ["mean", "mean_lower", "mean_upper"]] = confidence_interval(estimates["mean_partition_size"][k])
+            partition_statistics.loc[k, ["std", "std_lower", "std_upper"]] = confidence_interval(estimates["std_partition_size"][k])
+        partition_statistics.to_csv(result_path / "partition_statistics_{}.csv".format(file_info))
+
+        with open(result_path / 'partition_distribution_{}.json'.format(file_info), 'w') as f:
+            json.dump(partition_sizes, f, ensure_ascii=False)
+
+    logger.info("Saved estimates to %s", result_path)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
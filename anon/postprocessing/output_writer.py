@@ -0,0 +1,154 @@
+"""This module contains code to write anonymized records to an output file batch by batch"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_categorical_dtype
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as parquet
+except ImportError:
+    pa = None
+    parquet = None
+
+logger = logging.getLogger(__name__)
+
+PARQUET_SUFFIXES = [".parquet", ".pq"]
+FEATHER_SUFFIXES = [".feather", ".arrow"]
+
+
+def batch_partitions(partitions, max_records):
+    """
+    Groups consecutive partitions into batches containing at most the given number of records
+    Parameters
+    ----------
+    partitions: list
+        List of partitions containing record ids.
+    max_records: int
+        Maximal number of records per batch, unless a single partition is larger.
+    Returns
+    -------
+    list
+        List of batches, each containing a list of partitions.
+    """
+    batches = []
+    batch_size = 0
+    for partition in partitions:
+        if len(batches) == 0 or batch_size + len(partition) > max_records:
+            batches.append([])
+            batch_size = 0
+        batches[-1].append(partition)
+        batch_size += len(partition)
+    return batches
+
+
+class OutputWriter:
+    """
+    Writer appending batches of anonymized records to a CSV file, as row groups to a Parquet file, or as record batches to a Feather/Arrow file.
+    Batches are written in a background thread, so that the next batch can be recoded in the meantime.
+    """
+
+    def __init__(self, output_file, dictionary_columns=None):
+        self.__output_file = output_file
+        self.__suffix = "." + str(output_file).lower().rsplit(".", 1)[-1]
+        if self.is_columnar() and pa is None:
+            raise Exception("Writing Parquet and Feather files requires the pyarrow package")
+        self.__dictionary_columns = dictionary_columns or []
+        self.__dictionaries = {}
+        self.__executor = ThreadPoolExecutor(max_workers=1)
+        self.__pending = None
+        self.__columnar_writer = None
+        self.__schema = None
+        self.__n_batches = 0
+        self.__n_records = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def is_columnar(self):
+        """
+        Returns whether records are written to a columnar Parquet or Feather/Arrow file, which keeps data types
+        Returns
+        -------
+        bool
+            True if the output file is a Parquet or Feather/Arrow file.
+        """
+        return self.__suffix in PARQUET_SUFFIXES + FEATHER_SUFFIXES
+
+    def write(self, df):
+        """
+        Appends records to the output file once the previous batch has been written
+        Parameters
+        ----------
+        df: DataFrame
+            DataFrame with anonymized records to append. It must not be changed afterwards.
+        """
+        self.__wait()
+        self.__pending = self.__executor.submit(self.__write, df, self.__n_batches == 0)
+        self.__n_batches += 1
+        self.__n_records += len(df)
+
+    def flush(self):
+        """
+        Waits until all batches passed so far have been written
+        """
+        self.__wait()
+
+    def close(self):
+        """
+        Waits for pending batches and closes the output file
+        """
+        self.__wait()
+        self.__executor.shutdown()
+        if self.__columnar_writer is not None:
+            self.__columnar_writer.close()
+            self.__columnar_writer = None
+        logger.info("Wrote %d records in %d batches to %s", self.__n_records, self.__n_batches, self.__output_file)
+
+    def __wait(self):
+        if self.__pending is not None:
+            self.__pending.result()  # Raises exceptions of the background thread
+            self.__pending = None
+
+    def __write(self, df, is_first):
+        if not self.is_columnar():
+            df.to_csv(self.__output_file, mode='w' if is_first else 'a', header=is_first, index=False)
+            return
+        if self.__columnar_writer is None:
+            self.__schema = self.__build_schema(df)
+            if self.__suffix in PARQUET_SUFFIXES:
+                self.__columnar_writer = parquet.ParquetWriter(self.__output_file, self.__schema)
+            else:
+                # Dictionaries only grow between batches, so they can be written as deltas
+                self.__columnar_writer = pa.ipc.new_file(self.__output_file, self.__schema, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+        arrays = [self.__to_array(df[field.name], field) for field in self.__schema]
+        self.__columnar_writer.write_table(pa.Table.from_arrays(arrays, schema=self.__schema))
+
+    def __build_schema(self, df):
+        fields = []
+        for column in df.columns:
+            if column in self.__dictionary_columns:
+                fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+            elif df[column].dtype == object or is_categorical_dtype(df[column]):
+                fields.append(pa.field(column, pa.string()))  # Pretty values are strings, categorical only if they repeat within the batch
+            else:
+                fields.append(pa.field(column, pa.from_numpy_dtype(df[column].dtype)))
+        return pa.schema(fields)
+
+    def __to_array(self, series, field):
+        if not pa.types.is_dictionary(field.type):
+            if is_categorical_dtype(series):
+                series = series.astype(object)
+            return pa.array(series, type=field.type, from_pandas=True)
+
+        # Encode values using one dictionary per column, which is extended by values unseen in previous batches
+        dictionary = self.__dictionaries.setdefault(field.name, {})
+        codes, uniques = pd.factorize(series.astype(object))
+        unique_codes = np.array([dictionary.setdefault(value, len(dictionary)) for value in uniques] + [-1], dtype=np.int32)
+        indices = unique_codes[codes]  # Missing values have code -1 and therefore map to the last entry
+        return pa.DictionaryArray.from_arrays(pa.array(indices, mask=indices < 0), pa.array(list(dictionary), type=pa.string()))
@@ -3,6 +3,7 @@ import logging
 
 import datetime
 
+import numpy as np
 import pandas as pd
 from anytree import AnyNode
 from tqdm import tqdm
@@ -51,27 +52,20 @@ class PostProcessor():
 
         logger.info("Uncompressing dataframe on attribute %s", column_to_uncompress)
 
-        if column_to_uncompress:
-            uncompressed_df = pd.DataFrame(columns=df.columns)
-            for index in tqdm(range(len(df)), total=len(df), desc="Uncompressing"):
-                if isinstance(df.loc[index, column_to_uncompress], list):
-                    insensitive_attributes = self.__config.get_insensitive_attributes()
-                    textual_attributes = self.__config.get_textual_attributes()
-                    to_drop = textual_attributes + insensitive_attributes
-                    raw_row = df.drop(to_drop, axis=1).loc[index]
-                    for ii in range(len(df.loc[index, column_to_uncompress])):
-                        row = raw_row
-                        for insensitive_attribute in insensitive_attributes:
-                            value_to_append = df.loc[index, insensitive_attribute][ii]
-                            row = row.append(pd.Series([value_to_append], index=[insensitive_attribute]))
-
-                        for textual_attribute in textual_attributes:
-                            text_to_append = df.loc[index, textual_attribute][ii]
-                            row = row.append(pd.Series([text_to_append], index=[textual_attribute]))
-                        uncompressed_df = uncompressed_df.append(row, ignore_index=True)
-                else:
-                    data_row = df.loc[index]
-                    uncompressed_df = uncompressed_df.append(data_row, ignore_index=True)
+        if not column_to_uncompress:
+            return df
+
+        # Repeat each person as often as there are texts, broadcasting the generalized values of all other attributes
+        is_compressed = np.fromiter((isinstance(value, list) for value in df[column_to_uncompress]), dtype=bool, count=len(df))
+        repeats = np.array([len(value) if compressed else 1 for value, compressed in zip(df[column_to_uncompress], is_compressed)], dtype=np.int64)
+        uncompressed_df = df.iloc[np.repeat(np.arange(len(df)), repeats)].reset_index(drop=True)
+
+        # Explode textual and insensitive attributes, which contain one value per text for compressed persons
+        to_explode = [a for a in self.__config.get_insensitive_attributes() + self.__config.get_textual_attributes() if a in df.columns]
+        for attribute in to_explode:
+            values = pd.Series([value if compressed and isinstance(value, list) else [value] * repeat
+                                for value, compressed, repeat in zip(df[attribute], is_compressed, repeats)], dtype=object)
+            uncompressed_df[attribute] = values.explode().to_numpy()
         return uncompressed_df
 
     def pretty(self, df):
@@ -86,12 +80,109 @@ class PostProcessor():
         DataFrame
             Prettyfied DataFrame.
         """
-        pretty_df = pd.DataFrame(columns=df.columns)
         logger.info("Converting values in anonymized dataframe to their pretty versions")
-        for col in df.columns:
-            for index, value in tqdm(df[col].iteritems(), total=len(df), desc=col):
-                pretty_df.at[index, col] = convert_to_pretty(value, self.__config.get_default_date_format())
-        return pretty_df
+        pretty_columns = {}
+        for col in tqdm(df.columns, desc="Pretty"):
+            pretty_columns[col] = self.__convert_column_to_pretty(df[col])
+        return pd.DataFrame(pretty_columns, index=df.index, columns=df.columns)
+
+    def bounds(self, df):
+        """
+        Takes a dataframe and derives typed lower and upper bounds of the generalized values of numerical and date quasi-identifiers
+        Parameters
+        ----------
+        df: DateFrame
+            DataFrame with recoded values.
+        Returns
+        -------
+        DataFrame
+            DataFrame with a lower and an upper bound column per numerical and date quasi-identifier.
+        """
+        bounds_columns = {}
+        quasi_identifiers = self.__config.get_quasi_identifiers()
+        for attributes, get_bounds, dtype in [(self.__config.get_numerical_attributes(), get_numerical_bounds, "float64"),
+                                              (self.__config.get_date_attributes(), get_date_bounds, "datetime64[ns]")]:
+            for attribute in attributes:
+                if attribute not in quasi_identifiers or attribute not in df.columns:
+                    continue
+                bounds = self.__map_distinct_values(df[attribute], get_bounds)
+                bounds_columns[attribute + "_lower"] = pd.Series([bound[0] for bound in bounds], index=df.index, dtype=dtype)
+                bounds_columns[attribute + "_upper"] = pd.Series([bound[1] for bound in bounds], index=df.index, dtype=dtype)
+        return pd.DataFrame(bounds_columns, index=df.index)
+
+    def __convert_column_to_pretty(self, series):
+        """Converts each distinct value of a series once and returns a series with pretty strings, categorical if values repeat"""
+        date_format = self.__config.get_default_date_format()
+        pretty_values = self.__map_distinct_values(series, lambda value: convert_to_pretty(value, date_format))
+        pretty_series = pd.Series(pretty_values, index=series.index, dtype=object)
+        if pretty_series.nunique() <= len(pretty_series) / 2:
+            return pretty_series.astype("category")
+        return pretty_series
+
+    def __map_distinct_values(self, series, function):
+        """Applies a function once per distinct value of a series and returns an object array with the results for all values"""
+        if series.dtype != object:
+            codes, uniques = pd.factorize(series)
+            results = np.empty(len(uniques) + 1, dtype=object)
+            for position, value in enumerate(list(uniques) + [None]):
+                results[position] = function(value)  # Assign one by one, since results might be tuples
+            return results[codes]  # Missing values have code -1 and therefore map to the last entry
+        cache = {}  # Records within a partition share the same generalized objects, so keys are the object's value or identity
+        results = np.empty(len(series), dtype=object)
+        for position, value in enumerate(series):
+            key = (type(value), value) if getattr(value, "__hash__", None) is not None else id(value)
+            if key not in cache:
+                cache[key] = function(value)
+            results[position] = cache[key]
+        return results
+
+
+def get_numerical_bounds(value):
+    """
+        Takes a generalized numerical value and returns its lower and upper bound
+        Parameters
+        ----------
+        value: any
+            Single number, range, hierarchy node, or set of numbers.
+        Returns
+        -------
+        tuple
+            Lower and upper bound, both NaN for missing values.
+        """
+    if isinstance(value, AnyNode):
+        return get_numerical_bounds(value.range)
+    elif isinstance(value, range):
+        return value.start, value.stop - 1
+    elif isinstance(value, (set, frozenset)):
+        return min(value), max(value)
+    elif pd.isnull(value):
+        return np.nan, np.nan
+    else:
+        return value, value
+
+
+def get_date_bounds(value):
+    """
+        Takes a generalized date value and returns its first and last day
+        Parameters
+        ----------
+        value: any
+            Single date, period, or range of years.
+        Returns
+        -------
+        tuple
+            First and last day, both NaT for missing values.
+        """
+    if isinstance(value, range):
+        return pd.Timestamp(year=value.start, month=1, day=1), pd.Timestamp(year=value.stop - 1, month=12, day=31)
+    elif isinstance(value, pd.Period):
+        return value.start_time, value.end_time.normalize()
+    elif isinstance(value, (set, frozenset)):
+        return min(value), max(value)
+    elif pd.isnull(value):
+        return pd.NaT, pd.NaT
+    else:
+        return pd.Timestamp(value), pd.Timestamp(value)
 
 
 def convert_to_pretty(value, date_format="%Y-%m-%d"):
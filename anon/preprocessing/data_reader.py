@@ -1,7 +1,80 @@
 """This module includes code to read and format csv data accordingly to a config"""
+import io
+import logging
+from contextlib import nullcontext
+
 import pandas as pd
 
-from pandas.api.types import is_datetime64_any_dtype
+from pandas.api.types import is_categorical_dtype, is_datetime64_any_dtype, is_numeric_dtype, union_categoricals
+
+try:
+    import pyarrow.feather as feather
+    import pyarrow.parquet as parquet
+except ImportError:
+    feather = None
+    parquet = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNKSIZE = 100000
+PARQUET_SUFFIXES = [".parquet", ".pq"]
+FEATHER_SUFFIXES = [".feather", ".arrow"]
+ZSTD_SUFFIXES = [".zst", ".zstd"]
+
+
+def read_raw_chunks(input_file, columns=None, dtype=None, chunksize=DEFAULT_CHUNKSIZE, date_formats=None):
+    """
+    Reads an input file in chunks without any formatting. Supports CSV (optionally compressed using gzip, bz2, zip, xz, or zstd), Parquet, and Feather/Arrow files.
+    Parameters
+    ----------
+    input_file: (str, Path)
+        Input file path.
+    columns: list
+        Columns to read, matched case-insensitively. All columns are read if None (optional).
+    dtype: dict
+        Data types of columns to use while reading CSV files, keys matched case-insensitively (optional).
+    chunksize: int
+        Number of rows per chunk.
+    date_formats: dict
+        Formats of date columns to parse while reading CSV files, keys matched case-insensitively. Invalid dates become NaT (optional).
+    Returns
+    -------
+    generator
+        Generator yielding DataFrames with lower case columns and a continuous index.
+    """
+    suffix = __get_suffix(input_file)
+    if suffix in PARQUET_SUFFIXES + FEATHER_SUFFIXES:
+        yield from __read_columnar_chunks(input_file, suffix, columns, chunksize)
+        return
+
+    with __open_csv(input_file) as csv_file:
+        header = pd.read_csv(csv_file, nrows=0).columns
+    columns_by_name = {column.lower(): column for column in header}
+    usecols = None
+    if columns is not None:
+        usecols = [columns_by_name[column] for column in columns if column in columns_by_name]
+    dtype = {columns_by_name[column]: data_type for column, data_type in (dtype or {}).items() if column in columns_by_name}
+    date_formats = {columns_by_name[column]: date_format for column, date_format in (date_formats or {}).items() if column in columns_by_name}
+
+    # The parser only knows the values of a column, so columns sharing the most common format are parsed while reading and others right after
+    date_format = max(date_formats.values(), key=list(date_formats.values()).count, default=None)
+    parse_dates = [column for column in date_formats if date_formats[column] == date_format]
+    with __open_csv(input_file) as csv_file:
+        chunks = pd.read_csv(csv_file, usecols=usecols, dtype=dtype, chunksize=chunksize, parse_dates=parse_dates,
+                             date_parser=lambda values: pd.to_datetime(values, format=date_format, errors='coerce'))
+        if chunksize is None:
+            chunks = [chunks]
+        for chunk in chunks:
+            for column in date_formats:
+                if column not in parse_dates:
+                    chunk[column] = pd.to_datetime(chunk[column], format=date_formats[column], errors='coerce')
+            chunk.columns = map(str.lower, chunk.columns)
+            yield chunk
 
 
 class DataReader:
@@ -10,37 +83,136 @@ class DataReader:
     def __init__(self, config):
         self.__config = config
 
-    def read(self, input_file):
+    def read(self, input_file, chunksize=None):
         """
         Reading given input file and returning a dataframe
         Parameters
         ----------
         input_file: (str, Path)
             Input file path.
+        chunksize: int
+            Number of rows to read and format at once. The complete file is read at once if None (optional).
         Returns
         -------
         DataFrame
             Data read in DataFrame.
         """
+        df = self.__concat_chunks(list(self.read_chunks(input_file, chunksize)))
+        for attribute in self.__config.get_data_types():
+            if attribute in df.columns and is_categorical_dtype(df[attribute]):
+                df[attribute] = df[attribute].cat.remove_unused_categories()
+        return df
+
+    def read_chunks(self, input_file, chunksize=DEFAULT_CHUNKSIZE):
+        """
+        Reading given input file in chunks, only reading configured attributes using their data types
+        Parameters
+        ----------
+        input_file: (str, Path)
+            Input file path.
+        chunksize: int
+            Number of rows per chunk. The complete file is read at once if None.
+        Returns
+        -------
+        generator
+            Generator yielding formatted DataFrames. Categories of nominal attributes may differ between chunks.
+            Numerical attributes keep the type they have within the first chunk, which is integer if all of their values are integral.
+        """
+        attributes = list(self.__config.attributes.keys())
+        # Numerical attributes are read as floats, so that chunks with missing values are not read differently
+        reading_types = {attribute: "float64" for attribute in self.__config.get_numerical_attributes()}
+        reading_types.update(self.__config.get_data_types())
+        numerical_types = {}
+        for chunk in read_raw_chunks(input_file, attributes, reading_types, chunksize, self.__config.get_date_formats()):
+            yield self.__format(chunk, numerical_types)
+
+    def __format(self, df, numerical_types):
         date_attributes = self.__config.get_date_attributes()
         date_formats = self.__config.get_date_formats()
         textual_attributes = self.__config.get_textual_attributes()
-        data_types = self.__config.get_data_types()
+        data_types = {attribute: data_type for attribute, data_type in self.__config.get_data_types().items() if attribute in df.columns}
         ordinal_orders = self.__config.get_ordinal_orders()
 
-        df = pd.read_csv(input_file)
-        df.columns = map(str.lower, df.columns)
-        df = df.dropna(subset=df.columns.difference(textual_attributes), axis='index', how='any')  # drop any rows with empty values except for the textual ones
-
         for date_attribute in date_attributes:
             if not is_datetime64_any_dtype(df[date_attribute]):
                 df[date_attribute] = pd.to_datetime(df[date_attribute], format=date_formats[date_attribute], errors='coerce')
-            df = df.dropna(subset=[date_attribute])  # drop rows if there are empty timestamps
 
-        df = df.dropna(subset=df.columns.difference(textual_attributes), axis='index', how='any')  # drop any rows with empty values except for the textual ones
+        df = df.dropna(subset=df.columns.difference(textual_attributes), axis='index', how='any')  # drop any rows with empty values or timestamps except for the textual ones
 
+        for attribute in self.__config.get_numerical_attributes():
+            if attribute not in df.columns or not is_numeric_dtype(df[attribute]) or len(df) == 0:
+                continue
+            is_integral = bool((df[attribute] % 1 == 0).all())
+            numerical_type = numerical_types.setdefault(attribute, "int64" if is_integral else "float64")
+            if numerical_type == "int64" and not is_integral:
+                raise Exception("Numerical attribute {} contains fractional values, but only integers within the first chunk, read the file at once".format(attribute))
+            data_types[attribute] = numerical_type
         df = df.astype(data_types)
+        for attribute, data_type in data_types.items():
+            if data_type == 'category':
+                df[attribute] = self.__infer_categories(df[attribute])
 
         for ordinal_attribute in ordinal_orders:
-            df[ordinal_attribute].cat.reorder_categories(ordinal_orders[ordinal_attribute], ordered=True, inplace=True)
+            unknown_values = set(df[ordinal_attribute].cat.categories).difference(ordinal_orders[ordinal_attribute])
+            if len(unknown_values) > 0:
+                raise Exception("Values {} of ordinal attribute {} are not part of its order".format(unknown_values, ordinal_attribute))
+            df[ordinal_attribute] = df[ordinal_attribute].cat.set_categories(ordinal_orders[ordinal_attribute], ordered=True)
         return df
+
+    def __infer_categories(self, series):
+        # CSV categories are read as strings, use numbers if all of them are numeric like pandas would infer
+        categories = series.cat.categories
+        if categories.dtype != object:
+            return series
+        try:
+            numeric_categories = pd.to_numeric(categories)
+        except (ValueError, TypeError):
+            return series
+        series = series.cat.rename_categories(numeric_categories)
+        return series.cat.reorder_categories(numeric_categories.sort_values())
+
+    def __concat_chunks(self, chunks):
+        if len(chunks) == 1:
+            return chunks[0]
+        ordinal_attributes = self.__config.get_ordinal_orders().keys()
+        for attribute in chunks[0].columns:
+            if is_categorical_dtype(chunks[0][attribute]) and attribute not in ordinal_attributes:
+                categories = union_categoricals([chunk[attribute] for chunk in chunks], sort_categories=True).categories
+                for chunk in chunks:
+                    chunk[attribute] = chunk[attribute].cat.set_categories(categories)
+        return pd.concat(chunks)
+
+
+def __get_suffix(input_file):
+    return "." + str(input_file).lower().rsplit(".", 1)[-1]
+
+
+def __open_csv(input_file):
+    if __get_suffix(input_file) in ZSTD_SUFFIXES:
+        if zstandard is None:
+            raise Exception("Reading zstd compressed files requires the zstandard package")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(input_file, 'rb'), closefd=True), encoding='utf-8')
+    return nullcontext(input_file)  # pandas infers other compressions from the file name
+
+
+def __read_columnar_chunks(input_file, suffix, columns, chunksize):
+    if parquet is None:
+        raise Exception("Reading Parquet and Feather files requires the pyarrow package")
+    if suffix in PARQUET_SUFFIXES:
+        names = parquet.read_schema(input_file).names
+    else:
+        names = feather.read_table(input_file, memory_map=True).schema.names
+    if columns is not None:
+        names = [name for name in names if name.lower() in columns]
+
+    if suffix in PARQUET_SUFFIXES:
+        batches = parquet.ParquetFile(input_file).iter_batches(batch_size=chunksize or DEFAULT_CHUNKSIZE, columns=names)
+    else:
+        batches = feather.read_table(input_file, columns=names, memory_map=True).to_batches(chunksize)
+    offset = 0
+    for batch in batches:
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        chunk.columns = map(str.lower, chunk.columns)
+        offset += len(chunk)
+        yield chunk
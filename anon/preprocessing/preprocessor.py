@@ -2,11 +2,14 @@
 import logging
 
 from datetime import datetime
+from itertools import chain
+
+import numpy as np
+import pandas as pd
 
 from nlp.similarity_module import compare_datetime, compare_using_equality
-from tqdm import tqdm
 
-from preprocessing.text_cleaning import remove_html_tags, remove_non_printable_characters, remove_unnecessary_spaces
+from preprocessing.text_cleaning import clean_texts
 
 logger = logging.getLogger(__name__)
 
@@ -35,16 +38,38 @@ class Preprocessor:
             else:
                 self.__relational_attributes.append(attribute)
 
+    def preprocess(self, instrumentation):
+        """
+        Runs through data cleansing, analysis of textual attributes, resolving of redundant information, and compression, measuring each of them as a stage
+        Parameters
+        ----------
+        instrumentation: Instrumentation
+            Instrumentation to record time, memory, and counters of the stages.
+        """
+        with instrumentation.stage("cleaning"):
+            self.clean_textual_attributes()
+        with instrumentation.stage("ner") as stage:
+            self.analyze_textual_attributes()
+        ner_statistics = self.__ner.get_statistics()  # Statistics are accumulated over all preprocessors sharing the recognizer
+        for counter, value in ner_statistics.items():
+            instrumentation.set_counter(stage, counter, value)
+        if ner_statistics["texts"] > 0:
+            instrumentation.set_counter(stage, "cache_hit_rate", ner_statistics["cached_texts"] / ner_statistics["texts"])
+            instrumentation.set_counter(stage, "docs_per_second", ner_statistics["texts"] / max(instrumentation.get_wall_time(stage), 1e-9))
+        with instrumentation.stage("redundancy") as stage:
+            self.find_redundant_information()
+        instrumentation.set_counter(stage, "redundant_entity_attributes", len(self.__redundant_entity_attributes))
+        with instrumentation.stage("compression") as stage:
+            self.compress()
+        instrumentation.count(stage, "records", len(self.__df))
+
     def clean_textual_attributes(self):
         """
         Removes unprintable characters, HTML characters and unnecessary spaces from texts
         """
         for attribute in self.__textual_attributes:
-            for index, text in self.__df[attribute].dropna().iteritems():
-                text = remove_non_printable_characters(text)
-                text = remove_html_tags(text)
-                text = remove_unnecessary_spaces(text)
-                self.__df.at[index, attribute] = text
+            texts = self.__df[attribute].dropna()
+            self.__df.loc[texts.index, attribute] = clean_texts(texts.tolist(), self.__config.get_processes())
 
     def analyze_textual_attributes(self):
         """
@@ -62,21 +87,48 @@ class Preprocessor:
             texts_to_analyze.setdefault(record_id, []).append((text, index))
 
         entities_per_record = self.__ner.recognize(textual_attribute, texts_to_analyze)
-        logger.info("Converting results of analysis for further processing")
-        for entity_type in self.__entities_to_consider():
-            entities_found = []
-            for index in tqdm(self.__df[textual_attribute].index, desc=entity_type):
-                if index in entities_per_record:
-                    entities = entities_per_record[index]
-                    if entity_type in entities:
-                        entities_found.append(list(entities[entity_type]))
-                    else:
-                        entities_found.append(None)
-                else:
-                    entities_found.append(None)
+        logger.info("Converting results of analysis for further processing and looking for redundant information")
+        entities_to_consider = self.__entities_to_consider()
+        mapping = self.__config.get_attribute_entities_mapping()
+        for entity_type in mapping:
+            if entity_type not in entities_to_consider:
+                logger.warning("Skipping entities of type %s for attribute %s since no entities exist.", entity_type, textual_attribute)
+        mapping = {entity_type: attributes for entity_type, attributes in mapping.items() if entity_type in entities_to_consider}
+        relational_values = {attribute: self.__df[attribute].tolist() for attributes in mapping.values() for attribute in attributes}
+        relational_tokens = {}  # Cache analyzed relational values, since they repeat over records and entity types
+
+        # Split the sensitive terms of each record into non-redundant and redundant ones, checking them against the relational values of the record once
+        positions = {index: position for position, index in enumerate(self.__df.index)}
+        entities_found = {entity_type: [None] * len(positions) for entity_type in entities_to_consider}
+        redundant_entities_found = {entity_type: [None] * len(positions) for entity_type in mapping}
+        for index, entities in entities_per_record.items():
+            if index not in positions:
+                continue
+            position = positions[index]
+            for entity_type, sensitive_terms in entities.items():
+                if entity_type not in entities_found:
+                    continue
+                sensitive_terms = list(sensitive_terms)
+                entities_found[entity_type][position] = sensitive_terms
+                if entity_type not in mapping or not sensitive_terms:
+                    continue
+                relational_values_of_record = [(attribute, relational_values[attribute][position]) for attribute in mapping[entity_type]]
+                redundant_information = self.__get_redundant_information(sensitive_terms, relational_values_of_record, relational_tokens)
+                if len(redundant_information) > 0:
+                    redundant_entities_found[entity_type][position] = list(redundant_information)
+                    redundant_entities = set([e[0] for e in redundant_information])
+                    remaining_values = list(set(sensitive_terms).difference(redundant_entities))  # Removing redundant terms from non redundant attribute
+                    entities_found[entity_type][position] = remaining_values if len(remaining_values) > 0 else None  # Set to None if all sensitive terms are redundant
+
+        for entity_type in entities_to_consider:
             non_redundant_attribute_name = self.__build_non_redundant_attribute_name(textual_attribute, entity_type)
-            self.__df[non_redundant_attribute_name] = entities_found
+            self.__df[non_redundant_attribute_name] = entities_found[entity_type]
             self.__non_redundant_entity_attributes.append(non_redundant_attribute_name)
+        for entity_type, redundant_values in redundant_entities_found.items():
+            if any(value is not None for value in redundant_values):  # Create this series and extend dataframe
+                redundant_attribute_name = self.__build_redundant_attribute_name(textual_attribute, entity_type)
+                self.__df[redundant_attribute_name] = redundant_values
+                self.__redundant_entity_attributes.append(redundant_attribute_name)
 
     def get_non_redundant_entity_attributes(self):
         """
@@ -109,21 +161,40 @@ class Preprocessor:
 
     def find_redundant_information(self):
         """
-        Resolves redundant information.
+        Drops entity attributes left empty after redundant information has been resolved while analyzing textual attributes.
         """
-        for attribute in self.__textual_attributes:
-            self.__find_redundant_information(attribute)
+        self.__drop_empty_series()
+
+        for redundant_entity_attribute in self.__redundant_entity_attributes:
+            series = self.__df[redundant_entity_attribute].dropna()
+            total = len(series.tolist())
+            logger.info("Found redundant sensitive terms in %d records for attribute %s", total, redundant_entity_attribute)
 
     def compress(self):
         """
         Creates a person centric view of the dataset by grouping and aggregating based on the first direct identifier.
         """
-        aggregation_functions = {}
+        key_attribute = self.__config.get_key_attribute()
+        group_ids, _ = pd.factorize(self.__df[key_attribute], sort=True)
+
+        # Sort positions by group once, so that each group becomes a contiguous slice keeping the original order within the group
+        order = np.argsort(group_ids, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(group_ids[order]) != 0])
+        ends = np.r_[starts[1:], len(order)]
+
+        # Values of constant attributes are the first values per group, only attributes with multiple values per group need to be gathered
+        compressed_df = self.__df.iloc[order[starts]].reset_index(drop=True)
+        entity_attributes = set(self.__non_redundant_entity_attributes).union(self.__redundant_entity_attributes)
+        other_attributes = [attribute for attribute in self.__df.columns if attribute not in entity_attributes]
+        n_unique = self.__df[other_attributes].groupby(group_ids).nunique()
+
         for attribute in self.__df.columns:
-            aggregation_functions[attribute] = self.__aggregate
-        grouped_df = self.__df.groupby(by=[self.__config.get_key_attribute()], as_index=False)
-        self.__df = grouped_df.agg(aggregation_functions)
-        self.__df = self.__df.astype(self.__config.get_data_types())
+            if attribute in entity_attributes:
+                compressed_df[attribute] = self.__merge_entities(self.__df[attribute].to_numpy()[order], starts, ends)
+            elif (n_unique[attribute].to_numpy() > 1).any():
+                compressed_df[attribute] = self.__pack_values(attribute, self.__df[attribute].array[order], starts, ends, n_unique[attribute].to_numpy() > 1)
+
+        self.__df = compressed_df.astype(self.__config.get_data_types())
 
     def get_sensitive_terms(self):
         """
@@ -178,74 +249,35 @@ class Preprocessor:
             textual_attributes_mapping[textual_attribute] = [attribute for attribute in self.__non_redundant_entity_attributes if textual_attribute in attribute]
         return textual_attributes_mapping
 
-    def __find_redundant_information(self, textual_attribute):
-        logger.info("Looking for redundant information for attribute %s", textual_attribute)
-        mapping = self.__config.get_attribute_entities_mapping()
-        for entity_type in mapping:
-            redundant_values = []
-            redundant_found = False
-            non_redundant_attribute_name = self.__build_non_redundant_attribute_name(textual_attribute, entity_type)
-            if non_redundant_attribute_name not in self.__df.columns:
-                logger.warning("Skipping entities of type %s for attribute %s since no entities exist.", entity_type, textual_attribute)
-                continue
-
-            for record_id in tqdm(self.__df.index, desc=entity_type):
-                entities_of_record = self.__df.at[record_id, non_redundant_attribute_name]
-                if entities_of_record:
-                    redundant_information = self.__get_redundant_information(record_id, entities_of_record, mapping[entity_type])
-                    if len(redundant_information) > 0:
-                        redundant_found = True
-                        redundant_values.append(list(redundant_information))
-                        redundant_entities = set([e[0] for e in redundant_information])
-                        non_redundant_values = list(set(self.__df.at[record_id, non_redundant_attribute_name]).difference(redundant_entities))  # Removing redundant terms from non redundant attribute
-                        if len(non_redundant_values) == 0:
-                            self.__df.at[record_id, non_redundant_attribute_name] = None  # Set to None if all sensitive terms are redundant
-                        else:
-                            self.__df.at[record_id, non_redundant_attribute_name] = non_redundant_values
-                    else:
-                        redundant_values.append(None)
-                else:
-                    redundant_values.append(None)
-
-            if redundant_found:  # Create this series and extend dataframe
-                redundant_attribute_name = self.__build_redundant_attribute_name(textual_attribute, entity_type)
-                self.__redundant_entity_attributes.append(redundant_attribute_name)
-                self.__df[redundant_attribute_name] = redundant_values
-
-        self.__drop_empty_series()
-
-        for redundant_entity_attribute in self.__redundant_entity_attributes:
-            series = self.__df[redundant_entity_attribute].dropna()
-            total = len(series.tolist())
-            logger.info("Found redundant sensitive terms in %d records for attribute %s", total, redundant_entity_attribute)
-
-    def __aggregate(self, series):
-        """Used to aggregate data of a dataset, without losing any information."""
-        if series.name in self.__non_redundant_entity_attributes or series.name in self.__redundant_entity_attributes:  # Textual entities
-            merged_sensitive_terms = list()
-            for sensitive_terms in series.dropna():
-                merged_sensitive_terms = merged_sensitive_terms + sensitive_terms
-            return merged_sensitive_terms if len(merged_sensitive_terms) > 0 else None  # Return merged result, or None
-        else:
-            if series.nunique() > 1:  # Since there are more values, pack them into a list / frozenset
-                if series.name in self.__textual_attributes or series.name in self.__config.get_insensitive_attributes():
-                    return list(series.array)
-                else:
-                    return frozenset(series.array)
-            else:
-                return series.unique()[0]  # Else return just this single value
-
-    def __get_redundant_information(self, record_id, textual_values, relational_attributes):
+    def __merge_entities(self, values, starts, ends):
+        """Concatenates all lists of sensitive terms per group, None if a group has no sensitive terms."""
+        merged_values = np.empty(len(starts), dtype=object)
+        for group, (start, end) in enumerate(zip(starts, ends)):
+            merged_sensitive_terms = list(chain.from_iterable(sensitive_terms for sensitive_terms in values[start:end] if isinstance(sensitive_terms, list)))
+            merged_values[group] = merged_sensitive_terms if len(merged_sensitive_terms) > 0 else None
+        return merged_values
+
+    def __pack_values(self, attribute, values, starts, ends, has_multiple_values):
+        """Packs values of groups with multiple values into a list / frozenset, without losing any information."""
+        values = np.asarray(values, dtype=object)
+        packed_values = values[starts]
+        pack = list if attribute in self.__textual_attributes or attribute in self.__config.get_insensitive_attributes() else frozenset
+        for group in np.flatnonzero(has_multiple_values):
+            packed_values[group] = pack(values[starts[group]:ends[group]])
+        return packed_values
+
+    def __get_redundant_information(self, textual_values, relational_values, relational_tokens):
         redundant_information = set()
-        for attribute, relational_value in self.__df[relational_attributes].loc[record_id].iteritems():
+        for attribute, relational_value in relational_values:
             for textual_value in textual_values:
                 if isinstance(relational_value, datetime):
                     result = compare_datetime(relational_value, textual_value)
                     right_matching_token = textual_value
                 else:
-                    nlp = self.__ner.get_nlp()
-                    relational_token = nlp(str(relational_value))
-                    result, _, right_matching_token = compare_using_equality(relational_token, textual_value)
+                    relational_text = str(relational_value)
+                    if relational_text not in relational_tokens:
+                        relational_tokens[relational_text] = self.__ner.get_nlp()(relational_text)
+                    result, _, right_matching_token = compare_using_equality(relational_tokens[relational_text], textual_value)
                 if result:
                     redundant_information.add((textual_value, right_matching_token, attribute))
         return redundant_information
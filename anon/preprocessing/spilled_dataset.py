@@ -0,0 +1,490 @@
+"""This module contains code to spill a preprocessed dataset to disk and to read it in parts"""
+import logging
+import math
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from spacy.tokens import DocBin, Span, Token
+
+from kernel.partitioning import route
+from kernel.util import get_term_text
+from postprocessing.output_writer import batch_partitions
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as parquet
+    TERMS_TYPE = pa.list_(pa.struct([("text", pa.string()), ("label", pa.string()), ("doc", pa.int32()), ("start", pa.int32()), ("end", pa.int32()),
+                                     ("token", pa.int32()), ("attribute", pa.string())]))
+except ImportError:
+    pa = None
+    parquet = None
+
+logger = logging.getLogger(__name__)
+
+MEMORY_FACTOR = 10  # Rough ratio between the memory required to preprocess records and their size within the input file
+PIECE_FILE = "piece.parquet"
+DOCS_FILE = "docs.spacy"
+INDEX_COLUMN = "index"
+MULTIPLE_SUFFIX = "_multiple"
+
+
+def get_number_of_buckets(input_file, memory_budget):
+    """
+    Estimates the number of buckets required to preprocess an input file within a memory budget
+    Parameters
+    ----------
+    input_file: (str, Path)
+        Input file path.
+    memory_budget: int
+        Memory budget in megabytes.
+    Returns
+    -------
+    int
+        Number of buckets.
+    """
+    return max(1, math.ceil(os.path.getsize(input_file) * MEMORY_FACTOR / (memory_budget * 1024 * 1024)))
+
+
+class SpilledDataset:
+    """
+    Dataset which is distributed into buckets of keys, preprocessed bucket by bucket, and spilled to disk as Parquet files, so that single columns can be read.
+    Since spans cannot be pickled, entity attributes are spilled referencing their terms by offsets within docs, which are spilled once per piece.
+    Columns mixing single and multiple values are spilled as lists together with a flag telling both apart.
+    It provides the same information on entity attributes and sensitive terms as the preprocessor.
+    """
+
+    def __init__(self, config, directory):
+        if parquet is None:
+            raise Exception("Spilling datasets requires the pyarrow package")
+        self.__config = config
+        self.__directory = Path(directory)
+        if self.__directory.exists():
+            shutil.rmtree(self.__directory)
+        self.__directory.mkdir(parents=True)
+
+        self.__pieces = {}
+        self.__n_buckets = 0
+        self.__n_records = 0
+        self.__dtypes = {}
+        self.__non_redundant_entity_attributes = []
+        self.__redundant_entity_attributes = []
+        self.__sensitive_terms = {}
+        self.__vocab = None
+
+    def distribute(self, chunks, n_buckets):
+        """
+        Distributes records into buckets by hashing the key attribute, so that all records of a key end up in the same bucket
+        Parameters
+        ----------
+        chunks: iterable
+            Iterable of DataFrames as read by the data reader.
+        n_buckets: int
+            Number of buckets.
+        """
+        key_attribute = self.__config.get_key_attribute()
+        self.__n_buckets = n_buckets
+        for chunk in chunks:
+            bucket_ids = pd.util.hash_pandas_object(chunk[key_attribute].astype(str), index=False) % n_buckets
+            for bucket, bucket_chunk in chunk.groupby(bucket_ids.to_numpy()):
+                self.__append(self.__get_raw_name(bucket), bucket_chunk)
+
+    def get_buckets(self):
+        """
+        Returns all buckets containing records
+        Returns
+        -------
+        list
+            List of buckets.
+        """
+        return [bucket for bucket in range(self.__n_buckets) if self.__get_raw_name(bucket) in self.__pieces]
+
+    def read_raw_bucket(self, bucket):
+        """
+        Reads all records of a bucket as they have been read from the input file
+        Parameters
+        ----------
+        bucket: int
+            Bucket to read.
+        Returns
+        -------
+        DataFrame
+            DataFrame with records of the bucket.
+        """
+        df = self.__read(self.__get_raw_name(bucket))
+        data_types = {attribute: data_type for attribute, data_type in self.__config.get_data_types().items() if attribute in df.columns}
+        return df.astype(data_types)  # Categories may differ between chunks
+
+    def add_preprocessed_bucket(self, bucket, pp):
+        """
+        Takes a preprocessor which has compressed a bucket, assigns unique record ids over all buckets, and spills the compressed records to disk
+        Parameters
+        ----------
+        bucket: int
+            Bucket which has been preprocessed.
+        pp: Preprocessor
+            Preprocessor which has been run on the records of the bucket.
+        """
+        df = pp.get_df()
+        df.index = pd.RangeIndex(self.__n_records, self.__n_records + len(df))  # Changes the index within the preprocessor as well
+        self.__n_records += len(df)
+
+        for attribute in sorted(pp.get_non_redundant_entity_attributes()):
+            if attribute not in self.__non_redundant_entity_attributes:
+                self.__non_redundant_entity_attributes.append(attribute)
+        for attribute in sorted(pp.get_redundant_entity_attributes()):
+            if attribute not in self.__redundant_entity_attributes:
+                self.__redundant_entity_attributes.append(attribute)
+        for attribute, sensitive_terms in pp.get_sensitive_terms().items():
+            for sensitive_term, record_ids in sensitive_terms.items():
+                self.__sensitive_terms.setdefault(attribute, {}).setdefault(sensitive_term, set()).update(record_ids)
+        for attribute in df.columns:
+            if attribute in self.__dtypes and self.__dtypes[attribute] != df[attribute].dtype:
+                self.__dtypes[attribute] = np.dtype(object)  # Attribute contains multiple values in some buckets only
+            else:
+                self.__dtypes[attribute] = df[attribute].dtype
+
+        self.__append(self.__get_preprocessed_name(bucket), df)
+        self.__remove(self.__get_raw_name(bucket))
+
+    def get_number_of_records(self):
+        """
+        Returns the number of preprocessed records
+        Returns
+        -------
+        int
+            Number of records.
+        """
+        return self.__n_records
+
+    def sample_encoded(self, attributes, n_records, random_state=0):
+        """
+        Draws a sample of preprocessed records reading one bucket at a time, encoding sensitive terms by their lower case texts
+        Parameters
+        ----------
+        attributes: list
+            Attributes to read.
+        n_records: int
+            Number of records to sample.
+        random_state: int
+            Seed for the random number generator (optional).
+        Returns
+        -------
+        DataFrame
+            DataFrame with the given attributes of the sampled records.
+        """
+        fraction = min(1.0, n_records / self.__n_records)
+        dfs = [self.__read_encoded(name, attributes).sample(frac=fraction, random_state=random_state) for name in self.__get_preprocessed_names()]
+        return self.__format(pd.concat(dfs).sort_index())
+
+    def route_encoded(self, split_tree, attributes):
+        """
+        Routes all preprocessed records through a split tree one bucket at a time and spills the given attributes of each leaf together
+        Parameters
+        ----------
+        split_tree: dict
+            Split tree as filled by Mondrian, see route.
+        attributes: list
+            Attributes to spill per leaf, which need to contain all attributes split on.
+        Returns
+        -------
+        list
+            List with the leaves containing records.
+        """
+        leaves = set()
+        for name in self.__get_preprocessed_names():
+            df = self.__read_encoded(name, attributes)
+            for leaf, indexes in route(split_tree, df).items():
+                if len(indexes) > 0:
+                    self.__append(self.__get_leaf_name(leaf), df.loc[indexes])
+                    leaves.add(leaf)
+        return sorted(leaves)
+
+    def read_encoded_leaf(self, leaf):
+        """
+        Reads the records routed into a leaf by route_encoded and removes them from disk
+        Parameters
+        ----------
+        leaf: int
+            Leaf to read.
+        Returns
+        -------
+        DataFrame
+            DataFrame with the routed attributes of the records within the leaf.
+        """
+        df = self.__read(self.__get_leaf_name(leaf))
+        self.__remove(self.__get_leaf_name(leaf))
+        return self.__format(df.sort_index())
+
+    def shuffle_into_batches(self, partitions, max_records):
+        """
+        Groups partitions into batches and moves the records of each batch together on disk, so that batches can be read one after another
+        Parameters
+        ----------
+        partitions: list
+            List of partitions containing record ids.
+        max_records: int
+            Maximal number of records per batch, unless a single partition is larger.
+        Returns
+        -------
+        list
+            List of batches, each containing a list of partitions.
+        """
+        batches = batch_partitions(partitions, max_records)
+        batch_of_record = np.empty(self.__n_records, dtype=np.int64)
+        for batch, partitions_of_batch in enumerate(batches):
+            for partition in partitions_of_batch:
+                batch_of_record[np.asarray(partition)] = batch
+
+        for name in self.__get_preprocessed_names():
+            df = self.__read(name)
+            for batch, batch_df in df.groupby(batch_of_record[df.index.to_numpy()]):
+                self.__append(self.__get_batch_name(batch), batch_df)
+            self.__remove(name)
+        logger.info("Grouped %d partitions into %d batches", len(partitions), len(batches))
+        return batches
+
+    def read_batch(self, batch):
+        """
+        Reads all records of a batch
+        Parameters
+        ----------
+        batch: int
+            Batch to read.
+        Returns
+        -------
+        DataFrame
+            DataFrame with records of the batch, containing all entity attributes even if they do not exist within the batch.
+        """
+        df = self.__read(self.__get_batch_name(batch))
+        for attribute in self.__non_redundant_entity_attributes + self.__redundant_entity_attributes:
+            if attribute not in df.columns:
+                df[attribute] = None
+        return self.__format(df.sort_index())
+
+    def remove(self):
+        """
+        Removes all data spilled to disk.
+        """
+        shutil.rmtree(self.__directory)
+        self.__pieces = {}
+
+    def get_non_redundant_entity_attributes(self):
+        """
+        Returns non-redundant entity columns over all buckets.
+        Returns
+        -------
+        list
+            List containing non-redundant entity columns.
+        """
+        return self.__non_redundant_entity_attributes
+
+    def get_redundant_entity_attributes(self):
+        """
+        Returns redundant entity columns over all buckets.
+        Returns
+        -------
+        list
+            List containing redundant entity columns.
+        """
+        return self.__redundant_entity_attributes
+
+    def get_sensitive_terms(self):
+        """
+        Builds a dictionary containing terms and their appearances over all buckets, categorized by entity type
+        Returns
+        -------
+        dict
+            Dictionary containing terms and their appearances, categorized by entity type.
+        """
+        # Sort sensitive terms dict alphabetically and ascending by number of terms per entity type like the preprocessor
+        sensitive_terms_dict = {el[0]: el[1] for el in sorted(self.__sensitive_terms.items(), key=lambda x: x)}
+        return {el[0]: el[1] for el in sorted(sensitive_terms_dict.items(), key=lambda x: len(x[1]))}
+
+    def get_textual_attribute_mapping(self):
+        """
+        Returns a dictionary with the original textual attribute as key and the new temporary non redundant entity attributes as values.
+        Returns
+        -------
+        dict
+            Dictionary with textual attributes and non-redundant entity attributes as values.
+        """
+        textual_attributes_mapping = {}
+        for textual_attribute in self.__config.get_textual_attributes():
+            textual_attributes_mapping[textual_attribute] = [attribute for attribute in self.__non_redundant_entity_attributes if textual_attribute in attribute]
+        return textual_attributes_mapping
+
+    def __format(self, df):
+        data_types = self.__config.get_data_types()
+        for attribute in df.columns:
+            if data_types.get(attribute) == 'category':
+                df[attribute] = df[attribute].astype('category')
+            elif attribute in self.__dtypes and self.__dtypes[attribute] == object:
+                df[attribute] = df[attribute].astype(object)
+        return df
+
+    def __read_encoded(self, name, attributes):
+        df = self.__read(name, attributes, encoded=True)
+        for attribute in df.columns:
+            if attribute in self.__non_redundant_entity_attributes:
+                df[attribute] = [[get_term_text(term) for term in terms] if isinstance(terms, list) else None for terms in df[attribute]]
+        return df
+
+    def __append(self, name, df):
+        path = self.__directory / name / str(len(self.__pieces.get(name, [])))
+        path.mkdir(parents=True)
+        docs = {}
+        arrays = {INDEX_COLUMN: pa.array(df.index.to_numpy())}
+        encodings = {}
+        for position, column in enumerate(df.columns):
+            if self.__contains_spans(df[column]):
+                arrays[str(position)] = self.__encode_terms(df[column], docs)
+                encodings[column] = ("terms", None)
+                continue
+            try:
+                container = self.__get_container(df[column])
+                if container is None:
+                    arrays[str(position)] = pa.array(df[column], from_pandas=True)
+                else:
+                    arrays[str(position)] = pa.array([list(value) if isinstance(value, container) else None if value is None or value is pd.NaT else [value]
+                                                      for value in df[column]], from_pandas=True)
+                    arrays[str(position) + MULTIPLE_SUFFIX] = pa.array([isinstance(value, container) for value in df[column]])
+                encodings[column] = ("multiple" if container is not None else "plain", container)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                with open(path / "{}.pkl".format(position), 'wb') as f:  # Values pyarrow cannot represent, like mixed types
+                    pickle.dump(df[column].array, f, protocol=pickle.HIGHEST_PROTOCOL)
+                encodings[column] = ("pickle", None)
+        parquet.write_table(pa.table(arrays), path / PIECE_FILE)
+        if len(docs) > 0:
+            DocBin(docs=[doc for _, doc in docs.values()]).to_disk(path / DOCS_FILE)
+        self.__pieces.setdefault(name, []).append((path, list(df.columns), encodings))
+
+    def __read(self, name, columns=None, encoded=False):
+        pieces = self.__pieces[name]
+        if columns is None:
+            columns = []
+            for _, piece_columns, _ in pieces:
+                columns += [column for column in piece_columns if column not in columns]
+
+        dfs = []
+        for path, piece_columns, encodings in pieces:
+            parquet_columns = [INDEX_COLUMN]
+            for column in columns:
+                if column in piece_columns and encodings[column][0] != "pickle":
+                    parquet_columns.append(str(piece_columns.index(column)))
+                    if encodings[column][0] == "multiple":
+                        parquet_columns.append(str(piece_columns.index(column)) + MULTIPLE_SUFFIX)
+            table = parquet.read_table(path / PIECE_FILE, columns=parquet_columns)
+            index = pd.Index(table.column(INDEX_COLUMN).to_numpy())
+            data = {}
+            docs = None
+            for column in columns:
+                if column not in piece_columns:
+                    data[column] = pd.Series([None] * len(index), index=index, dtype=object)  # Entity attributes might not exist in all buckets
+                    continue
+                position = str(piece_columns.index(column))
+                encoding, container = encodings[column]
+                if encoding == "terms":
+                    if not encoded and docs is None:
+                        docs = list(DocBin().from_disk(path / DOCS_FILE).get_docs(self.__vocab))
+                    data[column] = pd.Series(self.__decode_terms(table.column(position).to_pylist(), docs, encoded), index=index, dtype=object)
+                elif encoding == "multiple":
+                    values = self.__to_pylist(table.column(position))
+                    is_multiple = table.column(position + MULTIPLE_SUFFIX).to_pylist()
+                    data[column] = pd.Series([container(value) if multiple else None if value is None else value[0] for value, multiple in zip(values, is_multiple)],
+                                             index=index, dtype=object)
+                elif encoding == "plain":
+                    array = table.column(position)
+                    if pa.types.is_list(array.type):
+                        data[column] = pd.Series(self.__to_pylist(array), index=index, dtype=object)
+                    else:
+                        data[column] = pd.Series(array.to_pandas().array, index=index)
+                else:
+                    with open(path / "{}.pkl".format(position), 'rb') as f:
+                        data[column] = pd.Series(pickle.load(f), index=index)
+            dfs.append(pd.DataFrame(data, index=index, columns=columns))
+        return pd.concat(dfs)
+
+    def __get_container(self, series):
+        """Returns the type of multiple values if the series contains lists or sets, which need to be told apart from single values"""
+        if series.dtype != object:
+            return None
+        containers = {type(value) for value in series if isinstance(value, (list, set, frozenset))}
+        if len(containers) > 1:
+            raise pa.ArrowInvalid("Column contains different types of multiple values")
+        return containers.pop() if containers else None
+
+    def __to_pylist(self, array):
+        """Converts a list array to lists of Python values, restoring timestamps as pandas timestamps"""
+        values = array.to_pylist()
+        if pa.types.is_timestamp(array.type.value_type):
+            return [None if value is None else [pd.Timestamp(v) if v is not None else None for v in value] for value in values]
+        return values
+
+    def __contains_spans(self, series):
+        if series.dtype != object:
+            return False
+        for terms in series:
+            if isinstance(terms, list) and len(terms) > 0:
+                term = terms[0][0] if isinstance(terms[0], tuple) else terms[0]  # Redundant terms are tuples of term, matching token, and attribute
+                return isinstance(term, Span)
+        return False
+
+    def __encode_terms(self, series, docs):
+        """Encodes lists of spans or redundant terms by their texts, labels, and offsets within docs, collecting the docs by their identity"""
+        encoded_values = []
+        for terms in series:
+            if not isinstance(terms, list):
+                encoded_values.append(None)
+                continue
+            encoded_terms = []
+            for term in terms:
+                span, token, attribute = term if isinstance(term, tuple) else (term, None, None)
+                self.__vocab = span.doc.vocab
+                doc_position, _ = docs.setdefault(id(span.doc), (len(docs), span.doc))
+                encoded_terms.append({"text": span.text, "label": span.label_, "doc": doc_position, "start": span.start, "end": span.end,
+                                      "token": token.i if isinstance(token, Token) else None, "attribute": attribute})
+            encoded_values.append(encoded_terms)
+        return pa.array(encoded_values, type=TERMS_TYPE)
+
+    def __decode_terms(self, values, docs, encoded):
+        """Restores spans or redundant terms from their offsets within docs, or only their lower case texts if encoded"""
+        decoded_values = []
+        for terms in values:
+            if terms is None:
+                decoded_values.append(None)
+            elif encoded:
+                decoded_values.append([term["text"].lower() for term in terms])
+            else:
+                decoded_terms = []
+                for term in terms:
+                    doc = docs[term["doc"]]
+                    span = Span(doc, term["start"], term["end"], label=term["label"])
+                    if term["attribute"] is None:
+                        decoded_terms.append(span)
+                    else:
+                        decoded_terms.append((span, doc[term["token"]] if term["token"] is not None else span, term["attribute"]))
+                decoded_values.append(decoded_terms)
+        return decoded_values
+
+    def __remove(self, name):
+        shutil.rmtree(self.__directory / name)
+        self.__pieces.pop(name)
+
+    def __get_raw_name(self, bucket):
+        return "raw_{}".format(bucket)
+
+    def __get_preprocessed_name(self, bucket):
+        return "preprocessed_{}".format(bucket)
+
+    def __get_batch_name(self, batch):
+        return "batch_{}".format(batch)
+
+    def __get_leaf_name(self, leaf):
+        return "leaf_{}".format(leaf)
+
+    def __get_preprocessed_names(self):
+        return [self.__get_preprocessed_name(bucket) for bucket in range(self.__n_buckets) if self.__get_preprocessed_name(bucket) in self.__pieces]
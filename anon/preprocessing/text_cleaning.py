@@ -1,8 +1,13 @@
 """This modules contains functions to clean textual attributes"""
 import re
+from multiprocessing import Pool
 
 from bs4 import BeautifulSoup
 
+NON_PRINTABLE_CHARACTERS = re.compile(r'[^\x00-\x7F]+')
+MULTIPLE_SPACES = re.compile(' +')
+PARALLEL_CHUNKSIZE = 1000
+
 
 def remove_html_tags(text):
     """Removes HTML Tags from texts and replaces special spaces with regular spaces"""
@@ -13,9 +18,37 @@ def remove_html_tags(text):
 
 def remove_non_printable_characters(text):
     """Removes non-printable characters from the given text"""
-    return re.sub(r'[^\x00-\x7F]+', '', text)
+    return NON_PRINTABLE_CHARACTERS.sub('', text)
 
 
 def remove_unnecessary_spaces(text):
     """Removes spaces at the beginning, end and multiple spaces in between in the given text"""
-    return re.sub(' +', ' ', text).strip()
+    return MULTIPLE_SPACES.sub(' ', text).strip()
+
+
+def clean_text(text):
+    """Removes non-printable characters, HTML tags and unnecessary spaces from the given text, skipping HTML parsing if there is no markup"""
+    text = remove_non_printable_characters(text)
+    if '<' in text or '&' in text:
+        text = remove_html_tags(text)
+    return remove_unnecessary_spaces(text)
+
+
+def clean_texts(texts, n_processes=1):
+    """
+    Cleans a list of texts, optionally using a pool of processes.
+    Parameters
+    ----------
+    texts: list
+        List of texts to clean.
+    n_processes: int
+        Number of processes to use. Texts are cleaned within this process if less than two processes are given or if there are only a few texts.
+    Returns
+    -------
+    list
+        List of cleaned texts in the same order.
+    """
+    if n_processes > 1 and len(texts) > PARALLEL_CHUNKSIZE:
+        with Pool(n_processes) as pool:
+            return pool.map(clean_text, texts, chunksize=PARALLEL_CHUNKSIZE)
+    return [clean_text(text) for text in texts]
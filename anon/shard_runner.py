@@ -0,0 +1,335 @@
+"""Main application to anonymize a dataset in shards split by the key attribute"""
+
+import logging
+from logger.tqdm_logging_handler import TqdmLoggingHandler
+
+logging.basicConfig(level=logging.INFO, handlers=[TqdmLoggingHandler()])
+logger = logging.getLogger(__name__)
+
+import sys
+import getopt
+import json
+import pickle
+from multiprocessing import Pool
+from pathlib import Path
+
+import pandas as pd
+
+from configuration.configuration_reader import ConfigurationReader
+from evaluation.information_loss import calculate_normalized_certainty_penalty
+from evaluation.partition import calculate_mean_partition_size
+from kernel.anonymization_kernel import AnonymizationKernel
+from kernel.util import encode_terms
+from nlp.sensitive_terms_recognizer import SensitiveTermsRecognizer
+from postprocessing.postprocessor import PostProcessor
+from preprocessing.data_reader import DataReader
+from preprocessing.preprocessor import Preprocessor
+
+SUPPORTED_MODES = ["split", "run", "merge", "all"]
+SPLIT_CHUNKSIZE = 100000
+
+
+def main(argv):
+    """Main entrypoint for sharded anonymization"""
+
+    # Default parameters
+    configuration_file = ''
+    input_file = ''
+    output_file = ''
+    shard_dir = 'data/shards'
+    mode = 'all'
+    n_shards = 2
+    shards = None
+    n_processes = 1
+    use_cache = False
+    baseline = False
+
+    # Read and set tool parameters
+    try:
+        opts, _ = getopt.getopt(argv, "c:i:o:d:m:n:p:j:bsv", ["config=", "input=", "output=", "shard_dir=", "mode=", "shards=", "shard=", "processes=", "baseline", "use_chached_docs", "verbose"])
+    except getopt.GetoptError:
+        logger.error('shard_runner.py -c <config_file> -i <input_file> -o <output_file> -d <shard_dir> -n <number_of_shards> -m <split|run|merge|all>')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-c", "--config"):
+            configuration_file = arg
+        if opt in ("-i", "--input"):
+            input_file = arg
+        if opt in ("-o", "--output"):
+            output_file = arg
+        if opt in ("-d", "--shard_dir"):
+            shard_dir = arg
+        if opt in ("-m", "--mode"):
+            mode = arg
+        if opt in ("-n", "--shards"):
+            n_shards = int(arg)
+        if opt in ("-p", "--shard"):
+            shards = [int(shard) for shard in arg.split(",")]
+        if opt in ("-j", "--processes"):
+            n_processes = int(arg)
+        if opt in ("-b", "--baseline"):
+            baseline = True
+        if opt in ("-s", "--use_chached_docs"):
+            use_cache = True
+        if opt in ("-v", "--verbose"):
+            logging.getLogger().setLevel(logging.DEBUG)
+
+    if mode not in SUPPORTED_MODES:
+        raise Exception("Mode {} not supported".format(mode))
+
+    shard_path = Path(shard_dir)
+    shard_path.mkdir(parents=True, exist_ok=True)
+    if shards is None:
+        shards = list(range(n_shards))
+
+    # Split the input file by the key attribute
+    if mode in ["split", "all"]:
+        split_input(configuration_file, input_file, shard_path, n_shards)
+
+    # Anonymize the shards, either in this process or using a pool of processes
+    if mode in ["run", "all"]:
+        arguments = [(configuration_file, shard_path, shard, use_cache) for shard in shards]
+        if n_processes > 1:
+            with Pool(n_processes) as pool:
+                pool.starmap(anonymize_shard, arguments)
+        else:
+            for argument in arguments:
+                anonymize_shard(*argument)
+
+    # Merge the anonymized shards and report the information loss
+    if mode in ["merge", "all"]:
+        merge_shards(configuration_file, shard_path, n_shards, output_file, baseline)
+
+
+def split_input(configuration_file, input_file, shard_path, n_shards):
+    """
+    Splits an input file into shards by hashing the key attribute, so that all records of a key end up in the same shard.
+    Parameters
+    ----------
+    configuration_file: str
+        Path to the configuration.
+    input_file: str
+        Path to the input file.
+    shard_path: Path
+        Directory to store the shards in.
+    n_shards: int
+        Number of shards.
+    """
+    config = ConfigurationReader().read(configuration_file)
+    key_attribute = config.get_key_attribute()
+    logger.info("Splitting input file %s into %d shards using key attribute %s", input_file, n_shards, key_attribute)
+
+    shard_files = [get_shard_file(shard_path, shard) for shard in range(n_shards)]
+    for shard_file in shard_files:
+        if shard_file.exists():
+            shard_file.unlink()
+
+    for chunk in pd.read_csv(input_file, chunksize=SPLIT_CHUNKSIZE, dtype=str, keep_default_na=False):
+        key_column = [column for column in chunk.columns if column.lower() == key_attribute][0]
+        shard_ids = pd.util.hash_pandas_object(chunk[key_column], index=False) % n_shards
+        for shard, shard_chunk in chunk.groupby(shard_ids.values):
+            shard_file = shard_files[shard]
+            shard_chunk.to_csv(shard_file, mode='a', header=not shard_file.exists(), index=False)
+
+
+def anonymize_shard(configuration_file, shard_path, shard, use_cache=False):
+    """
+    Runs preprocessing, partitioning, recoding, and postprocessing on a single shard.
+    Stores the anonymized shard including direct identifiers as well as the state required for merging.
+    Parameters
+    ----------
+    configuration_file: str
+        Path to the configuration.
+    shard_path: Path
+        Directory containing the shards.
+    shard: int
+        Number of the shard to anonymize.
+    use_cache: bool
+        Whether to use cached docs.
+    """
+    shard_file = get_shard_file(shard_path, shard)
+    logger.info("Anonymizing shard %s", shard_file)
+
+    # Initialize and read configuration
+    config = ConfigurationReader().read(configuration_file)
+
+    # Read data using data types defined in the configuration
+    data_reader = DataReader(config)
+    df = data_reader.read(shard_file)
+
+    # Initialize the sensitive terms recognizer
+    sensitive_terms_recognizer = SensitiveTermsRecognizer(config, use_cache)
+
+    # Initialize the preprocessor and run through preprocessing
+    pp = Preprocessor(sensitive_terms_recognizer, config, df)
+    pp.clean_textual_attributes()
+    pp.analyze_textual_attributes()
+    pp.find_redundant_information()
+    pp.compress()
+
+    # Get sensitive terms dictionary and preprocessed dataframe
+    terms = pp.get_sensitive_terms()
+    df = pp.get_df()
+
+    # Every shard has to be k-anonymous on its own
+    k = config.parameters["k"]
+    if len(df) < k:
+        raise Exception("Shard {} contains only {} records, which is less than k={}. Use fewer shards.".format(shard, len(df), k))
+
+    # Anonymize quasi identifiers and recode textual attributes
+    kernel = AnonymizationKernel(terms, config, sensitive_terms_recognizer, pp)
+    unanonymized_df = df.copy()
+    anonymized_df, partitions, _ = kernel.anonymize_quasi_identifiers(df)
+    anonymized_df = kernel.recode_textual_attributes(anonymized_df)
+
+    # Encode sensitive terms by their texts, since spans cannot be pickled without their docs, and evaluate the shard like the merged result
+    entity_attributes = pp.get_non_redundant_entity_attributes()
+    redundant_entity_attributes = pp.get_redundant_entity_attributes()
+    original_df = encode_terms(unanonymized_df.drop(columns=redundant_entity_attributes, errors="ignore"), entity_attributes)
+    encoded_anonymized_df = encode_terms(anonymized_df.drop(columns=redundant_entity_attributes, errors="ignore"), entity_attributes)
+
+    # Calculate the information loss within the shard
+    quasi_identifiers = config.get_quasi_identifiers()
+    textual_attribute_mapping = pp.get_textual_attribute_mapping()
+    total_information_loss, relational_information_loss, textual_information_loss = calculate_normalized_certainty_penalty(original_df, encoded_anonymized_df, quasi_identifiers, textual_attribute_mapping, partitions)
+    logger.info("Total information loss for shard %d is %4.4f", shard, total_information_loss)
+
+    # Store state required to evaluate the merged result
+    state = {
+        "original": original_df,
+        "anonymized": encoded_anonymized_df,
+        "terms": terms,
+        "textual_attribute_mapping": textual_attribute_mapping,
+        "metrics": {
+            "records": len(unanonymized_df),
+            "partitions": len(partitions),
+            "mean_partition_size": calculate_mean_partition_size(partitions),
+            "total_information_loss": total_information_loss,
+            "relational_information_loss": relational_information_loss,
+            "textual_information_loss": textual_information_loss["total"] if textual_information_loss else None
+        }
+    }
+    with open(shard_path / "shard_{}_state.pkl".format(shard), 'wb') as f:
+        pickle.dump(state, f)
+
+    # Perform post processing but keep direct identifiers until the shards are merged
+    post_processor = PostProcessor(config, pp)
+    anonymized_df = post_processor.clean(anonymized_df)
+    anonymized_df = post_processor.uncompress(anonymized_df)
+    anonymized_df = post_processor.pretty(anonymized_df)
+    anonymized_df.to_csv(shard_path / "shard_{}_anonymized.csv".format(shard), index=False)
+
+
+def merge_shards(configuration_file, shard_path, n_shards, output_file, baseline=False):
+    """
+    Merges anonymized shards, removes direct identifiers, and reports the information loss penalty of sharding.
+    Parameters
+    ----------
+    configuration_file: str
+        Path to the configuration.
+    shard_path: Path
+        Directory containing the anonymized shards.
+    n_shards: int
+        Number of shards.
+    output_file: str
+        Path to the output file.
+    baseline: bool
+        Whether to partition the merged preprocessed shards at once to compare against an unsharded run.
+    """
+    config = ConfigurationReader().read(configuration_file)
+    logger.info("Merging %d anonymized shards", n_shards)
+
+    # Merge anonymized shards and drop direct identifiers
+    anonymized_shards = [pd.read_csv(shard_path / "shard_{}_anonymized.csv".format(shard), dtype=str, keep_default_na=False) for shard in range(n_shards)]
+    anonymized_df = pd.concat(anonymized_shards, ignore_index=True)
+    kernel = AnonymizationKernel(None, config, None, None)
+    anonymized_df = kernel.remove_direct_identifier(anonymized_df)
+    logger.info("Saving anonymized file to %s", output_file)
+    anonymized_df.to_csv(output_file, index=False)
+
+    # Merge states of all shards, making record ids unique over all shards
+    states = []
+    for shard in range(n_shards):
+        with open(shard_path / "shard_{}_state.pkl".format(shard), 'rb') as f:
+            states.append(pickle.load(f))
+    original, anonymized, terms, textual_attribute_mapping = __merge_states(states, config)
+
+    # Calculate the information loss of the merged result using the domain of the complete dataset
+    quasi_identifiers = config.get_quasi_identifiers()
+    total_il, relational_il, textual_il = calculate_normalized_certainty_penalty(original, anonymized, quasi_identifiers, textual_attribute_mapping)
+    report = {
+        "shards": [state["metrics"] for state in states],
+        "sharded": __get_information_loss_report(total_il, relational_il, textual_il)
+    }
+    logger.info("Total information loss of the sharded result is %4.4f", total_il)
+
+    # Compare against partitioning all records at once
+    if baseline:
+        kernel = AnonymizationKernel(terms, config, None, None)
+        baseline_df, partitions, _ = kernel.anonymize_quasi_identifiers(original)
+        baseline_total_il, baseline_relational_il, baseline_textual_il = calculate_normalized_certainty_penalty(original, baseline_df, quasi_identifiers, textual_attribute_mapping)
+        report["unsharded"] = __get_information_loss_report(baseline_total_il, baseline_relational_il, baseline_textual_il)
+        report["penalty"] = {metric: report["sharded"][metric] - report["unsharded"][metric] for metric in report["sharded"] if report["sharded"][metric] is not None}
+        logger.info("Total information loss of the unsharded result is %4.4f", baseline_total_il)
+        logger.info("Sharding into %d shards increases the total information loss by %4.4f", n_shards, report["penalty"]["total_information_loss"])
+
+    with open(shard_path / "sharding_report.json", 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def get_shard_file(shard_path, shard):
+    """Returns the path of the input file for a given shard"""
+    return shard_path / "shard_{}.csv".format(shard)
+
+
+def __merge_states(states, config):
+    originals = []
+    anonymized = []
+    terms = {}
+    textual_attribute_mapping = {}
+    offset = 0
+    for state in states:
+        original_df = state["original"]
+        index_mapping = dict(zip(original_df.index, range(offset, offset + len(original_df))))
+        originals.append(original_df.rename(index=index_mapping))
+        anonymized.append(state["anonymized"].rename(index=index_mapping))
+        for attribute, attribute_terms in state["terms"].items():
+            for term, record_ids in attribute_terms.items():
+                terms.setdefault(attribute, {}).setdefault(term, set()).update(index_mapping[record_id] for record_id in record_ids)
+        for textual_attribute, entity_attributes in state["textual_attribute_mapping"].items():
+            merged_entity_attributes = textual_attribute_mapping.setdefault(textual_attribute, [])
+            merged_entity_attributes += [attribute for attribute in entity_attributes if attribute not in merged_entity_attributes]
+        offset += len(original_df)
+
+    # Entity attributes may not exist in all shards
+    original = __concat_with_missing_entities(originals)
+    anonymized = __concat_with_missing_entities(anonymized)
+    data_types = {attribute: data_type for attribute, data_type in config.get_data_types().items() if attribute in original.columns}
+    original = original.astype(data_types)
+    return original, anonymized, terms, textual_attribute_mapping
+
+
+def __concat_with_missing_entities(dfs):
+    columns = []
+    for df in dfs:
+        columns += [column for column in df.columns if column not in columns]
+    completed = []
+    for df in dfs:
+        df = df.copy()
+        for column in columns:
+            if column not in df.columns:
+                df[column] = None
+        completed.append(df[columns])
+    return pd.concat(completed)
+
+
+def __get_information_loss_report(total_il, relational_il, textual_il):
+    return {
+        "total_information_loss": total_il,
+        "relational_information_loss": relational_il,
+        "textual_information_loss": textual_il["total"] if textual_il else None
+    }
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,31 @@
+"""This module contains tests for the micro-benchmarks of kernel primitives"""
+
+from unittest import TestCase
+from pandas.api.types import is_categorical_dtype, is_datetime64_any_dtype
+
+from benchmarks.micro import SHAPES, build_series, compare_results, run_benchmarks
+
+
+class TestMicroBenchmarks(TestCase):
+    """Class containing tests for the micro-benchmarks"""
+
+    def test_build_series(self):
+        for shape in SHAPES:
+            self.assertEqual(len(build_series(shape, 20)), 20)
+        self.assertTrue(build_series("ordered", 20).cat.ordered)
+        self.assertTrue(is_categorical_dtype(build_series("categorical", 20)))
+        self.assertTrue(is_datetime64_any_dtype(build_series("dates", 20)))
+        self.assertTrue(all(isinstance(value, list) for value in build_series("token_lists", 20)))
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks(sizes=[50], selected=["recode_dates", "split_partition"], min_time=0.001, repeat=1)
+        self.assertEqual(set(results.keys()), {"recode_dates/dates/50"} | {"split_partition/{}/50".format(shape) for shape in SHAPES})
+        self.assertTrue(all(result["min"] > 0 for result in results.values()))
+
+    def test_compare_results(self):
+        baseline = {"recode/dates/50": {"min": 1.0}, "recode/numeric/50": {"min": 1.0}, "recode/ordered/50": {"min": 1.0}}
+        results = {"recode/dates/50": {"min": 1.5}, "recode/numeric/50": {"min": 1.1}, "recode/categorical/50": {"min": 9.0}}
+        comparison = compare_results(baseline, results, threshold=0.2)
+        self.assertEqual(comparison.index.tolist(), ["recode/dates/50", "recode/numeric/50"])
+        self.assertEqual(comparison["slowdown"].tolist(), [True, False])
+        self.assertAlmostEqual(comparison.loc["recode/dates/50", "change"], 0.5)
@@ -0,0 +1,37 @@
+"""This module contains tests for the stub recognizer used in benchmarks"""
+
+from unittest import TestCase
+
+from benchmarks.stub_recognizer import StubRecognizer
+from benchmarks.synthetic_dataset import build_configuration
+from configuration.configuration import Configuration
+
+
+def build_config():
+    configuration = build_configuration()
+    config = Configuration()
+    config.attributes = configuration["attributes"]
+    config.entities = configuration["entities"]
+    return config
+
+
+class TestStubRecognizer(TestCase):
+    """Class containing tests for the stub recognizer"""
+
+    def test_recognize(self):
+        recognizer = StubRecognizer(build_config())
+        texts = {"1": [("I met Anna in Berlin in 2005.", 0), ("As a Leo I write about topic12.", 1)]}
+        entities = recognizer.recognize("text", texts)
+        self.assertEqual({label: [entity.text for entity in spans] for label, spans in entities[0].items()}, {"PERSON": ["Anna"], "GPE": ["Berlin"], "DATE": ["2005"]})
+        self.assertEqual({label: [entity.text for entity in spans] for label, spans in entities[1].items()}, {"SIGN": ["Leo"], "TOPIC": ["topic12"]})
+        self.assertEqual(recognizer.get_recognized_entities(), {"PERSON", "GPE", "DATE", "SIGN", "TOPIC"})
+        self.assertEqual(recognizer.get_statistics()["texts"], 2)
+
+    def test_replace(self):
+        recognizer = StubRecognizer(build_config())
+        entities = recognizer.recognize("text", {"1": [("I met Anna in Berlin as a Leo.", 0)]})
+        anna = entities[0]["PERSON"][0]
+        leo = entities[0]["SIGN"][0]
+        replacements = {"SIGN": [(leo, leo.tokens[0], frozenset({"Leo", "Virgo"}))]}
+        self.assertEqual(recognizer.replace("text", "1", replacements, {anna}), "I met Anna in GPE as a (Leo,Virgo).")
+        self.assertEqual(recognizer.replace("text", "1", {}, set()), "I met PERSON in GPE as a SIGN.")
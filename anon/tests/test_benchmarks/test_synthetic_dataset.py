@@ -0,0 +1,35 @@
+"""This module contains tests for generating synthetic datasets"""
+
+from unittest import TestCase
+import pandas as pd
+
+from benchmarks.synthetic_dataset import generate_chunks, generate_dataset
+
+
+class TestSyntheticDataset(TestCase):
+    """Class containing tests for the synthetic dataset generator"""
+
+    def test_generate_dataset(self):
+        df = generate_dataset(1000, texts_per_person=4, cardinalities={"age": 5, "topic": 3}, seed=1)
+        self.assertEqual(len(df), 1000)
+        self.assertEqual(list(df.columns), ["id", "gender", "age", "topic", "sign", "date", "text"])
+        self.assertLessEqual(df["age"].nunique(), 5)
+        self.assertLessEqual(df["topic"].nunique(), 3)
+        self.assertAlmostEqual(df.groupby("id").size().mean(), 4, delta=0.5)
+
+        # Quasi-identifiers other than the date are constant per person
+        self.assertTrue((df.groupby("id")[["gender", "age", "topic", "sign"]].nunique() == 1).all().all())
+        pd.to_datetime(df["date"], format="%d,%B,%Y")
+
+    def test_generate_chunks_reproducible(self):
+        chunks = list(generate_chunks(250, seed=3, chunksize=100))
+        self.assertEqual([len(chunk) for chunk in chunks], [100, 100, 50])
+        pd.testing.assert_frame_equal(pd.concat(chunks), pd.concat(generate_chunks(250, seed=3, chunksize=100)))
+
+    def test_entity_density_and_duplicates(self):
+        df = generate_dataset(500, texts_per_person=1, entity_density=0, duplicate_rate=0, seed=2)
+        self.assertFalse(df["text"].str.contains("Berlin|Acme|engineer").any())
+        self.assertTrue(df["text"].str.contains("somewhere|a company|worker").any())
+
+        df = generate_dataset(500, texts_per_person=1, duplicate_rate=1, cardinalities={"age": 1000}, seed=2)
+        self.assertLess(df[["gender", "age", "topic", "sign"]].drop_duplicates().shape[0], 500)
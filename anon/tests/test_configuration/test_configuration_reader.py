@@ -11,3 +11,9 @@ class TestConfigurationReader(TestCase):
         configuration_reader = ConfigurationReader()
         config = configuration_reader.read('./tests/resources/sample_config.yaml')
         self.assertIsNotNone(config)
+
+    def test_parse_of_configuration(self):
+        configuration_reader = ConfigurationReader()
+        config = configuration_reader.parse({"attributes": {"Age": {"type": "numerical", "anonymization_type": "quasi_identifier"}}, "parameters": {"k": 3}})
+        self.assertEqual(config.get_quasi_identifiers(), ["age"])
+        self.assertEqual(config.parameters["k"], 3)
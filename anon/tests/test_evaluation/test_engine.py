@@ -0,0 +1,108 @@
+"""This module contains tests for the evaluation engine"""
+
+from unittest import TestCase
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import spacy
+
+from configuration.configuration import Configuration
+from evaluation.engine import evaluate
+from evaluation.information_loss import calculate_normalized_certainty_penalty
+from evaluation.partition import calculate_mean_partition_size, calculate_std_partition_size
+from kernel.k_anonymity import KAnonymity
+
+Span = namedtuple("Span", ["text", "start", "label_"])
+ALICE, BOB, ROME = Span("Alice", 0, "PERSON"), Span("Bob", 5, "PERSON"), Span("Rome", 9, "GPE")
+
+
+def build_config():
+    config = Configuration()
+    config.attributes = {
+        "id": {"anonymization_type": "direct_identifier"},
+        "gender": {"type": "nominal", "anonymization_type": "quasi_identifier"},
+        "age": {"type": "numerical", "anonymization_type": "quasi_identifier"}
+    }
+    return config
+
+
+def build_df():
+    genders = ["male", "female", "male", "female", "male", "male", "female", "female", "male", "female", "male", "female"]
+    ages = [20, 20, 20, 21, 35, 35, 35, 40, 52, 52, 52, 60]
+    df = pd.DataFrame({"id": range(len(ages)), "gender": genders, "age": ages})
+    df["gender"] = df["gender"].astype("category")
+    df["text_PERSON"] = [[ALICE], [BOB, ALICE], None, [BOB], None, None, [ALICE], None, None, [BOB], None, None]
+    df["text_GPE"] = [[ROME], None, None, None, [ROME], None, None, None, None, None, None, [ROME]]
+    return df
+
+
+def anonymize(df, k):
+    config = build_config()
+    anonymized_df, partitions, _ = KAnonymity(df, config.get_quasi_identifiers(), k, "mondrian", config.get_biases(), 1, {}, config).anonymize()
+    anonymized_df = df.assign(**{attribute: anonymized_df[attribute] for attribute in anonymized_df.columns})
+    anonymized_df["text_PERSON"] = [[ALICE], None, None, [BOB], None, None, [ALICE], None, None, None, None, None]
+    anonymized_df["text_GPE"] = [[ROME], None, None, None, None, None, None, None, None, None, None, [ROME]]
+    return anonymized_df, partitions
+
+
+class TestEvaluationEngine(TestCase):
+    """Class containing tests for the evaluation engine"""
+
+    def test_metrics_match_separate_calculations(self):
+        df = build_df()
+        mapping = {"text": ["text_PERSON", "text_GPE"]}
+        for k in [2, 3, 4]:
+            anonymized_df, partitions = anonymize(df, k)
+            results = evaluate(df, anonymized_df, partitions, k, ["gender", "age"], mapping)
+
+            total, relational, textual = calculate_normalized_certainty_penalty(df, anonymized_df, ["gender", "age"], mapping)
+            self.assertAlmostEqual(results["total_information_loss"], total)
+            self.assertAlmostEqual(results["relational_information_loss"], relational)
+            for attribute in ["text_PERSON", "text_GPE", "total"]:
+                self.assertAlmostEqual(results["textual_information_loss"]["text"][attribute], textual["text"][attribute])
+            self.assertAlmostEqual(results["mean_partition_size"], calculate_mean_partition_size(partitions))
+            self.assertAlmostEqual(results["std_partition_size"], calculate_std_partition_size(partitions))
+            self.assertEqual(results["discernibility"], sum(len(partition) ** 2 for partition in partitions))
+            self.assertAlmostEqual(results["average_class_size"], len(df) / len(partitions) / k)
+
+    def test_suppressed_records(self):
+        df = build_df()
+        anonymized_df, partitions = anonymize(df, 3)
+        results = evaluate(df, anonymized_df, partitions, 3, ["gender", "age"], {"text": ["text_PERSON", "text_GPE"]}, metrics=["suppression"])
+        self.assertEqual(results["suppressed_records"], {"gender": 0, "age": 0, "text_PERSON": 2, "text_GPE": 1})
+        self.assertNotIn("total_information_loss", results)
+
+    def test_parallel_evaluation_matches_sequential_evaluation(self):
+        df = build_df()
+        anonymized_df, partitions = anonymize(df, 2)
+        mapping = {"text": ["text_PERSON", "text_GPE"]}
+        self.assertEqual(evaluate(df, anonymized_df, partitions, 2, ["gender", "age"], mapping, n_processes=2),
+                         evaluate(df, anonymized_df, partitions, 2, ["gender", "age"], mapping))
+
+    def test_suppressed_records_not_counting_missing_original_values(self):
+        df = build_df()
+        anonymized_df, partitions = anonymize(df, 3)
+        df["age"] = df["age"].astype(float)
+        df.loc[0, "age"] = np.nan
+        partition = next(partition for partition in partitions if 0 in partition)
+        anonymized_df.loc[partition, "age"] = np.nan  # Suppress the partition of the record missing its age
+        results = evaluate(df, anonymized_df, partitions, 3, ["gender", "age"], {"text": ["text_PERSON", "text_GPE"]}, metrics=["suppression"])
+        self.assertEqual(results["suppressed_records"]["age"], len(partition) - 1)
+
+    def test_parallel_evaluation_of_spacy_spans(self):
+        doc = spacy.blank("en")("Alice and Bob in Rome")
+        alice, bob, rome = doc.char_span(0, 5, label="PERSON"), doc.char_span(10, 13, label="PERSON"), doc.char_span(17, 21, label="GPE")
+        df = build_df()
+        df["text_PERSON"] = [[alice], [bob, alice], None, [bob], None, None, [alice], None, None, [bob], None, None]
+        df["text_GPE"] = [[rome], None, None, None, [rome], None, None, None, None, None, None, [rome]]
+        anonymized_df, partitions = anonymize(df, 2)
+        anonymized_df["text_PERSON"] = [[alice], None, None, [bob], None, None, [alice], None, None, None, None, None]
+        anonymized_df["text_GPE"] = [[rome], None, None, None, None, None, None, None, None, None, None, [rome]]
+        mapping = {"text": ["text_PERSON", "text_GPE"]}
+        self.assertEqual(evaluate(df, anonymized_df, partitions, 2, ["gender", "age"], mapping, n_processes=2),
+                         evaluate(df, anonymized_df, partitions, 2, ["gender", "age"], mapping))
+
+    def test_unsupported_metric(self):
+        df = build_df()
+        with self.assertRaises(Exception):
+            evaluate(df, df, [df.index], 2, ["gender", "age"], {}, metrics=["accuracy"])
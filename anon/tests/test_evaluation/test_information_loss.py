@@ -0,0 +1,95 @@
+"""This module contains tests for calculating the information loss"""
+
+from unittest import TestCase
+from collections import namedtuple
+import pandas as pd
+
+from configuration.configuration import Configuration
+from evaluation.information_loss import calculate_normalized_certainty_penalty, calculate_original_statistics
+from kernel.k_anonymity import KAnonymity
+
+
+def build_config():
+    config = Configuration()
+    config.attributes = {
+        "id": {"anonymization_type": "direct_identifier"},
+        "gender": {"type": "nominal", "anonymization_type": "quasi_identifier"},
+        "age": {"type": "numerical", "anonymization_type": "quasi_identifier"},
+        "date": {"type": "date", "anonymization_type": "quasi_identifier"},
+        "topic": {"type": "nominal", "anonymization_type": "quasi_identifier"}
+    }
+    return config
+
+
+def build_df():
+    genders = ["male", "female", "male", "female", "male", "male", "female", "female", "male", "female", "male", "female"]
+    ages = [20, 20, 20, 21, 35, 35, 35, 40, 52, 52, 52, 60]
+    dates = ["2004-05-14", "2004-05-15", "2004-06-01", "2005-01-01", "2004-05-14", "2006-03-03",
+             "2004-05-14", "2004-05-20", "2004-07-01", "2005-02-02", "2005-02-03", "2007-12-31"]
+    topics = ["Science", "Arts", "Arts", "Arts", "Banking", "Banking", "Science", "Science", "Banking", "Arts", "Science", "Banking"]
+    df = pd.DataFrame({"id": range(len(ages)), "gender": genders, "age": ages, "date": pd.to_datetime(dates), "topic": topics})
+    df["gender"] = df["gender"].astype("category")
+    df["topic"] = df["topic"].astype("category")
+    return df
+
+
+Span = namedtuple("Span", ["text", "start", "label_"])
+
+
+class TestNormalizedCertaintyPenalty(TestCase):
+    """Class containing tests for the normalized certainty penalty"""
+
+    def test_partition_aware_ncp_matches_record_wise_ncp(self):
+        config = build_config()
+        df = build_df()
+        quasi_identifiers = config.get_quasi_identifiers()
+        for k in [2, 3, 5]:
+            anonymized_df, partitions, _ = KAnonymity(df, quasi_identifiers, k, "mondrian", config.get_biases(), 1, {}, config).anonymize()
+            anonymized_df = anonymized_df.loc[df.index]
+            expected = calculate_normalized_certainty_penalty(df, anonymized_df, quasi_identifiers, {})
+            result = calculate_normalized_certainty_penalty(df, anonymized_df, quasi_identifiers, {}, partitions)
+            self.assertGreater(expected[0], 0)
+            self.assertAlmostEqual(result[0], expected[0])
+            self.assertAlmostEqual(result[1], expected[1])
+            self.assertIsNone(result[2])
+
+    def test_date_ncp_using_original_statistics(self):
+        original = pd.DataFrame({"date": pd.to_datetime(["2004-05-14", "2004-05-15", "2004-06-01", "2005-01-01"])})
+        anonymized = pd.DataFrame({"date": [pd.Period("2004-05", "M"), pd.Period("2004-05", "M"), pd.Period("2004", "Y"), range(2004, 2006)]})
+        original_statistics = calculate_original_statistics(original, ["date"])
+        self.assertEqual(original_statistics["date"]["n_unique_per_year"], {2004: 3, 2005: 1})
+
+        # Periods cover 2, 2, and 3 of 4 distinct dates, the range of years covers all of them
+        result = calculate_normalized_certainty_penalty(original, anonymized, ["date"], {}, original_statistics=original_statistics)
+        self.assertAlmostEqual(result[0], (0.5 + 0.5 + 0.75 + 1) / 4)
+        self.assertEqual(result, calculate_normalized_certainty_penalty(original, anonymized, ["date"], {}))
+
+    def test_textual_ncp_per_entity_type_and_total(self):
+        alice, bob, rome, paris = Span("Alice", 0, "PERSON"), Span("Bob", 5, "PERSON"), Span("Rome", 9, "GPE"), Span("Paris", 3, "GPE")
+        original = pd.DataFrame({
+            "age": [20, 30, 40, 50],
+            "text_PERSON": [[alice, bob, alice], [bob], None, None],
+            "text_GPE": [[rome], None, [paris], None]
+        })
+        anonymized = pd.DataFrame({
+            "age": [20, 30, 40, 50],
+            "text_PERSON": [[alice], None, [bob], [alice]],
+            "text_GPE": [[rome, paris], None, None, None]
+        }, index=[0, 1, 2, 3]).iloc[::-1]
+        _, _, textual_information_loss = calculate_normalized_certainty_penalty(original, anonymized, ["age"], {"text": ["text_PERSON", "text_GPE"]})
+
+        # One of three terms and none of one term remain for persons, one of one and none of one remain for locations
+        self.assertAlmostEqual(textual_information_loss["text"]["text_PERSON"], ((1 - 1 / 3) + 1) / 2)
+        self.assertAlmostEqual(textual_information_loss["text"]["text_GPE"], (0 + 1) / 2)
+        # Two of four terms, none of one term, and none of one term remain over all entity types
+        self.assertAlmostEqual(textual_information_loss["text"]["total"], ((1 - 2 / 4) + 1 + 1) / 3)
+        self.assertAlmostEqual(textual_information_loss["total"], textual_information_loss["text"]["total"])
+
+    def test_textual_ncp_of_recoded_term_sets(self):
+        alice, bob = Span("Alice", 0, "PERSON"), Span("Bob", 5, "PERSON")
+        original = pd.DataFrame({"age": [20, 30], "text_PERSON": [[alice, bob], [alice]]})
+        anonymized = pd.DataFrame({"age": [20, 30], "text_PERSON": [{alice}, {alice}]})
+        _, _, textual_information_loss = calculate_normalized_certainty_penalty(original, anonymized, ["age"], {"text": ["text_PERSON"]})
+
+        # One of two terms and one of one term remain
+        self.assertAlmostEqual(textual_information_loss["text"]["total"], (1 - 1 / 2) / 2)
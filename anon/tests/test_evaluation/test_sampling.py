@@ -0,0 +1,59 @@
+"""This module contains tests for sampling and estimation"""
+
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+
+from evaluation.sampling import confidence_interval, get_sample_fraction, scale_k, stratified_sample
+
+
+class TestStratifiedSample(TestCase):
+    """Class containing tests for stratified sampling"""
+
+    def test_sample_keeps_strata_proportions(self):
+        df = pd.DataFrame({"gender": ["female"] * 20 + ["male"] * 80, "age": range(100)})
+        sample = stratified_sample(df, 0.1, "gender", random_state=0)
+        self.assertEqual(len(sample), 10)
+        self.assertEqual((sample["gender"] == "female").sum(), 2)
+        self.assertTrue(sample.index.isin(df.index).all())
+
+    def test_sample_on_numerical_attribute(self):
+        df = pd.DataFrame({"age": range(100)})
+        sample = stratified_sample(df, 0.2, "age", random_state=0)
+        self.assertEqual(len(sample), 20)
+        self.assertEqual(pd.cut(sample["age"], 10, labels=False).nunique(), 10)
+
+    def test_sample_on_set_valued_attribute(self):
+        df = pd.DataFrame({"topic": [frozenset(["a", "b"]), frozenset(["b", "a"]), "a", "a"]})
+        sample = stratified_sample(df, 0.5, "topic", random_state=0)
+        self.assertEqual(len(sample), 2)
+
+    def test_sample_keeps_small_and_missing_strata(self):
+        df = pd.DataFrame({"gender": ["female"] * 3 + ["male"] * 96 + [None], "age": [np.nan] * 2 + list(range(98))})
+        self.assertIn("female", stratified_sample(df, 0.1, "gender", random_state=0)["gender"].tolist())
+        self.assertEqual(stratified_sample(df, 0.1, "age", random_state=0)["age"].isna().sum(), 1)
+
+
+class TestEstimation(TestCase):
+    """Class containing tests for estimation helpers"""
+
+    def test_scale_k(self):
+        self.assertEqual(scale_k(20, 0.1), 2)
+        self.assertEqual(scale_k(50, 0.1), 5)
+        with self.assertRaises(Exception):
+            scale_k(10, 0.1)
+
+    def test_sample_fraction_is_raised_for_small_k(self):
+        self.assertEqual(get_sample_fraction([20, 50], 0.1), 0.1)
+        self.assertEqual(get_sample_fraction([5, 10], 0.1), 0.4)
+        self.assertEqual(get_sample_fraction([2, 10], 0.1), 1.0)
+
+    def test_confidence_interval(self):
+        mean, lower, upper = confidence_interval([0.2, 0.4, 0.3, 0.3])
+        self.assertAlmostEqual(mean, 0.3)
+        self.assertLess(lower, mean)
+        self.assertGreater(upper, mean)
+        self.assertAlmostEqual(mean - lower, upper - mean)
+
+    def test_confidence_interval_of_single_value(self):
+        self.assertEqual(confidence_interval([0.5]), (0.5, 0.5, 0.5))
@@ -0,0 +1,96 @@
+"""This module contains tests for verifying k-anonymity of anonymized datasets"""
+
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+import pandas as pd
+import yaml
+
+import verifier
+from benchmarks.stub_recognizer import StubRecognizer
+from benchmarks.synthetic_dataset import build_configuration, generate_chunks
+from configuration.configuration_reader import ConfigurationReader
+from evaluation.verification import collect_violation_examples, verify_k_anonymity
+from logger.instrumentation import Instrumentation
+from main import anonymize, anonymize_within_memory_budget
+from preprocessing.data_reader import DataReader
+
+
+def build_chunks():
+    first = pd.DataFrame({"age": ["[20-29]", "[20-29]", "30"], "gender": ["(female,male)", "(female,male)", "male"], "id": ["1", "2", "3"]})
+    second = pd.DataFrame({"age": ["[20-29]", "30", "[40-49]"], "gender": ["(female,male)", "male", None], "id": ["4", "3", "5"]}, index=[3, 4, 5])
+    return [first, second]
+
+
+class TestVerification(TestCase):
+    """Class containing tests for the k-anonymity verifier"""
+
+    def test_verify_k_anonymity(self):
+        report, class_sizes = verify_k_anonymity(build_chunks(), ["age", "gender"], 2, None)
+        self.assertEqual(report["number_of_records"], 6)
+        self.assertEqual(report["number_of_classes"], 3)
+        self.assertEqual(report["class_size_distribution"], {1: 1, 2: 1, 3: 1})
+        self.assertEqual(report["number_of_violating_classes"], 1)
+        self.assertEqual(report["number_of_violating_units"], 1)
+        self.assertFalse(report["k_anonymous"])
+        self.assertEqual(sorted(class_sizes.tolist()), [1, 2, 3])
+
+        report, _ = verify_k_anonymity(build_chunks(), ["age", "gender"], 1, None)
+        self.assertTrue(report["k_anonymous"])
+
+    def test_verify_k_anonymity_counting_persons(self):
+        report, _ = verify_k_anonymity(build_chunks(), ["age", "gender"], 2, "id")
+        self.assertEqual(report["unit"], "persons")
+        self.assertEqual(report["class_size_distribution"], {1: 2, 3: 1})
+        self.assertEqual(report["number_of_violating_units"], 2)
+
+    def test_collect_violation_examples(self):
+        report, class_sizes = verify_k_anonymity(build_chunks(), ["age", "gender"], 3, "id")
+        examples = collect_violation_examples(build_chunks(), ["age", "gender"], 3, class_sizes)
+        self.assertEqual(report["number_of_violating_classes"], 2)
+        self.assertEqual(examples, [{"age": "30", "gender": "male", "class_size": 1}, {"age": "[40-49]", "gender": None, "class_size": 1}])  # Person 3 has two records
+        self.assertEqual(len(collect_violation_examples(build_chunks(), ["age", "gender"], 3, class_sizes, 1)), 1)
+
+    def test_verifier_counts_pseudonymized_persons(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory)
+            configuration = build_configuration(k=3)
+            for person_pseudonyms in [False, True]:
+                configuration["parameters"]["person_pseudonyms"] = person_pseudonyms
+                with open(path / "config.yaml", 'w') as f:
+                    yaml.safe_dump(configuration, f)
+                config = ConfigurationReader().read(str(path / "config.yaml"))
+                next(generate_chunks(120, seed=3)).to_csv(path / "input.csv", index=False)
+                anonymize(config, DataReader(config), StubRecognizer(config), path / "input.csv", path / "output.csv", Instrumentation())
+                arguments = ["-i", str(path / "output.csv"), "-c", str(path / "config.yaml")]
+                if not person_pseudonyms:
+                    # Records of persons cannot be told apart without pseudonyms
+                    with self.assertRaises(SystemExit) as context:
+                        verifier.main(arguments)
+                    self.assertEqual(context.exception.code, 2)
+                    continue
+                verifier.main(arguments)
+                with open(path / "output_verification.json") as f:
+                    report = json.load(f)
+                self.assertEqual(report["unit"], "persons")
+                self.assertTrue(report["k_anonymous"])
+                self.assertGreaterEqual(report["min_class_size"], 3)
+                self.assertNotIn("id", pd.read_csv(path / "output.csv").columns)
+
+    def test_verifier_accepts_output_partitioned_within_memory_budget(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory)
+            configuration = build_configuration(k=3)
+            configuration["parameters"].update({"person_pseudonyms": True, "memory_budget": 0.05, "spill_directory": str(path / "spill")})
+            with open(path / "config.yaml", 'w') as f:
+                yaml.safe_dump(configuration, f)
+            config = ConfigurationReader().read(str(path / "config.yaml"))
+            next(generate_chunks(600, seed=3)).to_csv(path / "input.csv", index=False)
+            anonymize_within_memory_budget(config, DataReader(config), StubRecognizer(config), path / "input.csv", path / "output.csv", Instrumentation())
+
+            verifier.main(["-i", str(path / "output.csv"), "-c", str(path / "config.yaml")])
+            with open(path / "output_verification.json") as f:
+                report = json.load(f)
+            self.assertEqual(report["number_of_records"], len(pd.read_csv(path / "input.csv")))
+            self.assertTrue(report["k_anonymous"])
@@ -0,0 +1,156 @@
+"""This module contains tests for the state of incremental anonymizations"""
+
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+import pandas as pd
+import spacy
+from spacy.language import Language
+
+from benchmarks.synthetic_dataset import build_configuration, generate_chunks
+from configuration.configuration import Configuration
+from configuration.configuration_reader import ConfigurationReader
+from kernel.incremental_state import IncrementalState
+from kernel.partitioning import partition_mondrian
+from logger.instrumentation import Instrumentation
+from main import anonymize_incrementally
+from nlp.sensitive_terms_recognizer import SensitiveTermsRecognizer
+from preprocessing.data_reader import DataReader
+
+
+@Language.component("lower_case_lemmas")
+def lower_case_lemmas(doc):
+    for token in doc:
+        token.lemma_ = token.lower_
+    return doc
+
+
+def build_config():
+    config = Configuration()
+    config.parameters["k"] = 2
+    config.attributes = {
+        "id": {"anonymization_type": "direct_identifier"},
+        "age": {"type": "numerical", "anonymization_type": "quasi_identifier"}
+    }
+    return config
+
+
+def build_text_config(directory, cache):
+    model = Path(directory) / "model"
+    if not model.exists():
+        nlp = spacy.blank("en")  # Custom entities are recognized by the entity ruler, so no trained model is needed
+        nlp.add_pipe("lower_case_lemmas")
+        nlp.to_disk(model)
+    configuration = build_configuration(k=3)
+    configuration["nlp"] = {"model": str(model), "cache": str(Path(directory) / cache)}
+    return ConfigurationReader().parse(configuration)
+
+
+def run_incrementally(directory, name, input_files, use_cache):
+    config = build_text_config(directory, name + "_cache")
+    output_file = Path(directory) / "{}.csv".format(name)
+    for input_file in input_files:
+        recognizer = SensitiveTermsRecognizer(config, use_cache)
+        anonymize_incrementally(config, DataReader(config), recognizer, input_file, output_file, Path(directory) / (name + "_state"), Instrumentation())
+    return pd.read_csv(output_file), recognizer.get_statistics()
+
+
+def split(state, df):
+    split_tree = {}
+    partitions, _, _ = partition_mondrian(df, 2, {"age": 0}, 1, ["age"], split_tree=split_tree)
+    return state.split_leaf(0, split_tree, [df.loc[partition, "id"].tolist() for partition in partitions])
+
+
+class TestIncrementalState(TestCase):
+    """Class containing tests for the state of incremental anonymizations"""
+
+    def test_new_persons_are_routed_into_leaves(self):
+        config = build_config()
+        df = pd.DataFrame({"id": range(8), "age": [20, 22, 30, 32, 40, 42, 50, 52]})
+        with tempfile.TemporaryDirectory() as directory:
+            state = IncrementalState(config, directory)
+            self.assertFalse(state.is_split())
+            self.assertEqual(state.assign(pd.DataFrame({"id": state.add_records(df)}), 2), [0])
+            leaves = split(state, df)
+            self.assertEqual(len(leaves), 4)
+            for leaf in leaves:
+                state.set_output(leaf, df[df["id"].isin(state.get_members([leaf]))], False)
+            state.save()
+
+            state = IncrementalState(config, directory)
+            self.assertTrue(state.is_split())
+            self.assertEqual(state.get_number_of_leaves(), 4)
+            new_df = pd.DataFrame({"id": [8, 9], "age": [21, 51]})
+            state.add_records(new_df)
+            affected = state.assign(new_df, 2)
+            self.assertEqual(len(affected), 2)
+            self.assertEqual(sorted(state.get_members(affected)), [0, 1, 6, 7, 8, 9])
+            self.assertEqual(len(state.get_records([0, 8])), 2)
+            self.assertEqual(sum(len(output) for output in state.get_outputs()), 8)
+
+    def test_changed_persons_only_leave_partitions_staying_k_anonymous(self):
+        config = build_config()
+        df = pd.DataFrame({"id": range(8), "age": [20, 22, 30, 32, 40, 42, 50, 52]})
+        with tempfile.TemporaryDirectory() as directory:
+            state = IncrementalState(config, directory)
+            state.assign(pd.DataFrame({"id": state.add_records(df)}), 2)
+            split(state, df)
+            changed_df = pd.DataFrame({"id": [0], "age": [51]})
+            affected = state.assign(changed_df, 2)
+            self.assertEqual(len(affected), 1)
+            self.assertIn(0, state.get_members(affected))
+            self.assertEqual(len(state.get_members(affected)), 2)
+
+    def test_cached_docs_of_appended_records_match_docs_analyzed_from_scratch(self):
+        df = next(generate_chunks(160, seed=2))
+        with tempfile.TemporaryDirectory() as directory:
+            input_files = [Path(directory) / "first.csv", Path(directory) / "appended.csv"]
+            df.iloc[:120].to_csv(input_files[0], index=False)
+            df.iloc[120:].to_csv(input_files[1], index=False)
+
+            # Persons of partitions affected by appended records are preprocessed again using the docs cached by former runs
+            output_df, statistics = run_incrementally(directory, "cached", input_files, use_cache=True)
+            expected_df, _ = run_incrementally(directory, "analyzed", input_files, use_cache=False)
+            self.assertGreater(statistics["cached_ids"], 0)
+            pd.testing.assert_frame_equal(output_df, expected_df)
+
+    def test_save_only_rewrites_files_of_affected_leaves(self):
+        config = build_config()
+        df = pd.DataFrame({"id": range(8), "age": [20, 22, 30, 32, 40, 42, 50, 52]})
+        with tempfile.TemporaryDirectory() as directory:
+            state = IncrementalState(config, directory)
+            state.assign(pd.DataFrame({"id": state.add_records(df)}), 2)
+            for leaf in split(state, df):
+                state.set_output(leaf, df[df["id"].isin(state.get_members([leaf]))], False)
+            state.save()
+            files = set(path.name for path in Path(directory).glob("*.parquet"))
+            self.assertEqual(len(files), 8)
+
+            state = IncrementalState(config, directory)
+            new_df = pd.DataFrame({"id": [8], "age": [51]})
+            state.add_records(new_df)
+            affected = state.assign(new_df, 2)
+            self.assertEqual(len(affected), 1)
+            state.set_output(affected[0], state.get_records(state.get_members(affected)), False)
+            state.save()
+            rewritten = files.symmetric_difference(path.name for path in Path(directory).glob("*.parquet"))
+            self.assertEqual(len(rewritten), 4)  # Records and output of the affected leaf, replacing their former files
+
+            state = IncrementalState(config, directory)
+            self.assertEqual(sorted(state.get_records(list(range(9)))["age"]), sorted(df["age"].tolist() + [51]))
+            self.assertEqual(sum(len(output) for output in state.get_outputs()), 9)
+
+    def test_input_files_are_only_added_once(self):
+        config = build_config()
+        with tempfile.TemporaryDirectory() as directory:
+            input_file = Path(directory) / "input.csv"
+            df = pd.DataFrame({"id": range(4), "age": [20, 22, 30, 32]})
+            df.to_csv(input_file, index=False)
+            state = IncrementalState(config, Path(directory) / "state")
+            state.assign(pd.DataFrame({"id": state.add_records(df, input_file)}), 2)
+            state.set_output(0, df, False)
+            state.save()
+
+            state = IncrementalState(config, Path(directory) / "state")
+            with self.assertRaises(Exception):
+                state.add_records(df, input_file)
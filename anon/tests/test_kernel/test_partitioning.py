@@ -0,0 +1,177 @@
+"""This module contains tests for partitioning"""
+
+from unittest import TestCase
+import pandas as pd
+
+from configuration.configuration import Configuration
+from kernel.k_anonymity import KAnonymity
+from kernel.partitioning import partition_mondrian, route
+from kernel.util import weighted_median
+
+
+def build_config():
+    config = Configuration()
+    config.attributes = {
+        "id": {"anonymization_type": "direct_identifier"},
+        "gender": {"type": "nominal", "anonymization_type": "quasi_identifier"},
+        "age": {"type": "numerical", "anonymization_type": "quasi_identifier"}
+    }
+    return config
+
+
+def build_df():
+    genders = ["male", "female", "male", "female", "male", "male", "female", "female", "male", "female", "male", "female"]
+    ages = [20, 20, 20, 21, 35, 35, 35, 40, 52, 52, 52, 60]
+    df = pd.DataFrame({"id": range(len(ages)), "gender": genders, "age": ages})
+    df["gender"] = df["gender"].astype("category")
+    return df
+
+
+class TestWeightedMedian(TestCase):
+    """Class containing tests for the weighted median"""
+
+    def test_unit_weights_match_median(self):
+        for values in ([3, 1, 2], [4, 1, 3, 2], [5, 5, 1, 7, 7, 7]):
+            series = pd.Series(values)
+            weights = pd.Series([1] * len(values))
+            self.assertEqual(weighted_median(series, weights), series.median())
+
+    def test_weights_match_repeated_values(self):
+        series = pd.Series([10, 20, 30], index=["a", "b", "c"])
+        weights = pd.Series([3, 1, 2], index=["a", "b", "c"])
+        repeated = pd.Series([10, 10, 10, 20, 30, 30])
+        self.assertEqual(weighted_median(series, weights), repeated.median())
+
+
+class TestWeightedMondrian(TestCase):
+    """Class containing tests for Mondrian partitioning on weighted rows"""
+
+    def test_weighted_partitions_match_unweighted_partitions(self):
+        df = build_df()
+        quasi_identifiers = ["age", "gender"]
+        bias = {"age": 0, "gender": 0}
+        partitions, statistics, _ = partition_mondrian(df, 2, bias, 1, quasi_identifiers)
+
+        collapsed = df.drop_duplicates(subset=quasi_identifiers)
+        weights = df.groupby(quasi_identifiers, observed=True).size()
+        weights = pd.Series([weights[(row.age, row.gender)] for row in collapsed.itertuples()], index=collapsed.index)
+        weighted_partitions, weighted_statistics, _ = partition_mondrian(collapsed, 2, bias, 1, quasi_identifiers, weights)
+
+        self.assertEqual(statistics, weighted_statistics)
+        self.assertEqual(sorted(len(p) for p in partitions), sorted(weights.loc[p].sum() for p in weighted_partitions))
+
+    def test_anonymize_expands_collapsed_records(self):
+        df = build_df()
+        config = build_config()
+        k_anonymity = KAnonymity(df, config.get_quasi_identifiers(), 2, "mondrian", config.get_biases(), 1, {}, config)
+        anonymized_df, partitions, _ = k_anonymity.anonymize()
+
+        self.assertEqual(sorted(i for p in partitions for i in p), list(df.index))
+        for partition in partitions:
+            self.assertGreaterEqual(len(partition), 2)
+            self.assertEqual(list(partition), sorted(partition))
+            self.assertEqual(anonymized_df.loc[partition, "age"].nunique(), 1)
+
+
+class TestRelaxedMondrian(TestCase):
+    """Class containing tests for relaxed Mondrian partitioning"""
+
+    def test_relaxed_splits_values_clustering_at_median(self):
+        df = pd.DataFrame({"age": [20, 30, 30, 30, 30, 30, 30, 30, 30, 40]})
+        partitions, _, _ = partition_mondrian(df, 3, {"age": 0}, 1, ["age"])
+        relaxed_partitions, _, _ = partition_mondrian(df, 3, {"age": 0}, 1, ["age"], relaxed=True)
+
+        self.assertEqual(len(partitions), 1)
+        self.assertGreater(len(relaxed_partitions), 1)
+        self.assertEqual(sorted(i for p in relaxed_partitions for i in p), list(df.index))
+        for partition in relaxed_partitions:
+            self.assertGreaterEqual(len(partition), 3)
+
+    def test_relaxed_splits_duplicate_records(self):
+        df = pd.DataFrame({"id": range(10), "age": [20, 30, 30, 30, 30, 30, 30, 30, 30, 40]})
+        config = Configuration()
+        config.attributes = {"id": {"anonymization_type": "direct_identifier"}, "age": {"type": "numerical", "anonymization_type": "quasi_identifier"}}
+        partitions, _ = KAnonymity(df, ["age"], 3, "relaxed_mondrian", {"age": 0}, 1, {}, config).partition()
+        direct_partitions, _, _ = partition_mondrian(df, 3, {"age": 0}, 1, ["age"], relaxed=True)
+
+        self.assertEqual(len(partitions), len(direct_partitions))
+        self.assertGreater(len(partitions), 1)
+        self.assertEqual(sorted(i for p in partitions for i in p), list(df.index))
+        for partition in partitions:
+            self.assertGreaterEqual(len(partition), 3)
+
+    def test_relaxed_splits_categorical_values_by_records(self):
+        df = pd.DataFrame({"gender": pd.Categorical(["female"] * 2 + ["male"] * 6 + ["other"] * 2)})
+        partitions, _, _ = partition_mondrian(df, 4, {"gender": 0}, 1, ["gender"], relaxed=True)
+        self.assertEqual(sorted(len(p) for p in partitions), [5, 5])
+
+
+class TestAnytimeMondrian(TestCase):
+    """Class containing tests for budget-bounded Mondrian partitioning"""
+
+    def test_unbounded_partitioning_does_not_skip_refinement(self):
+        df = pd.DataFrame({"age": range(32)})
+        partitions, _, refinement = partition_mondrian(df, 2, {"age": 0}, 1, ["age"])
+        self.assertEqual(len(partitions), 16)
+        self.assertFalse(refinement["budget_exhausted"])
+        self.assertEqual(refinement["splits"], 15)
+        self.assertEqual(refinement["max_depth"], 4)
+
+    def test_split_budget_stops_refinement(self):
+        df = pd.DataFrame({"age": range(32)})
+        for priority in ["size", "span"]:
+            partitions, _, refinement = partition_mondrian(df, 2, {"age": 0}, 1, ["age"], priority=priority, split_budget=3)
+            self.assertTrue(refinement["budget_exhausted"])
+            self.assertEqual(refinement["splits"], 3)
+            self.assertEqual(len(partitions), 4)
+            self.assertEqual(refinement["unrefined_partitions"], 4)
+            self.assertEqual(refinement["unrefined_records"], 32)
+            self.assertEqual(sorted(i for p in partitions for i in p), list(df.index))
+            for partition in partitions:
+                self.assertGreaterEqual(len(partition), 2)
+
+    def test_partition_order_does_not_depend_on_priority(self):
+        df = pd.DataFrame({"age": [20, 21, 22, 23, 24, 25, 30, 40, 50, 60, 61, 62, 63, 64, 65, 66, 67, 68]})
+        partitions, _, _ = partition_mondrian(df, 2, {"age": 0}, 1, ["age"], priority="size")
+        span_partitions, _, _ = partition_mondrian(df, 2, {"age": 0}, 1, ["age"], priority="span")
+        self.assertEqual([list(p) for p in partitions], [list(p) for p in span_partitions])
+        self.assertEqual([i for p in partitions for i in p], list(df.index))  # All leaves have the same depth, so they appear from left to right
+
+    def test_time_budget_emits_k_anonymous_partitions(self):
+        df = pd.DataFrame({"age": range(32)})
+        partitions, _, refinement = partition_mondrian(df, 2, {"age": 0}, 1, ["age"], time_budget=0)
+        self.assertTrue(refinement["budget_exhausted"])
+        self.assertEqual(len(partitions), 1)
+
+
+class TestSplitTree(TestCase):
+    """Class containing tests for the split tree recorded by Mondrian partitioning"""
+
+    def test_routing_partitioned_records_reproduces_partitions(self):
+        df = build_df()
+        split_tree = {}
+        partitions, _, _ = partition_mondrian(df, 2, {"age": 0, "gender": 0}, 1, ["age", "gender"], split_tree=split_tree)
+        routed = route(split_tree, df)
+        self.assertEqual(sorted(routed), list(range(len(partitions))))
+        for position, partition in enumerate(partitions):
+            self.assertEqual(list(routed[position]), list(partition))
+
+    def test_unseen_values_are_routed_to_nearest_partition(self):
+        df = pd.DataFrame({"age": range(0, 64, 2), "gender": pd.Categorical(["female", "male"] * 16)})
+        split_tree = {}
+        partitions, _, _ = partition_mondrian(df, 2, {"age": 0}, 1, ["age"], split_tree=split_tree)
+        new_df = pd.DataFrame({"age": [-5, 3, 100], "gender": pd.Categorical(["other", "male", "female"])})
+        routed = route(split_tree, new_df)
+        leaf_of_record = {index: position for position, indexes in routed.items() for index in indexes}
+        self.assertIn(df.index[df["age"] == 0][0], partitions[leaf_of_record[0]])
+        self.assertIn(df.index[df["age"] == 2][0], partitions[leaf_of_record[1]])
+        self.assertIn(df.index[df["age"] == 62][0], partitions[leaf_of_record[2]])
+
+    def test_split_tree_covers_unrefined_partitions(self):
+        df = pd.DataFrame({"age": range(32)})
+        split_tree = {}
+        partitions, _, _ = partition_mondrian(df, 2, {"age": 0}, 1, ["age"], split_budget=3, split_tree=split_tree)
+        routed = route(split_tree, df)
+        self.assertEqual(sorted(routed), list(range(len(partitions))))
+        for position, partition in enumerate(partitions):
+            self.assertEqual(list(routed[position]), list(partition))
@@ -4,7 +4,7 @@ from unittest import TestCase
 import datetime
 import pandas as pd
 
-from kernel.recoding import recode, recode_dates, recode_ordinal, recode_nominal, recode_range
+from kernel.recoding import recode, recode_dates, recode_ordinal, recode_nominal, recode_range, recode_tokens
 from kernel.util import reduce_string
 
 
@@ -169,3 +169,8 @@ class TestGeneralization(TestCase):
         series = pd.Series([date_1, date_2])
         series = recode(series)
         self.assertEqual(len(series.unique()), 1)
+
+    def test_encoded_token_generalization(self):
+        series = pd.Series([["berlin", "anna"], ["anna", "paris"], ["anna"]])
+        self.assertSetEqual(recode_tokens(series), {"anna"})
+        self.assertIsNone(recode_tokens(pd.Series([["berlin"], ["paris"]])))
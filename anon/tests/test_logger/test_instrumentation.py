@@ -0,0 +1,51 @@
+"""This module contains tests for measuring pipeline stages"""
+
+from unittest import TestCase
+from pathlib import Path
+import json
+import tempfile
+import tracemalloc
+
+from logger.instrumentation import Instrumentation
+
+
+class TestInstrumentation(TestCase):
+    """Class containing tests for the instrumentation"""
+
+    def test_stages_are_accumulated(self):
+        instrumentation = Instrumentation()
+        for _ in range(3):
+            with instrumentation.stage("output") as stage:
+                pass
+            instrumentation.count(stage, "records", 10)
+        instrumentation.set_counter("output", "batches", 3)
+        stage = instrumentation.get_report()["stages"]["output"]
+        self.assertEqual(stage["calls"], 3)
+        self.assertEqual(stage["counters"], {"records": 30, "batches": 3})
+        self.assertGreaterEqual(stage["wall_time"], 0)
+        self.assertEqual(stage["wall_time"], instrumentation.get_wall_time("output"))
+        self.assertEqual(instrumentation.get_wall_time("reading"), 0.0)
+
+    def test_nested_stages_are_named_by_path(self):
+        instrumentation = Instrumentation(trace_memory=True)
+        self.addCleanup(tracemalloc.stop)
+        with instrumentation.stage("k_2"):
+            with instrumentation.stage("partitioning") as stage:
+                data = [0] * 1000000
+            del data
+        self.assertEqual(stage, "k_2/partitioning")
+        stages = instrumentation.get_report()["stages"]
+        self.assertEqual(list(stages), ["k_2/partitioning", "k_2"])
+        self.assertGreater(stages["k_2/partitioning"]["traced_peak_mb"], 7)
+        self.assertGreaterEqual(stages["k_2"]["traced_peak_mb"], stages["k_2/partitioning"]["traced_peak_mb"])
+
+    def test_save_report(self):
+        instrumentation = Instrumentation()
+        with instrumentation.stage("reading"):
+            pass
+        with tempfile.TemporaryDirectory() as directory:
+            report_file = Path(directory) / "instrumentation.json"
+            instrumentation.save(report_file)
+            with open(report_file) as f:
+                report = json.load(f)
+        self.assertEqual(list(report["stages"]), ["reading"])
@@ -0,0 +1,72 @@
+"""This module contains tests for profiling pipeline stages"""
+
+from unittest import TestCase
+from pathlib import Path
+import pstats
+import tempfile
+import time
+
+from logger.instrumentation import Instrumentation
+from logger.profiler import Profiler, write_collapsed_stacks, write_sampled_stats
+
+
+def busy_waiting(seconds):
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        sum(range(100))
+
+
+class TestProfiler(TestCase):
+    """Class containing tests for the profiler"""
+
+    def test_is_selected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = Profiler(["uncompress", "k_2/partitioning"], directory)
+        self.assertTrue(profiler.is_selected("postprocessing/uncompress"))
+        self.assertTrue(profiler.is_selected("k_2/partitioning"))
+        self.assertFalse(profiler.is_selected("k_3/partitioning"))
+        self.assertFalse(profiler.is_selected("postprocessing"))
+
+    def test_sample_selected_stages(self):
+        with tempfile.TemporaryDirectory() as directory:
+            instrumentation = Instrumentation(profiler=Profiler(["uncompress"], directory, 0.001))
+            with instrumentation.stage("postprocessing"):
+                with instrumentation.stage("uncompress"):
+                    busy_waiting(0.1)
+            self.assertEqual(sorted(path.name for path in Path(directory).iterdir()), ["postprocessing.uncompress.collapsed", "postprocessing.uncompress.pstats"])
+            with open(Path(directory) / "postprocessing.uncompress.collapsed") as f:
+                lines = f.read().splitlines()
+            stats = pstats.Stats(str(Path(directory) / "postprocessing.uncompress.pstats"))
+        self.assertGreater(len(lines), 0)
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        self.assertTrue(any("busy_waiting" in line.rsplit(";", 1)[-1] for line in lines))
+        busy_waiting_stats = [stat for function, stat in stats.stats.items() if function[2] == "busy_waiting"]
+        self.assertEqual(len(busy_waiting_stats), 1)
+        self.assertGreater(busy_waiting_stats[0][3], 0.05)
+
+    def test_profile_deterministically(self):
+        with tempfile.TemporaryDirectory() as directory:
+            instrumentation = Instrumentation(profiler=Profiler(["partitioning"], directory, 0))
+            with instrumentation.stage("partitioning"):
+                busy_waiting(0.01)
+            self.assertEqual([path.name for path in Path(directory).iterdir()], ["partitioning.pstats"])
+            stats = pstats.Stats(str(Path(directory) / "partitioning.pstats"))
+        self.assertTrue(any(function[2] == "busy_waiting" for function in stats.stats))
+
+    def test_write_sampled_stacks(self):
+        outer = ("main.py", 1, "main")
+        inner = ("kernel.py", 10, "partition")
+        samples = {(outer,): 1, (outer, inner): 3}
+        sample_times = {(outer,): 0.1, (outer, inner): 0.3}
+        with tempfile.TemporaryDirectory() as directory:
+            write_collapsed_stacks(samples, Path(directory) / "stage.collapsed")
+            write_sampled_stats(samples, sample_times, Path(directory) / "stage.pstats")
+            with open(Path(directory) / "stage.collapsed") as f:
+                collapsed = f.read()
+            stats = pstats.Stats(str(Path(directory) / "stage.pstats")).stats
+        self.assertEqual(collapsed, "main (main.py:1) 1\nmain (main.py:1);partition (kernel.py:10) 3\n")
+        self.assertEqual(stats[outer][:2], (4, 4))
+        self.assertAlmostEqual(stats[outer][2], 0.1)
+        self.assertAlmostEqual(stats[outer][3], 0.4)
+        self.assertAlmostEqual(stats[inner][2], 0.3)
+        self.assertEqual(list(stats[inner][4]), [outer])
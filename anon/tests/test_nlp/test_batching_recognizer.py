@@ -0,0 +1,110 @@
+"""This module contains tests for sharing a recognizer between jobs"""
+import tempfile
+import threading
+from pathlib import Path
+from unittest import TestCase
+
+from benchmarks.stub_recognizer import StubRecognizer
+from benchmarks.synthetic_dataset import build_configuration, generate_chunks
+from configuration.configuration_reader import ConfigurationReader
+from nlp.batching_recognizer import BatchingRecognizer
+from worker import Worker
+
+
+class FailingRecognizer(StubRecognizer):
+    """Recognizer returning entities for an unknown record once, which fails after recognition"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.failed = False
+
+    def recognize(self, textual_attribute, texts_to_analyze):
+        entities_per_record = super().recognize(textual_attribute, texts_to_analyze)
+        if not self.failed:
+            self.failed = True
+            entities_per_record["unknown"] = {}
+        return entities_per_record
+
+
+class TestBatchingRecognizer(TestCase):
+    """This class contains tests for the batching recognizer"""
+
+    def test_recognize_concurrent_jobs_in_one_batch(self):
+        recognizer = BatchingRecognizer(StubRecognizer(ConfigurationReader().parse(build_configuration())), batch_wait=0.2)
+        texts = {
+            "a": {"1": [("I met Anna in Berlin.", 0)]},
+            "b": {"1": [("I met Ben in Paris.", 0), ("Ben is a Leo.", 1)]}
+        }
+        results = {}
+
+        def run(job_id):
+            job_recognizer = recognizer.for_job(job_id)
+            results[job_id] = (job_recognizer, job_recognizer.recognize("text", texts[job_id]))
+
+        threads = [threading.Thread(target=run, args=(job_id,)) for job_id in texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(recognizer.get_statistics(), {"batches": 1, "requests": 2})
+        self.assertEqual([entity.text for entity in results["a"][1][0]["GPE"]], ["Berlin"])
+        self.assertEqual([entity.text for entity in results["b"][1][0]["GPE"]], ["Paris"])
+        self.assertEqual(set(results["b"][1].keys()), {0, 1})
+        self.assertEqual(results["a"][0].get_recognized_entities(), {"PERSON", "GPE"})
+        self.assertEqual(results["b"][0].get_statistics()["texts"], 2)
+
+        # Jobs replace texts of their own persons, even if person ids are the same
+        self.assertEqual(results["a"][0].replace("text", "1", {}, set()), "I met PERSON in GPE.")
+        self.assertEqual(results["b"][0].replace("text", "1", {}, set()), ["I met PERSON in GPE.", "PERSON is a SIGN."])
+
+        # Releasing a finished job only drops the state kept for its own persons
+        results["a"][0].release()
+        with self.assertRaises(KeyError):
+            results["a"][0].replace("text", "1", {}, set())
+        self.assertEqual(results["b"][0].replace("text", "1", {}, set()), ["I met PERSON in GPE.", "PERSON is a SIGN."])
+
+    def test_failing_batch_resolves_all_jobs(self):
+        recognizer = BatchingRecognizer(FailingRecognizer(ConfigurationReader().parse(build_configuration())), batch_wait=0.2)
+        errors = {}
+
+        def run(job_id):
+            try:
+                recognizer.for_job(job_id).recognize("text", {"1": [("I met Anna in Berlin.", 0)]})
+            except KeyError as e:
+                errors[job_id] = e
+
+        threads = [threading.Thread(target=run, args=(job_id,)) for job_id in ["a", "b"]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(set(errors.keys()), {"a", "b"})
+
+        # Later jobs are still recognized by the same thread
+        entities = recognizer.for_job("c").recognize("text", {"1": [("I met Anna in Berlin.", 0)]})
+        self.assertEqual([entity.text for entity in entities[0]["GPE"]], ["Berlin"])
+
+    def test_concurrent_jobs_with_the_same_id_keep_their_texts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            configuration = build_configuration(k=3)
+            for seed in [1, 2]:
+                next(generate_chunks(60, seed=seed)).to_csv(Path(directory) / "input_{}.csv".format(seed), index=False)
+            worker = Worker(batch_wait=0.2, recognizer_class=StubRecognizer)
+            expected = {seed: worker.run({"id": str(seed), "config": configuration, "input": str(Path(directory) / "input_{}.csv".format(seed))}) for seed in [1, 2]}
+
+            responses = {}
+
+            def run(seed):
+                responses[seed] = worker.run({"id": "same", "config": configuration, "input": str(Path(directory) / "input_{}.csv".format(seed))})
+
+            threads = [threading.Thread(target=run, args=(seed,)) for seed in [1, 2]]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for seed in [1, 2]:
+                self.assertEqual(responses[seed]["id"], "same")
+                self.assertEqual(responses[seed]["status"], "ok")
+                self.assertEqual(responses[seed]["records"], expected[seed]["records"])
@@ -0,0 +1,55 @@
+"""This module contains tests for recognizing and replacing sensitive terms"""
+import tempfile
+from pathlib import Path
+from unittest import TestCase, mock
+
+import spacy
+
+from configuration.configuration import Configuration
+from nlp.sensitive_terms_recognizer import SensitiveTermsRecognizer
+
+
+def build_config(directory):
+    model = Path(directory) / "model"
+    spacy.blank("en").to_disk(model)  # Entities are only recognized by the entity ruler, so no trained model is needed
+    config = Configuration()
+    config.attributes = {"id": "direct_identifier", "text": "sensitive_attribute"}
+    config.entities = {"native": [], "custom": {"TOPIC": "topic[0-9]+"}}
+    config.nlp = {"model": str(model), "cache": str(Path(directory) / "cache")}
+    return config
+
+
+class TestSensitiveTermsRecognizer(TestCase):
+    """Class containing tests for the sensitive terms recognizer"""
+
+    def test_recognize_persons_in_one_stream(self):
+        texts = {"1": [("I write about topic1.", 0), ("And topic2.", 1)], "2": [("Nothing here.", 2)], "3": [("Also topic3.", 3)]}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            recognizer = SensitiveTermsRecognizer(build_config(tmp_dir))
+            nlp = recognizer.get_nlp()
+            with mock.patch.object(nlp, "pipe", wraps=nlp.pipe) as pipe:
+                entities = recognizer.recognize("text", texts)
+            self.assertEqual(sum(1 for call in pipe.call_args_list if call.kwargs.get("as_tuples")), 1)  # pipe calls itself for the texts without their contexts
+            self.assertEqual({index: {label: [entity.text for entity in spans] for label, spans in entities[index].items()} for index in entities},
+                             {0: {"TOPIC": ["topic1"]}, 1: {"TOPIC": ["topic2"]}, 2: {}, 3: {"TOPIC": ["topic3"]}})
+
+            # Docs of each person have been stored separately and are replaced
+            self.assertEqual(recognizer.replace("text", "1", {}, set()), ["I write about TOPIC.", "And TOPIC."])
+            self.assertEqual(recognizer.replace("text", "2", {}, set()), "Nothing here.")
+            self.assertEqual(recognizer.replace("text", "3", {}, set()), "Also TOPIC.")
+
+            recognizer.release("text", ["1", "2"])
+            with self.assertRaises(KeyError):
+                recognizer.replace("text", "1", {}, set())
+            self.assertEqual(recognizer.replace("text", "3", {}, set()), "Also TOPIC.")
+
+    def test_recognize_cached_persons(self):
+        texts = {"1": [("I write about topic1.", 0)], "2": [("And topic2.", 1)]}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = build_config(tmp_dir)
+            SensitiveTermsRecognizer(config, use_cache=True).recognize("text", {"1": [("I write about topic1.", 7)]})  # Indexes differ between runs
+            recognizer = SensitiveTermsRecognizer(config, use_cache=True)
+            entities = recognizer.recognize("text", texts)
+            self.assertEqual({index: [entity.text for entity in entities[index]["TOPIC"]] for index in entities}, {0: ["topic1"], 1: ["topic2"]})
+            self.assertEqual(recognizer.get_statistics(), {"ids": 2, "texts": 2, "cached_ids": 1, "cached_texts": 1})
+            self.assertEqual(recognizer.replace("text", "2", {}, set()), "And TOPIC.")
@@ -0,0 +1,66 @@
+"""This module contains tests for writing anonymized records batch by batch"""
+
+from unittest import TestCase, skipIf
+from pathlib import Path
+import tempfile
+import pandas as pd
+
+from postprocessing.output_writer import OutputWriter, batch_partitions, parquet
+
+
+def build_batches():
+    first = pd.DataFrame({"age": ["[20-29]", "[20-29]", "30"], "gender": ["(female,male)", "(female,male)", "male"]})
+    second = pd.DataFrame({"age": ["[40-49]", "[40-49]"], "gender": ["female", "female"]})
+    second["gender"] = second["gender"].astype("category")
+    return first, second
+
+
+class TestOutputWriter(TestCase):
+    """Class containing tests for the output writer"""
+
+    def test_batch_partitions(self):
+        partitions = [[0, 1], [2, 3, 4], [5], [6, 7, 8, 9, 10], [11]]
+        self.assertEqual(batch_partitions(partitions, 5), [[[0, 1], [2, 3, 4]], [[5]], [[6, 7, 8, 9, 10]], [[11]]])
+        self.assertEqual(batch_partitions([], 5), [])
+
+    def test_write_csv_in_batches(self):
+        first, second = build_batches()
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = Path(directory) / "anonymized.csv"
+            with OutputWriter(output_file) as writer:
+                writer.write(first)
+                writer.write(second)
+            written_df = pd.read_csv(output_file, dtype=str)
+        expected_df = pd.concat([first, second.astype(object)], ignore_index=True)
+        pd.testing.assert_frame_equal(written_df, expected_df)
+
+    @skipIf(parquet is None, "pyarrow is not installed")
+    def test_write_parquet_row_groups(self):
+        first, second = build_batches()
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = Path(directory) / "anonymized.parquet"
+            with OutputWriter(output_file) as writer:
+                writer.write(first)
+                writer.write(second)
+            self.assertEqual(parquet.ParquetFile(output_file).num_row_groups, 2)
+            written_df = pd.read_parquet(output_file)
+        expected_df = pd.concat([first, second.astype(object)], ignore_index=True)
+        pd.testing.assert_frame_equal(written_df, expected_df)
+
+    @skipIf(parquet is None, "pyarrow is not installed")
+    def test_write_dictionary_encoded_columns(self):
+        first, second = build_batches()
+        first["age_lower"] = [20.0, 20.0, 30.0]
+        second["age_lower"] = [40.0, None]
+        expected_df = pd.concat([first, second.astype({"gender": object})], ignore_index=True)
+        for suffix in [".parquet", ".arrow"]:
+            with tempfile.TemporaryDirectory() as directory:
+                output_file = Path(directory) / ("anonymized" + suffix)
+                with OutputWriter(output_file, ["gender"]) as writer:
+                    writer.write(first)
+                    writer.write(second)
+                written_df = pd.read_parquet(output_file) if suffix == ".parquet" else pd.read_feather(output_file)
+            self.assertEqual(str(written_df["gender"].dtype), "category")
+            self.assertEqual(written_df["age"].dtype, object)
+            self.assertEqual(written_df["age_lower"].dtype, "float64")
+            pd.testing.assert_frame_equal(written_df.astype({"gender": object}), expected_df)
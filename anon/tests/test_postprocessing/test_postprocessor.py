@@ -0,0 +1,91 @@
+"""This module contains tests for the postprocessor"""
+
+from unittest import TestCase
+import pandas as pd
+
+from configuration.configuration import Configuration
+from postprocessing.postprocessor import PostProcessor
+
+
+def build_config():
+    config = Configuration()
+    config.attributes = {
+        "id": {"anonymization_type": "direct_identifier"},
+        "age": {"type": "numerical", "anonymization_type": "quasi_identifier"},
+        "count": {"type": "numerical", "anonymization_type": "insensitive_attribute"},
+        "text": {"type": "text", "anonymization_type": "text"},
+        "title": {"type": "text", "anonymization_type": "text"}
+    }
+    return config
+
+
+class TestUncompression(TestCase):
+    """Class containing tests for uncompressing person-centric records"""
+
+    def test_uncompress_explodes_texts_and_broadcasts_values(self):
+        df = pd.DataFrame({
+            "id": ["a", "b", "c"],
+            "age": [range(20, 30), range(20, 30), 30],
+            "count": [[1, 2], 3, 4],
+            "text": [["first", "second"], "third", ["fourth", "fifth", "sixth"]],
+            "title": [["t1", "t2"], None, ["t4", "t5", "t6"]]
+        })
+        uncompressed_df = PostProcessor(build_config(), None).uncompress(df)
+
+        self.assertEqual(list(uncompressed_df.columns), list(df.columns))
+        self.assertEqual(list(uncompressed_df.index), list(range(6)))
+        self.assertEqual(list(uncompressed_df["id"]), ["a", "a", "b", "c", "c", "c"])
+        self.assertEqual(list(uncompressed_df["age"]), [range(20, 30)] * 3 + [30] * 3)
+        self.assertEqual(list(uncompressed_df["count"]), [1, 2, 3, 4, 4, 4])
+        self.assertEqual(list(uncompressed_df["text"]), ["first", "second", "third", "fourth", "fifth", "sixth"])
+        self.assertEqual(list(uncompressed_df["title"]), ["t1", "t2", None, "t4", "t5", "t6"])
+
+    def test_uncompress_without_textual_attributes(self):
+        config = build_config()
+        config.attributes.pop("text")
+        config.attributes.pop("title")
+        df = pd.DataFrame({"id": ["a", "b"], "age": [20, 30]})
+        pd.testing.assert_frame_equal(PostProcessor(config, None).uncompress(df), df)
+
+
+class TestPrettyConversion(TestCase):
+    """Class containing tests for converting anonymized values to pretty strings"""
+
+    def test_pretty_converts_values_per_column(self):
+        config = build_config()
+        config.attributes["date"] = {"type": "date", "anonymization_type": "quasi_identifier", "format": "%d/%m/%Y"}
+        genders = frozenset(["male", "Female"])
+        df = pd.DataFrame({
+            "age": [range(20, 30), range(20, 30), 30, 30.0],
+            "gender": [genders, genders, "male", None],
+            "date": pd.to_datetime(["2020-01-01", "2020-01-01", "2020-01-01", "2021-02-03"]),
+            "count": [1, 2, None, 4]
+        }, index=[3, 5, 7, 9])
+        pretty_df = PostProcessor(config, None).pretty(df)
+
+        self.assertEqual(list(pretty_df.index), [3, 5, 7, 9])
+        self.assertEqual(list(pretty_df["age"]), ["[20-29]", "[20-29]", "30", "30.0"])
+        self.assertEqual(list(pretty_df["gender"]), ["(Female,male)", "(Female,male)", "male", ""])
+        self.assertEqual(list(pretty_df["date"]), ["01/01/2020", "01/01/2020", "01/01/2020", "03/02/2021"])
+        self.assertEqual(list(pretty_df["count"]), ["1.0", "2.0", "", "4.0"])
+        self.assertEqual(pretty_df["date"].dtype, "category")
+
+    def test_bounds_of_numerical_and_date_quasi_identifiers(self):
+        config = build_config()
+        config.attributes["date"] = {"type": "date", "anonymization_type": "quasi_identifier", "format": "%d/%m/%Y"}
+        df = pd.DataFrame({
+            "age": [range(20, 30), range(20, 30), 30, None],
+            "count": [1, 2, 3, 4],
+            "date": [pd.Period("2020-03", "M"), range(2019, 2022), pd.Timestamp("2020-01-01"), None]
+        }, index=[3, 5, 7, 9])
+        bounds_df = PostProcessor(config, None).bounds(df)
+
+        self.assertEqual(list(bounds_df.columns), ["age_lower", "age_upper", "date_lower", "date_upper"])
+        self.assertEqual(list(bounds_df.index), [3, 5, 7, 9])
+        self.assertEqual(bounds_df["age_lower"].tolist()[:3], [20, 20, 30])
+        self.assertEqual(bounds_df["age_upper"].tolist()[:3], [29, 29, 30])
+        self.assertTrue(pd.isnull(bounds_df.at[9, "age_lower"]))
+        self.assertEqual(bounds_df["date_lower"].tolist()[:3], [pd.Timestamp("2020-03-01"), pd.Timestamp("2019-01-01"), pd.Timestamp("2020-01-01")])
+        self.assertEqual(bounds_df["date_upper"].tolist()[:3], [pd.Timestamp("2020-03-31"), pd.Timestamp("2021-12-31"), pd.Timestamp("2020-01-01")])
+        self.assertTrue(pd.isnull(bounds_df.at[9, "date_upper"]))
+        self.assertEqual(str(bounds_df["date_lower"].dtype), "datetime64[ns]")
@@ -0,0 +1,87 @@
+"""This module contains tests for reading input data"""
+
+from unittest import TestCase
+from pathlib import Path
+import tempfile
+import pandas as pd
+
+from configuration.configuration import Configuration
+from preprocessing.data_reader import DataReader
+
+
+def build_config():
+    config = Configuration()
+    config.attributes = {
+        "id": {"anonymization_type": "direct_identifier"},
+        "gender": {"type": "nominal", "anonymization_type": "quasi_identifier"},
+        "age": {"type": "numerical", "anonymization_type": "quasi_identifier"},
+        "date": {"type": "date", "anonymization_type": "quasi_identifier", "format": "%d/%m/%Y"},
+        "level": {"type": "ordinal", "anonymization_type": "quasi_identifier", "order": ["low", "mid", "high"]},
+        "text": {"type": "text", "anonymization_type": "text"}
+    }
+    return config
+
+
+def build_df():
+    return pd.DataFrame({
+        "ID": ["a", "b", "c", "d", "e", "f", "g", "h"],
+        "Gender": ["male", "female", None, "female", "male", "diverse", "female", "male"],
+        "Age": [20, 35, 40, None, 52, 60, 20, 35],
+        "Date": ["01/02/2020", "03/04/2020", "05/06/2020", "07/08/2020", "invalid", "09/10/2020", "11/12/2020", "13/01/2021"],
+        "Level": ["low", "mid", "high", "low", "mid", "high", "low", "mid"],
+        "Text": ["First text", None, "Third text", "Fourth text", "Fifth text", None, "Seventh text", "Eighth text"],
+        "Unused": [1, None, 3, 4, 5, 6, 7, 8]
+    })
+
+
+class TestDataReader(TestCase):
+    """Class containing tests for the data reader"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_file = Path(self.directory.name) / "input.csv"
+        build_df().to_csv(self.input_file, index=False)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_read_formats_configured_attributes(self):
+        df = DataReader(build_config()).read(self.input_file)
+        self.assertEqual(list(df.columns), ["id", "gender", "age", "date", "level", "text"])
+        self.assertEqual(list(df.index), [0, 1, 5, 6, 7])
+        self.assertEqual(df["gender"].dtype, "category")
+        self.assertEqual(list(df["gender"].cat.categories), ["diverse", "female", "male"])
+        self.assertEqual(list(df["level"].cat.categories), ["low", "mid", "high"])
+        self.assertTrue(df["level"].cat.ordered)
+        self.assertEqual(df["date"].dtype, "datetime64[ns]")
+        self.assertTrue(df["text"].isna().any())
+
+    def test_chunked_read_matches_read(self):
+        config = build_config()
+        df = DataReader(config).read(self.input_file)
+        pd.testing.assert_frame_equal(DataReader(config).read(self.input_file, chunksize=3), df)
+        chunks = list(DataReader(config).read_chunks(self.input_file, chunksize=3))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), len(df))
+
+    def test_compressed_read_matches_read(self):
+        config = build_config()
+        compressed_file = Path(self.directory.name) / "input.csv.gz"
+        build_df().to_csv(compressed_file, index=False)
+        pd.testing.assert_frame_equal(DataReader(config).read(compressed_file), DataReader(config).read(self.input_file))
+
+    def test_chunks_keep_numerical_types_of_first_chunk(self):
+        config = build_config()
+        df = build_df()
+        df.loc[:2, "Age"] = None  # The first chunk only contains missing ages and would be inferred as float or object
+        df.to_csv(self.input_file, index=False)
+
+        chunks = list(DataReader(config).read_chunks(self.input_file, chunksize=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [0, 1, 2])
+        self.assertEqual({str(chunk["age"].dtype) for chunk in chunks if len(chunk) > 0}, {"int64"})
+        self.assertEqual({str(chunk["date"].dtype) for chunk in chunks}, {"datetime64[ns]"})
+
+        df.loc[7, "Age"] = 35.5
+        df.to_csv(self.input_file, index=False)
+        with self.assertRaises(Exception):
+            list(DataReader(config).read_chunks(self.input_file, chunksize=3))
+        self.assertEqual(DataReader(config).read(self.input_file)["age"].dtype, "float64")
@@ -0,0 +1,125 @@
+"""This module contains tests for the preprocessor"""
+
+from unittest import TestCase
+from collections import namedtuple
+import pandas as pd
+
+from configuration.configuration import Configuration
+from preprocessing.preprocessor import Preprocessor
+
+
+class EntityRecognizer:
+    """Recognizer returning a fixed list of terms for each text"""
+
+    def recognize(self, textual_attribute, texts_to_analyze):
+        entities_per_record = {}
+        for texts in texts_to_analyze.values():
+            for text, index in texts:
+                entities_per_record[index] = {"GPE": text.split()}
+        return entities_per_record
+
+    def get_recognized_entities(self):
+        return ["GPE"]
+
+
+Token = namedtuple("Token", ["text", "lemma_", "is_stop"])
+
+
+class Span(tuple):
+    """Tuple of tokens providing its text like a span"""
+
+    @property
+    def text(self):
+        return " ".join(token.text for token in self)
+
+
+def tokenize(text):
+    return Span(Token(word, word.lower(), False) for word in text.split())
+
+
+class SpanRecognizer:
+    """Recognizer returning one span per word for each text"""
+
+    def recognize(self, textual_attribute, texts_to_analyze):
+        entities_per_record = {}
+        for texts in texts_to_analyze.values():
+            for text, index in texts:
+                entities_per_record[index] = {"GPE": [tokenize(word) for word in text.split()]}
+        return entities_per_record
+
+    def get_recognized_entities(self):
+        return ["GPE"]
+
+    def get_nlp(self):
+        return tokenize
+
+
+def build_config():
+    config = Configuration()
+    config.attributes = {
+        "id": {"type": "nominal", "anonymization_type": "direct_identifier"},
+        "gender": {"type": "nominal", "anonymization_type": "quasi_identifier"},
+        "age": {"type": "numerical", "anonymization_type": "quasi_identifier"},
+        "count": {"type": "numerical", "anonymization_type": "insensitive_attribute"},
+        "text": {"type": "text", "anonymization_type": "text"}
+    }
+    config.entities = {"native": ["GPE"]}
+    return config
+
+
+def build_df():
+    df = pd.DataFrame({
+        "id": ["b", "a", "b", "c", "a", "b"],
+        "gender": ["male", "female", "male", "male", "female", "male"],
+        "age": [20, 30, 21, 40, 30, 22],
+        "count": [1, 2, 3, 4, 5, 6],
+        "text": ["Berlin", None, "Paris London", None, "Rome", "Berlin"]
+    })
+    return df.astype({"id": "category", "gender": "category"})
+
+
+class TestCompression(TestCase):
+    """Class containing tests for the person-centric compression"""
+
+    def test_compress_aggregates_records_per_key(self):
+        pp = Preprocessor(EntityRecognizer(), build_config(), build_df())
+        pp.analyze_textual_attributes()
+        pp.compress()
+        df = pp.get_df()
+
+        self.assertEqual(list(df["id"]), ["a", "b", "c"])
+        self.assertEqual(list(df["gender"]), ["female", "male", "male"])
+        self.assertEqual(list(df["age"]), [30, frozenset([20, 21, 22]), 40])
+        self.assertEqual(list(df["count"]), [[2, 5], [1, 3, 6], 4])
+        self.assertEqual(list(df["text_GPE"]), [["Rome"], ["Berlin", "Paris", "London", "Berlin"], None])
+        self.assertEqual(df.at[1, "text"], ["Berlin", "Paris London", "Berlin"])
+        self.assertEqual(df.at[2, "text"], None)
+
+    def test_compress_keeps_types_of_constant_attributes(self):
+        df = build_df().drop_duplicates(subset=["id"])
+        pp = Preprocessor(EntityRecognizer(), build_config(), df)
+        pp.compress()
+        df = pp.get_df()
+
+        self.assertEqual(df["gender"].dtype, "category")
+        self.assertEqual(df["age"].dtype, "int64")
+        self.assertEqual(list(df["age"]), [30, 20, 40])
+
+
+class TestRedundantInformation(TestCase):
+    """Class containing tests for resolving redundant information"""
+
+    def test_redundant_terms_are_separated(self):
+        config = build_config()
+        config.attributes["city"] = {"type": "nominal", "anonymization_type": "quasi_identifier", "entities": ["GPE"]}
+        df = build_df()
+        df["city"] = ["Berlin", "Rome", "Paris", "Oslo", "Rome", "Berlin"]
+        pp = Preprocessor(SpanRecognizer(), config, df)
+        pp.analyze_textual_attributes()
+        pp.find_redundant_information()
+        df = pp.get_df()
+
+        self.assertEqual(pp.get_redundant_entity_attributes(), ["text_GPE_"])
+        self.assertEqual(list(df["text_GPE"]), [None, None, [tokenize("London")], None, None, None])
+        self.assertEqual([len(value) if value else None for value in df["text_GPE_"]], [1, None, 1, None, 1, 1])
+        self.assertEqual(df.at[0, "text_GPE_"][0][2], "city")
@@ -0,0 +1,175 @@
+"""This module contains tests for spilling preprocessed datasets to disk"""
+
+from unittest import TestCase
+import tempfile
+import pandas as pd
+import spacy
+from spacy.tokens import Span
+
+from kernel.k_anonymity import KAnonymity
+from preprocessing.preprocessor import Preprocessor
+from preprocessing.spilled_dataset import SpilledDataset
+from tests.test_preprocessing.test_preprocessor import build_config
+
+
+class SpacyRecognizer:
+    """Recognizer returning spaCy spans, which cannot be pickled, for each capitalized word"""
+
+    def __init__(self):
+        self.__nlp = spacy.blank("en")
+
+    def recognize(self, textual_attribute, texts_to_analyze):
+        entities_per_record = {}
+        for texts in texts_to_analyze.values():
+            for text, index in texts:
+                doc = self.analyze(text)
+                entities_per_record[index] = {"GPE": [Span(doc, token.i, token.i + 1, label="GPE") for token in doc if token.is_title]}
+        return entities_per_record
+
+    def analyze(self, text):
+        doc = self.__nlp(text)
+        for token in doc:
+            token.lemma_ = token.lower_
+        return doc
+
+    def get_recognized_entities(self):
+        return ["GPE"]
+
+    def get_nlp(self):
+        return self.analyze
+
+
+def build_spill_config():
+    config = build_config()
+    config.attributes["city"] = {"type": "nominal", "anonymization_type": "insensitive_attribute", "entities": ["GPE"]}
+    return config
+
+
+def build_df():
+    df = pd.DataFrame({
+        "id": ["a", "b", "c", "d", "e", "f", "g", "h", "a", "c", "e", "g"],
+        "gender": ["male", "female", "male", "female", "male", "female", "male", "female", "male", "male", "male", "male"],
+        "age": [20, 25, 30, 35, 40, 45, 50, 55, 21, 30, 40, 51],
+        "count": list(range(12)),
+        "city": ["Berlin", "Ulm", "Paris", "Ulm", "Ulm", "Ulm", "Ulm", "Ulm", "Berlin", "Paris", "Ulm", "Ulm"],
+        "text": ["Berlin", None, "Paris and London", "Rome", None, "Berlin", "Oslo", "Paris", "Rome", None, "Berlin", "Madrid"]
+    })
+    return df.astype({"id": "category", "gender": "category", "city": "category"})
+
+
+def preprocess(pp):
+    pp.analyze_textual_attributes()
+    pp.find_redundant_information()
+    pp.compress()
+
+
+class TestSpilledDataset(TestCase):
+    """Class containing tests for the spilled dataset"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = build_spill_config()
+        self.recognizer = SpacyRecognizer()
+        self.dataset = SpilledDataset(self.config, self.directory.name + "/spill")
+        df = build_df()
+        self.dataset.distribute([df.iloc[:6], df.iloc[6:]], 3)
+        for bucket in self.dataset.get_buckets():
+            pp = Preprocessor(self.recognizer, self.config, self.dataset.read_raw_bucket(bucket))
+            preprocess(pp)
+            self.dataset.add_preprocessed_bucket(bucket, pp)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_buckets_match_in_memory_compression(self):
+        pp = Preprocessor(self.recognizer, self.config, build_df())
+        preprocess(pp)
+        df = pp.get_df()
+
+        encoded_df = self.dataset.sample_encoded(["id", "age", "text_GPE"], len(df))
+        self.assertEqual(self.dataset.get_number_of_records(), len(df))
+        self.assertEqual(sorted(encoded_df["id"]), sorted(df["id"]))
+        for _, row in encoded_df.iterrows():
+            expected = df[df["id"] == row["id"]].iloc[0]
+            self.assertEqual(row["age"], expected["age"])
+            self.assertEqual(row["text_GPE"], [term.text.lower() for term in expected["text_GPE"]] if expected["text_GPE"] else None)
+
+        terms = {term: len(record_ids) for term, record_ids in self.dataset.get_sensitive_terms()["text_GPE"].items()}
+        self.assertEqual(terms, {term: len(record_ids) for term, record_ids in pp.get_sensitive_terms()["text_GPE"].items()})
+
+    def test_partitions_are_recoded_in_batches(self):
+        terms = self.dataset.get_sensitive_terms()
+        quasi_identifiers = self.config.get_quasi_identifiers()
+        encoded_df = self.dataset.sample_encoded(quasi_identifiers + list(terms.keys()), self.dataset.get_number_of_records())
+        partitions, _ = KAnonymity(encoded_df, quasi_identifiers, 2, "mondrian", self.config.get_biases(), 0.5, terms, self.config).partition()
+        batches = self.dataset.shuffle_into_batches(partitions, 3)
+
+        self.assertEqual(sum(len(batch) for batch in batches), len(partitions))
+        records = []
+        for batch, batch_partitions in enumerate(batches):
+            df = self.dataset.read_batch(batch)
+            recoded_df = KAnonymity(df, quasi_identifiers, 2, "mondrian", self.config.get_biases(), 0.5, terms, self.config).recode(batch_partitions)
+            self.assertEqual(sorted(recoded_df.index), sorted(df.index))
+            for partition in batch_partitions:
+                self.assertGreaterEqual(len(partition), 2)
+                self.assertEqual(recoded_df.loc[partition, "age"].map(str).nunique(), 1)
+            records += list(df.index)
+        self.assertEqual(sorted(records), list(range(self.dataset.get_number_of_records())))
+
+    def test_batches_restore_spans(self):
+        pp = Preprocessor(self.recognizer, self.config, build_df())
+        preprocess(pp)
+        df = pp.get_df().set_index("id")
+        terms = self.dataset.get_sensitive_terms()
+        quasi_identifiers = self.config.get_quasi_identifiers()
+        encoded_df = self.dataset.sample_encoded(quasi_identifiers + list(terms.keys()), len(df))
+        partitions, _ = KAnonymity(encoded_df, quasi_identifiers, 2, "mondrian", self.config.get_biases(), 0.5, terms, self.config).partition()
+        self.assertEqual(self.dataset.get_redundant_entity_attributes(), ["text_GPE_"])
+
+        for batch in range(len(self.dataset.shuffle_into_batches(partitions, 3))):
+            batch_df = self.dataset.read_batch(batch)
+            self.assertIn("text_GPE_", batch_df.columns)
+            for _, row in batch_df.iterrows():
+                expected = df.loc[row["id"]]
+                if expected["text_GPE"] is None:
+                    self.assertIsNone(row["text_GPE"])
+                else:
+                    self.assertTrue(all(isinstance(span, Span) for span in row["text_GPE"]))
+                    self.assertEqual([(span.text, span.label_, span.doc.text, span[0].lemma_) for span in row["text_GPE"]],
+                                     [(span.text, span.label_, span.doc.text, span[0].lemma_) for span in expected["text_GPE"]])
+                if expected["text_GPE_"] is None:
+                    self.assertIsNone(row["text_GPE_"])
+                else:
+                    self.assertEqual(sorted((span.text, span.doc.text, token.text, attribute) for span, token, attribute in row["text_GPE_"]),
+                                     sorted((span.text, span.doc.text, token.text, attribute) for span, token, attribute in expected["text_GPE_"]))
+
+    def test_leaves_contain_all_records_once(self):
+        terms = self.dataset.get_sensitive_terms()
+        attributes = self.config.get_quasi_identifiers() + list(terms.keys())
+        split_tree = {"attribute": "age", "rule": {"left_max": 30, "right_min": 35}, "left": {"partition": 0}, "right": {"partition": 1}}
+        leaves = self.dataset.route_encoded(split_tree, attributes)
+
+        self.assertEqual(leaves, [0, 1])
+        records = []
+        for leaf in leaves:
+            leaf_df = self.dataset.read_encoded_leaf(leaf)
+            self.assertEqual(list(leaf_df.columns), attributes)
+            self.assertTrue(all(isinstance(terms, list) and all(isinstance(term, str) for term in terms) for terms in leaf_df["text_GPE"].dropna()))
+            if leaf == 0:
+                self.assertTrue(all(min(age) <= 30 if isinstance(age, frozenset) else age <= 30 for age in leaf_df["age"]))
+            records += list(leaf_df.index)
+        self.assertEqual(sorted(records), list(range(self.dataset.get_number_of_records())))
+
+    def test_batches_restore_mixed_values(self):
+        pp = Preprocessor(self.recognizer, self.config, build_df())
+        preprocess(pp)
+        df = pp.get_df().set_index("id")
+        batches = self.dataset.shuffle_into_batches([pd.Index(range(self.dataset.get_number_of_records()))], 100)
+
+        batch_df = self.dataset.read_batch(len(batches) - 1)
+        self.assertEqual(batch_df["gender"].dtype, "category")
+        for _, row in batch_df.iterrows():
+            expected = df.loc[row["id"]]
+            for attribute in ["age", "count", "gender", "city", "text"]:
+                self.assertEqual(type(row[attribute]), type(expected[attribute]))
+                self.assertEqual(row[attribute], expected[attribute])
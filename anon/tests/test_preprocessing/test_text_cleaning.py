@@ -0,0 +1,40 @@
+"""This module contains tests for text cleaning"""
+
+from unittest import TestCase
+
+from preprocessing.text_cleaning import clean_text, clean_texts, remove_html_tags, remove_non_printable_characters, remove_unnecessary_spaces
+
+TEXTS = [
+    "",
+    "   ",
+    "Plain text without any markup.",
+    "  Too   many    spaces  ",
+    "Café naïve – non-printable",
+    "<p>Hello <b>World</b></p>",
+    "Fish &amp; Chips&nbsp;for&nbsp;two",
+    "a < b and c > d",
+    "Broken <tag and & sign",
+    "<!-- comment -->visible<br/>text",
+    "Line\r\nbreaks\tand\ttabs",
+    " Non-breaking spaces "
+]
+
+
+def clean_text_reference(text):
+    text = remove_non_printable_characters(text)
+    text = remove_html_tags(text)
+    return remove_unnecessary_spaces(text)
+
+
+class TestTextCleaning(TestCase):
+    """Class containing tests for text cleaning"""
+
+    def test_clean_text_matches_cleaning_steps(self):
+        for text in TEXTS:
+            self.assertEqual(clean_text(text), clean_text_reference(text))
+
+    def test_clean_texts_keeps_order(self):
+        texts = TEXTS * 200
+        expected = [clean_text_reference(text) for text in texts]
+        self.assertEqual(clean_texts(texts), expected)
+        self.assertEqual(clean_texts(texts, n_processes=2), expected)
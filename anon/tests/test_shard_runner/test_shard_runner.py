@@ -0,0 +1,76 @@
+"""This module contains tests for anonymizing datasets in shards"""
+
+import json
+import pickle
+import tempfile
+from pathlib import Path
+from unittest import TestCase, mock
+
+import pandas as pd
+import spacy
+import yaml
+from spacy.tokens import Span
+
+import shard_runner
+from benchmarks.stub_recognizer import StubRecognizer
+from benchmarks.synthetic_dataset import build_configuration, generate_chunks
+
+
+class SpacyStubRecognizer(StubRecognizer):
+    """Stub recognizer returning spaCy spans, which cannot be pickled, instead of its own spans"""
+
+    def __init__(self, config, use_cache=False):
+        super().__init__(config)
+        self.__nlp = spacy.blank("en")
+
+    def recognize(self, attribute_name, texts_to_analyze):
+        entities_per_id = super().recognize(attribute_name, texts_to_analyze)
+        texts = {index: text for person_texts in texts_to_analyze.values() for text, index in person_texts}
+        for index, entities in entities_per_id.items():
+            doc = self.__nlp(texts[index])
+            for entity_type, spans in entities.items():
+                entities[entity_type] = [doc.char_span(span.start_char, span.start_char + len(span.text), label=entity_type) for span in spans]
+        return entities_per_id
+
+
+def contains_span(df):
+    return any(isinstance(term, Span) for values in df.to_numpy().ravel() if isinstance(values, (list, set, frozenset, tuple)) for term in values)
+
+
+class TestShardRunner(TestCase):
+    """Class containing tests for anonymizing datasets in shards"""
+
+    def test_split_anonymize_and_merge_shards(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shard_path = Path(directory)
+            configuration_file = str(shard_path / "config.yaml")
+            with open(configuration_file, 'w') as f:
+                yaml.safe_dump(build_configuration(k=3), f)
+            input_df = next(generate_chunks(120, seed=1))
+            input_df.to_csv(shard_path / "input.csv", index=False)
+
+            shard_runner.split_input(configuration_file, str(shard_path / "input.csv"), shard_path, 2)
+            with mock.patch("shard_runner.SensitiveTermsRecognizer", SpacyStubRecognizer):
+                for shard in range(2):
+                    shard_runner.anonymize_shard(configuration_file, shard_path, shard)
+            shard_runner.merge_shards(configuration_file, shard_path, 2, str(shard_path / "output.csv"), baseline=True)
+
+            # States hold sensitive terms encoded by their texts instead of spans
+            for shard in range(2):
+                with open(shard_path / "shard_{}_state.pkl".format(shard), 'rb') as f:
+                    state = pickle.load(f)
+                self.assertFalse(contains_span(state["original"]))
+                self.assertFalse(contains_span(state["anonymized"]))
+                locations = [term for terms in state["original"]["text_GPE"].dropna() for term in terms]
+                self.assertGreater(len(locations), 0)
+                self.assertTrue(all(isinstance(term, str) and term == term.lower() for term in locations))
+
+            # All records are merged without direct identifiers and the information loss is reported
+            output_df = pd.read_csv(shard_path / "output.csv")
+            self.assertEqual(len(output_df), len(input_df))
+            self.assertNotIn("id", output_df.columns)
+            with open(shard_path / "sharding_report.json") as f:
+                report = json.load(f)
+            self.assertEqual(sum(metrics["records"] for metrics in report["shards"]), input_df["id"].nunique())
+            self.assertIsNotNone(report["sharded"]["textual_information_loss"])
+            self.assertGreaterEqual(report["penalty"]["relational_information_loss"], 0)
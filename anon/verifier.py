@@ -0,0 +1,102 @@
+"""Main application to verify that an anonymized output file is k-anonymous"""
+
+import logging
+from logger.tqdm_logging_handler import TqdmLoggingHandler
+
+logging.basicConfig(level=logging.INFO, handlers=[TqdmLoggingHandler()])
+logger = logging.getLogger(__name__)
+
+import sys
+import getopt
+import json
+from pathlib import Path
+
+from configuration.configuration_reader import ConfigurationReader
+from evaluation.verification import collect_violation_examples, verify_k_anonymity
+from kernel.anonymization_kernel import PSEUDONYM_ATTRIBUTE
+from preprocessing.data_reader import read_raw_chunks
+
+
+def main(argv):
+    """Main entrypoint for the k-anonymity verifier"""
+
+    # Default parameters
+    configuration_file = ''
+    input_file = ''
+    report_file = ''
+    k = None
+    extra_signature_columns = []
+    person_column = None
+    count_records = False
+
+    # Read and set tool parameters
+    try:
+        opts, _ = getopt.getopt(argv, "c:i:o:k:e:p:v", ["config=", "input=", "output=", "k=", "signature_columns=", "person_column=", "count_records", "verbose"])
+    except getopt.GetoptError:
+        logger.error('verifier.py -c <config_file> -i <anonymized_file> -o <report_file> -k <k> -e <signature_columns> (-p <person_column> | --count_records)')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-c", "--config"):
+            configuration_file = arg
+        if opt in ("-i", "--input"):
+            input_file = arg
+        if opt in ("-o", "--output"):
+            report_file = arg
+        if opt in ("-k", "--k"):
+            k = int(arg)
+        if opt in ("-e", "--signature_columns"):
+            extra_signature_columns = [column.strip().lower() for column in arg.split(",") if column.strip()]
+        if opt in ("-p", "--person_column"):
+            person_column = arg.lower()
+        if opt == "--count_records":
+            count_records = True
+        if opt in ("-v", "--verbose"):
+            logging.getLogger().setLevel(logging.DEBUG)
+
+    # Initialize and read configuration
+    configuration_reader = ConfigurationReader()
+    config = configuration_reader.read(configuration_file)
+
+    # Outputs repeat persons once per text, so a single person with k texts would form a k-anonymous class when counting records
+    if person_column is None and config.get_person_pseudonyms():
+        person_column = PSEUDONYM_ATTRIBUTE
+    if person_column is None and not count_records:
+        logger.error("A column identifying persons is required to count persons per equivalence class. Enable person_pseudonyms, pass it with -p, "
+                     "or use --count_records if every person has a single record")
+        sys.exit(2)
+    k = config.parameters["k"] if k is None else k
+    report_file = report_file or str(input_file).rsplit(".", 1)[0] + "_verification.json"
+
+    # Equivalence classes are defined by the quasi identifiers written to the output file and additional signature columns
+    header = next(read_raw_chunks(input_file, chunksize=1)).columns
+    signature_columns = [column for column in config.get_quasi_identifiers() + extra_signature_columns if column in header]
+    missing_columns = [column for column in extra_signature_columns + ([person_column] if person_column else []) if column not in header]
+    if len(missing_columns) > 0:
+        raise Exception("Columns {} not found in {}".format(", ".join(missing_columns), input_file))
+    logger.info("Verifying %d-anonymity of %s using signature columns %s", k, input_file, ", ".join(signature_columns))
+
+    # Read generalized values as strings, so that CSV and columnar outputs are verified alike
+    columns = signature_columns + ([person_column] if person_column else [])
+    dtype = {column: str for column in columns}
+    report, class_sizes = verify_k_anonymity(read_raw_chunks(input_file, columns, dtype), signature_columns, k, person_column)
+
+    # Read the file again to report the values of violating classes
+    report["violation_examples"] = []
+    if not report["k_anonymous"]:
+        report["violation_examples"] = collect_violation_examples(read_raw_chunks(input_file, signature_columns, dtype), signature_columns, k, class_sizes)
+
+    with open(report_file, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    logger.info("Saved verification report to %s", Path(report_file))
+
+    # Notify about the results
+    logger.info("Found %d equivalence classes with sizes between %d and %d", report["number_of_classes"], report["min_class_size"], report["max_class_size"])
+    if report["k_anonymous"]:
+        logger.info("Output is %d-anonymous", k)
+    else:
+        logger.error("Output is not %d-anonymous: %d classes with %d %s are smaller than k", k, report["number_of_violating_classes"], report["number_of_violating_units"], report["unit"])
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
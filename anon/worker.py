@@ -0,0 +1,173 @@
+"""Application keeping configurations and sensitive terms recognizers loaded to anonymize jobs read as JSON lines from stdin"""
+
+import logging
+import sys
+from logger.tqdm_logging_handler import TqdmLoggingHandler
+
+logging.basicConfig(level=logging.INFO, handlers=[TqdmLoggingHandler(file=sys.stderr)])  # Keep stdout free for responses
+logger = logging.getLogger(__name__)
+
+import getopt
+import json
+import os
+import tempfile
+import threading
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from configuration.configuration_reader import ConfigurationReader
+from logger.instrumentation import Instrumentation
+from main import anonymize, anonymize_within_memory_budget
+from nlp.batching_recognizer import DEFAULT_BATCH_WAIT, BatchingRecognizer
+from nlp.sensitive_terms_recognizer import SensitiveTermsRecognizer
+from preprocessing.data_reader import DataReader
+
+DEFAULT_JOBS = 4
+
+
+class Worker:
+    """
+    Worker anonymizing jobs using the kernel and postprocessor of the anon CLI tool.
+    Configurations are parsed once and recognizers are loaded once per configuration, so that jobs do not pay for loading models.
+    Jobs run concurrently and share the recognizer of their configuration, which recognizes texts of jobs waiting at the same time in one batch.
+    """
+
+    def __init__(self, use_cache=False, batch_wait=DEFAULT_BATCH_WAIT, recognizer_class=SensitiveTermsRecognizer):
+        self.__use_cache = use_cache
+        self.__batch_wait = batch_wait
+        self.__recognizer_class = recognizer_class
+        self.__configurations = {}
+        self.__recognizers = {}
+        self.__lock = threading.Lock()
+        self.__n_jobs = 0
+
+    def run(self, job):
+        """
+        Anonymizes a job and returns the response
+        Parameters
+        ----------
+        job: dict
+            Job with a configuration (path or inline document), input (path) or records (list of dictionaries), and optionally an id and an output path.
+        Returns
+        -------
+        dict
+            Response with the id and status of the job, the output path or the anonymized records, and the wall time per stage, or the error.
+        """
+        with self.__lock:
+            self.__n_jobs += 1
+            job_key = str(self.__n_jobs)  # Ids given by clients might repeat, but jobs must not share state within the recognizer
+            job_id = str(job.get("id", job_key))
+        try:
+            return {"id": job_id, "status": "ok", **self.__anonymize(job_id, job_key, job)}
+        except Exception as e:
+            logger.error("Job %s failed", job_id, exc_info=True)
+            return {"id": job_id, "status": "error", "error": "{}: {}".format(type(e).__name__, e)}
+
+    def __anonymize(self, job_id, job_key, job):
+        config_key, config = self.__get_configuration(job["config"])
+        recognizer = self.__get_recognizer(config_key, config).for_job(job_key)
+        instrumentation = Instrumentation()
+        start = time.perf_counter()
+
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                # Inline records are passed through files like any other input
+                input_file = job.get("input")
+                if input_file is None:
+                    input_file = Path(tmp_dir) / "input.csv"
+                    pd.DataFrame(job["records"]).to_csv(input_file, index=False)
+                output_file = job.get("output", Path(tmp_dir) / "output.csv")
+
+                logger.info("Anonymizing job %s", job_id)
+                if config.get_memory_budget():
+                    config = self.__with_spill_directory(config, Path(tmp_dir) / "spill")  # Concurrent jobs must not share spilled buckets
+                    anonymize_within_memory_budget(config, DataReader(config), recognizer, input_file, output_file, instrumentation)
+                else:
+                    anonymize(config, DataReader(config), recognizer, input_file, output_file, instrumentation)
+
+                response = {"wall_time": time.perf_counter() - start, "stages": {name: stage["wall_time"] for name, stage in instrumentation.get_report()["stages"].items()}}
+                if "output" in job:
+                    response["output"] = str(output_file)
+                else:
+                    df = pd.read_csv(output_file, dtype=str)
+                    response["records"] = df.astype(object).where(df.notna(), None).to_dict("records")
+        finally:
+            recognizer.release()  # Texts of the job will not be replaced anymore
+        logger.info("Finished job %s in %.2f seconds", job_id, response["wall_time"])
+        return response
+
+    def __with_spill_directory(self, config, spill_directory):
+        job_config = ConfigurationReader().parse({"attributes": config.attributes, "entities": config.entities, "parameters": dict(config.parameters), "nlp": config.nlp})
+        job_config.parameters["spill_directory"] = str(spill_directory)
+        return job_config
+
+    def __get_configuration(self, configuration):
+        if isinstance(configuration, dict):
+            key = json.dumps(configuration, sort_keys=True)
+        else:
+            key = "{}@{}".format(Path(configuration).resolve(), os.path.getmtime(configuration))  # Reload changed configuration files
+        with self.__lock:
+            if key not in self.__configurations:
+                configuration_reader = ConfigurationReader()
+                self.__configurations[key] = configuration_reader.parse(configuration) if isinstance(configuration, dict) else configuration_reader.read(configuration)
+            return key, self.__configurations[key]
+
+    def __get_recognizer(self, config_key, config):
+        with self.__lock:
+            if config_key not in self.__recognizers:
+                self.__recognizers[config_key] = BatchingRecognizer(self.__recognizer_class(config, self.__use_cache), self.__batch_wait)
+            return self.__recognizers[config_key]
+
+
+def main(argv):
+    """Main entrypoint for the worker"""
+
+    # Default parameters
+    use_cache = False
+    n_jobs = DEFAULT_JOBS
+    batch_wait = DEFAULT_BATCH_WAIT
+
+    # Read and set tool parameters
+    try:
+        opts, _ = getopt.getopt(argv, "j:w:vs", ["jobs=", "batch_wait=", "verbose", "use_chached_docs"])
+    except getopt.GetoptError:
+        logger.error('worker.py [-j <concurrent_jobs>] [-w <batch_wait_seconds>] [-s]')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-j", "--jobs"):
+            n_jobs = int(arg)
+        if opt in ("-w", "--batch_wait"):
+            batch_wait = float(arg)
+        if opt in ("-s", "--use_chached_docs"):
+            use_cache = True
+        if opt in ("-v", "--verbose"):
+            logging.getLogger().setLevel(logging.DEBUG)
+
+    worker = Worker(use_cache, batch_wait)
+    responses = threading.Lock()
+
+    def respond(response):
+        with responses:
+            sys.stdout.write(json.dumps(response) + "\n")
+            sys.stdout.flush()
+
+    def run(line):
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            respond({"id": None, "status": "error", "error": "Invalid job: {}".format(e)})
+            return
+        respond(worker.run(job))
+
+    # Read one job per line until stdin is closed and run up to n_jobs of them at once
+    logger.info("Waiting for jobs on stdin, running up to %d jobs at once", n_jobs)
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        for line in sys.stdin:
+            if line.strip():
+                executor.submit(run, line)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])